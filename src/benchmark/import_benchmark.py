@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+#  This file is part of the `lipyd` python module
+#
+#  Copyright (c) 2015-2019 - EMBL
+#
+#  File author(s):
+#  Dénes Türei (turei.denes@gmail.com)
+#  Igor Bulanov
+#
+#  Distributed under the GNU GPLv3 License.
+#  See accompanying file LICENSE.txt or copy at
+#      http://www.gnu.org/licenses/gpl-3.0.html
+#
+#  Website: http://denes.omnipathdb.org/
+#
+
+"""
+Benchmark of the time necessary to import ``lipyd`` modules.
+
+Each import is measured in a new interpreter, as the worker processes and
+command line tools would do. Beside the time it is checked which of the
+heavy optional dependencies have been imported. Importing ``lipyd.ms2``
+should not import any of them and should not start the session (which
+creates the log file).
+
+Usage:
+    
+    python import_benchmark.py --module lipyd.ms2 --budget 2.0
+
+Exits with non-zero status if the median time is above the budget or
+any of the heavy dependencies has been imported.
+"""
+
+import sys
+import json
+import argparse
+import subprocess
+
+
+#: Modules should be imported only if really necessary
+HEAVY = (
+    'pyopenms',
+    'matplotlib',
+    'pandas',
+    'openbabel',
+    'pycurl',
+    'bs4',
+)
+
+#: Time budget in seconds for importing ``lipyd.ms2``
+BUDGET = 2.0
+
+_script = '''
+import sys
+import time
+import json
+
+t0 = time.perf_counter()
+import %s
+seconds = time.perf_counter() - t0
+
+session = sys.modules.get('lipyd.session')
+
+json.dump(
+    {
+        'seconds': seconds,
+        'heavy': [m for m in %r if m in sys.modules],
+        'session': bool(session and hasattr(session, 'session')),
+    },
+    sys.stdout,
+)
+'''
+
+
+def measure(module = 'lipyd.ms2', repeat = 3, env = None):
+    """
+    Imports ``module`` in ``repeat`` new interpreters. The interpreters
+    get the environment variables ``env`` if provided, otherwise the ones
+    of the current process.
+    
+    Returns
+    -------
+    ``dict`` with the median and all times in seconds, the heavy
+    dependencies imported and whether the session has been started.
+    """
+    
+    runs = []
+    
+    for _ in range(repeat):
+        
+        out = subprocess.check_output(
+            [sys.executable, '-c', _script % (module, HEAVY)],
+            env = env,
+        )
+        runs.append(json.loads(out.decode('utf-8').strip().split('\n')[-1]))
+    
+    seconds = sorted(r['seconds'] for r in runs)
+    
+    return {
+        'module': module,
+        'seconds': seconds[len(seconds) // 2],
+        'all_seconds': seconds,
+        'heavy': sorted(set(m for r in runs for m in r['heavy'])),
+        'session': any(r['session'] for r in runs),
+    }
+
+
+def main():
+    
+    parser = argparse.ArgumentParser(
+        description = 'Benchmark of the lipyd import time.'
+    )
+    parser.add_argument('--module', default = 'lipyd.ms2')
+    parser.add_argument('--repeat', type = int, default = 3)
+    parser.add_argument('--budget', type = float, default = BUDGET)
+    args = parser.parse_args()
+    
+    result = measure(module = args.module, repeat = args.repeat)
+    result['budget'] = args.budget
+    
+    sys.stdout.write('%s\n' % json.dumps(result, indent = 2))
+    
+    if (
+        result['seconds'] > args.budget or
+        result['heavy'] or
+        result['session']
+    ):
+        
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    
+    main()
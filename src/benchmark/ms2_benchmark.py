@@ -0,0 +1,364 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+#  This file is part of the `lipyd` python module
+#
+#  Copyright (c) 2015-2019 - EMBL
+#
+#  File author(s):
+#  Dénes Türei (turei.denes@gmail.com)
+#  Igor Bulanov
+#
+#  Distributed under the GNU GPLv3 License.
+#  See accompanying file LICENSE.txt or copy at
+#      http://www.gnu.org/licenses/gpl-3.0.html
+#
+#  Website: http://denes.omnipathdb.org/
+#
+
+"""
+Benchmarks of the MS2 identification workflow on the example spectra
+shipped in ``lipyd/data/ms2_examples``.
+
+The example scans are replicated into synthetic MGF files of the desired
+size. Each copy gets new scan numbers and its retention times shifted by
+``rt_step`` seconds, hence a feature defined at the RT of a copy matches
+only the scans of that copy.
+
+Measured:
+
+    * ``mgf_index``: indexing of the MGF file by ``mgf.MgfReader``
+    * ``mgf_get_scan``: reading scans by ``MgfReader.get_scan``
+    * ``scan_build``: construction and annotation of ``ms2.Scan`` objects
+    * ``identify``: ``Scan.identify`` and the ``identify`` method of each
+      identifier class (by ``ms2.profiler``)
+    * ``ms2feature_main``: end-to-end ``ms2.MS2Feature.main``
+
+Usage:
+
+    python ms2_benchmark.py --scans 100000 --out ms2_benchmark.json
+
+The results are written in JSON format, compare the files from
+different versions to spot regressions.
+"""
+
+import os
+import sys
+import re
+import time
+import json
+import random
+import argparse
+import platform
+import tempfile
+import datetime
+
+import numpy as np
+
+import lipyd
+import lipyd.common as common
+import lipyd.settings as settings
+import lipyd.mgf as mgf
+import lipyd.ms2 as ms2
+import lipyd.moldb as moldb
+
+
+EXAMPLES = {
+    'neg': 'mgf_neg_examples',
+    'pos': 'mgf_pos_examples',
+}
+
+_rescan = re.compile(r'scan=(\d+)')
+_rertinseconds = re.compile(r'^RTINSECONDS=([\d\.]+)', re.M)
+
+
+def read_example_scans(ionmode):
+    """
+    Returns the scans from the example MGF file as list of strings.
+    """
+    
+    with open(settings.get(EXAMPLES[ionmode]), 'r') as fp:
+        
+        content = fp.read()
+    
+    return [
+        'BEGIN IONS%s' % block
+        for block in content.split('BEGIN IONS')[1:]
+        # skipping empty blocks
+        if 'PEPMASS' in block
+    ]
+
+
+def synthetic_mgf(ionmode, n_scans, path, rt_step = 120.):
+    """
+    Writes an MGF file with ``n_scans`` scans by replicating the example
+    scans.
+    
+    Returns
+    -------
+    List of tuples with precursor m/z and RT (minutes) of the scans
+    in the first position of each copy.
+    """
+    
+    scans = read_example_scans(ionmode)
+    scan_id = 0
+    features = []
+    
+    with open(path, 'w') as fp:
+        
+        for i in range(n_scans):
+            
+            copy, j = divmod(i, len(scans))
+            scan_id += 1
+            
+            block = _rescan.sub('scan=%u' % scan_id, scans[j])
+            rt = float(_rertinseconds.search(block).group(1))
+            rt += copy * rt_step
+            block = _rertinseconds.sub('RTINSECONDS=%.06f' % rt, block)
+            
+            fp.write(block)
+            
+            if not block.endswith('\n'):
+                
+                fp.write('\n')
+            
+            pepmass = re.search(r'^PEPMASS=([\d\.]+)', block, re.M)
+            features.append((float(pepmass.group(1)), rt / 60.))
+    
+    return features
+
+
+def _result(n, seconds, **kwargs):
+    
+    result = {
+        'n': n,
+        'seconds': seconds,
+        'per_second': n / seconds if seconds else None,
+    }
+    result.update(kwargs)
+    
+    return result
+
+
+def bench_mgf_index(path):
+    
+    t0 = time.perf_counter()
+    reader = mgf.MgfReader(path, charge = None)
+    seconds = time.perf_counter() - t0
+    
+    return reader, _result(
+        len(reader),
+        seconds,
+        mbytes_per_second = os.path.getsize(path) / 1e6 / seconds,
+    )
+
+
+def bench_get_scan(reader, n):
+    
+    idx = np.random.randint(0, len(reader), n)
+    
+    t0 = time.perf_counter()
+    
+    for i in idx:
+        
+        reader.get_scan(i)
+    
+    return _result(n, time.perf_counter() - t0)
+
+
+def bench_scan_build(reader, ionmode, n):
+    
+    idx = np.random.randint(0, len(reader), n)
+    peaks = [reader.get_scan(i) for i in idx]
+    # the database lookups are not part of this benchmark
+    records = {}
+    
+    for i in idx:
+        
+        precursor = reader.mgfindex[i, 0]
+        
+        if precursor not in records:
+            
+            records[precursor] = moldb.adduct_lookup(precursor, ionmode)
+    
+    scans = []
+    
+    t0 = time.perf_counter()
+    
+    for i, sc in zip(idx, peaks):
+        
+        precursor = reader.mgfindex[i, 0]
+        
+        scans.append(
+            ms2.Scan(
+                mzs = sc[:,0],
+                intensities = sc[:,1],
+                ionmode = ionmode,
+                precursor = precursor,
+                ms1_records = records[precursor],
+                scan_id = reader.mgfindex[i, 3],
+            )
+        )
+    
+    return scans, _result(n, time.perf_counter() - t0)
+
+
+def bench_identify(scans):
+    
+    ms2.profiler.reset()
+    
+    t0 = time.perf_counter()
+    
+    with ms2.profiler:
+        
+        for scan in scans:
+            
+            scan.identify()
+    
+    seconds = time.perf_counter() - t0
+    
+    by_class = dict(
+        (
+            rec.cls,
+            {
+                'n': rec.calls,
+                'seconds': rec.time,
+                'per_second': rec.per_second,
+            },
+        )
+        for rec in ms2.profiler.report()
+        if rec.method == 'identify' and rec.cls != 'Scan'
+    )
+    
+    return _result(len(scans), seconds, by_class = by_class)
+
+
+def bench_ms2feature_main(reader, features, ionmode, n):
+    
+    features = random.sample(features, min(n, len(features)))
+    resources = {('A', 1): reader}
+    
+    t0 = time.perf_counter()
+    
+    for mz, rt in features:
+        
+        feature = ms2.MS2Feature(
+            mz = mz,
+            ionmode = ionmode,
+            resources = resources,
+            rt = rt,
+        )
+        feature.main()
+    
+    return _result(len(features), time.perf_counter() - t0)
+
+
+def run(
+        n_scans = 100000,
+        n_get_scan = 10000,
+        n_scan_build = 2000,
+        n_features = 500,
+        ionmodes = ('neg', 'pos'),
+        workdir = None,
+        seed = 1,
+    ):
+    """
+    Runs all benchmarks for all ion modes.
+    
+    Returns
+    -------
+    ``dict`` with the results and the details of the environment.
+    """
+    
+    random.seed(seed)
+    np.random.seed(seed)
+    
+    workdir = workdir or tempfile.mkdtemp()
+    results = {}
+    
+    # the database is built before the measurements
+    moldb.init_db()
+    
+    for ionmode in ionmodes:
+        
+        path = os.path.join(workdir, 'synthetic_%s.mgf' % ionmode)
+        features = synthetic_mgf(ionmode, n_scans, path)
+        
+        reader, res_index = bench_mgf_index(path)
+        res_get_scan = bench_get_scan(reader, n_get_scan)
+        scans, res_scan_build = bench_scan_build(
+            reader,
+            ionmode,
+            n_scan_build,
+        )
+        res_identify = bench_identify(scans)
+        res_main = bench_ms2feature_main(
+            reader,
+            features,
+            ionmode,
+            n_features,
+        )
+        
+        results[ionmode] = {
+            'mgf_index': res_index,
+            'mgf_get_scan': res_get_scan,
+            'scan_build': res_scan_build,
+            'identify': res_identify,
+            'ms2feature_main': res_main,
+        }
+        
+        os.remove(path)
+    
+    return {
+        'lipyd_version': lipyd.__version__,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'date': datetime.datetime.now().isoformat(),
+        'parameters': {
+            'n_scans': n_scans,
+            'n_get_scan': n_get_scan,
+            'n_scan_build': n_scan_build,
+            'n_features': n_features,
+            'seed': seed,
+        },
+        'results': results,
+    }
+
+
+def main():
+    
+    parser = argparse.ArgumentParser(
+        description = 'Benchmarks of the lipyd MS2 workflow.'
+    )
+    parser.add_argument('--scans', type = int, default = 100000)
+    parser.add_argument('--get-scan', type = int, default = 10000)
+    parser.add_argument('--scan-build', type = int, default = 2000)
+    parser.add_argument('--features', type = int, default = 500)
+    parser.add_argument('--ionmodes', nargs = '+', default = ['neg', 'pos'])
+    parser.add_argument('--workdir', default = None)
+    parser.add_argument('--seed', type = int, default = 1)
+    parser.add_argument('--out', default = 'ms2_benchmark.json')
+    args = parser.parse_args()
+    
+    result = run(
+        n_scans = args.scans,
+        n_get_scan = args.get_scan,
+        n_scan_build = args.scan_build,
+        n_features = args.features,
+        ionmodes = args.ionmodes,
+        workdir = args.workdir,
+        seed = args.seed,
+    )
+    
+    with open(args.out, 'w') as fp:
+        
+        json.dump(result, fp, indent = 2)
+    
+    sys.stdout.write('Benchmark results written to `%s`.\n' % args.out)
+
+
+if __name__ == '__main__':
+    
+    main()
@@ -17,47 +17,213 @@
 #  Website: http://denes.omnipathdb.org/
 #
 
-from past.builtins import xrange, range
+"""
+Alignment of features across samples.
+"""
 
-import itertools
+from past.builtins import xrange, range
 
 import numpy as np
 
 import lipyd.lookup as lookup
 
 
-def align(*arrays, tolerance = 5):
+def align(*arrays, tolerance = 5, rts = None, rt_tolerance = None):
+    """
+    Aligns the features of any number of samples by their m/z and
+    optionally by their retention time.
     
-    narrays = len(arrays)
+    The m/z values of all samples are sorted together and clusters are
+    formed in one sweep: a new cluster starts wherever the difference
+    between two consecutive values is larger than the tolerance. If
+    retention times are provided the clusters are split the same way
+    along the RT. Finally clusters containing more than one feature from
+    the same sample or wider than twice the tolerance are split greedily
+    in the order of m/z. Missing values (``nan``) are not aligned.
     
-    array  = np.concatenate(arrays)
-    # indices within arrays
-    idx    = np.concatenate(tuple(
-        np.arange(len(a))
-        for a in arrays
-    ))
+    Parameters
+    ----------
+    *arrays : numpy.ndarray
+        One dimensional arrays of m/z values, one for each sample.
+    tolerance : float
+        Tolerance in ppm.
+    rts : list
+        One dimensional arrays of retention times, one for each sample,
+        the same shapes as ``arrays``.
+    rt_tolerance : float
+        Tolerance of retention times, in the units of ``rts``. If
+        ``None`` retention times are not considered.
+    
+    Returns
+    -------
+    Tuple of two arrays: the centroid m/z of each aligned feature and
+    an integer array of features x samples with the index of the feature
+    in each sample, -1 where the feature is missing from the sample.
+    Features are ordered by their centroid m/z.
+    """
+    
+    nsamples = len(arrays)
+    arrays = [np.asarray(a, dtype = np.float64) for a in arrays]
+    sizes = np.array([a.shape[0] for a in arrays], dtype = np.int64)
+    
+    mzs = np.concatenate(arrays) if arrays else np.array([])
     # which array the value belongs to
-    iarray = np.concatenate(tuple(
-        np.full(a.shape, i)
-        for i, a in enumerate(arrays)
+    isample = np.repeat(np.arange(nsamples, dtype = np.int64), sizes)
+    # indices within arrays
+    idx = (
+        np.arange(mzs.shape[0], dtype = np.int64) -
+        np.repeat(np.cumsum(sizes) - sizes, sizes)
+    )
+    
+    use_rt = rts is not None and rt_tolerance is not None
+    valid = ~np.isnan(mzs)
+    
+    if use_rt:
+        
+        rt = np.concatenate([np.asarray(r, dtype = np.float64) for r in rts])
+        valid &= ~np.isnan(rt)
+        rt = rt[valid]
+    
+    mzs = mzs[valid]
+    isample = isample[valid]
+    idx = idx[valid]
+    
+    if not mzs.shape[0]:
+        
+        return np.array([]), np.full((0, nsamples), -1, dtype = np.int64)
+    
+    # sort all arrays by m/z
+    isort = mzs.argsort(kind = 'mergesort')
+    mzs = mzs[isort]
+    isample = isample[isort]
+    idx = idx[isort]
+    # tolerance in Da at each value
+    tol = lookup.ppm_tolerance(tolerance, mzs)
+    
+    labels = _labels(np.diff(mzs) > tol[1:])
+    
+    if use_rt:
+        
+        rt = rt[isort]
+        
+        # within the m/z clusters sorting by RT and splitting
+        # where the RT difference is larger than the tolerance
+        isort = np.lexsort((rt, labels))
+        mzs, isample, idx, tol, rt, labels = (
+            a[isort] for a in (mzs, isample, idx, tol, rt, labels)
+        )
+        labels = _labels((np.diff(labels) != 0) | (np.diff(rt) > rt_tolerance))
+        
+        # within the new clusters back to the order of m/z
+        isort = np.lexsort((mzs, labels))
+        mzs, isample, idx, tol, labels = (
+            a[isort] for a in (mzs, isample, idx, tol, labels)
+        )
+    
+    labels = _split_conflicts(labels, mzs, isample, tol)
+    
+    nfeatures = labels[-1] + 1
+    centroids = (
+        np.bincount(labels, weights = mzs) /
+        np.bincount(labels)
+    )
+    
+    result = np.full((nfeatures, nsamples), -1, dtype = np.int64)
+    result[labels, isample] = idx
+    
+    iorder = centroids.argsort(kind = 'mergesort')
+    
+    return centroids[iorder], result[iorder]
+
+
+def _labels(breaks):
+    """
+    Creates cluster labels from a boolean array telling where a new
+    cluster starts (between two consecutive elements).
+    """
+    
+    return np.concatenate((
+        np.zeros(1, dtype = np.int64),
+        np.cumsum(breaks, dtype = np.int64),
     ))
-    # keep track if elements have been used already
-    used = np.full(iarray.shape, False)
+
+
+def _split_conflicts(labels, mzs, isample, tol):
+    """
+    Splits the clusters with more than one element from the same sample
+    or wider than twice the tolerance. Elements must be sorted by label
+    and within each cluster by m/z. Returns new labels.
+    """
+    
+    starts = np.flatnonzero(np.concatenate(([True], np.diff(labels) != 0)))
+    ends = np.concatenate((starts[1:], [labels.shape[0]]))
     
-    # sort all arrays by values
-    isort  = array.argsort()
-    array  = array[isort]
-    idx    = idx[isort]
-    iarray = iarray[isort]
+    conflict = mzs[ends - 1] - mzs[starts] > 2 * tol[starts]
     
-    # here we collect the lines of the result array
-    result = []
+    isort = np.lexsort((isample, labels))
+    duplicate = (
+        (np.diff(labels[isort]) == 0) &
+        (np.diff(isample[isort]) == 0)
+    )
+    conflict[labels[isort][1:][duplicate]] = True
     
-    # these are the array memberships
-    for i, val in enumerate(array):
+    if not conflict.any():
         
-        partners = lookup.findall(array, val)
+        return labels
+    
+    # number of the subcluster within each cluster
+    sub = np.zeros(labels.shape[0], dtype = np.int64)
+    
+    for start, end in zip(starts[conflict], ends[conflict]):
+        
+        # splitting recursively into two parts with the lowest sum of
+        # squared deviations until none of the parts have conflicts
+        parts = [(start, end)]
+        bounds = []
         
-        result.append((i, partners))
+        while parts:
+            
+            first, last = parts.pop()
+            
+            if (
+                mzs[last - 1] - mzs[first] > 2 * tol[first] or
+                np.unique(isample[first:last]).shape[0] < last - first
+            ):
+                
+                split = first + _split_point(mzs[first:last])
+                parts.extend(((first, split), (split, last)))
+            
+            else:
+                
+                bounds.append(first)
+        
+        for first in bounds:
+            
+            sub[first:end] += 1
+    
+    return _labels((np.diff(labels) != 0) | (np.diff(sub) != 0))
+
+
+def _split_point(values):
+    """
+    Finds the point to split a sorted array into two parts with the
+    lowest total sum of squared deviations from the means of the parts.
+    Returns the index of the first element of the second part.
+    """
+    
+    values = values - values.mean()
+    n = values.shape[0]
+    
+    nleft = np.arange(1, n, dtype = np.float64)
+    nright = n - nleft
+    sleft = np.cumsum(values)[:-1]
+    sleft2 = np.cumsum(values ** 2)[:-1]
+    sright = sleft[-1] + values[-1] - sleft
+    sright2 = sleft2[-1] + values[-1] ** 2 - sleft2
+    
+    sse = (
+        sleft2 - sleft ** 2 / nleft +
+        sright2 - sright ** 2 / nright
+    )
     
-    return array, result
+    return int(sse.argmin()) + 1
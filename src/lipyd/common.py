@@ -639,15 +639,108 @@ def ppm(reference, other):
 def ensure_array(arr):
     """
     If `arr` is not a `numpy.ndarray` instance attempts to convert it.
+    `None` is returned unchanged.
     """
     
-    if not isinstance(arr, np.ndarray):
+    if arr is not None and not isinstance(arr, np.ndarray):
         
         arr = np.array(arr)
     
     return arr
 
 
+def open_memmap(path, shape, dtype):
+    """
+    Creates a memory-mapped array in a new ``.npy`` file.
+    For empty arrays returns an ordinary array as those can not be mapped.
+    """
+    
+    if not np.prod(shape):
+        
+        return np.empty(shape, dtype = dtype)
+    
+    return np.lib.format.open_memmap(
+        path,
+        mode = 'w+',
+        dtype = dtype,
+        shape = tuple(shape),
+    )
+
+
+def to_memmap(arr, path, chunk_size = 10000):
+    """
+    Writes an array into a new ``.npy`` file chunk by chunk and returns
+    it as a memory-mapped array.
+    
+    Parameters
+    ----------
+    arr : numpy.ndarray
+        The array.
+    path : str
+        Path to the new file.
+    chunk_size : int
+        Number of elements (along the first axis) copied at once.
+    """
+    
+    result = open_memmap(path, arr.shape, arr.dtype)
+    
+    for i in xrange(0, arr.shape[0], chunk_size):
+        
+        result[i:i + chunk_size] = arr[i:i + chunk_size]
+    
+    if isinstance(result, np.memmap):
+        
+        result.flush()
+    
+    return result
+
+
+def memmap_take(arr, idx, path, axis = 0, chunk_size = 10000):
+    """
+    Selects elements of an array along an axis like ``numpy.take`` but
+    writes the result into a new memory-mapped ``.npy`` file chunk by
+    chunk, so no full size copy is allocated in the memory.
+    
+    Parameters
+    ----------
+    arr : numpy.ndarray
+        The array, usually itself a memory-mapped array.
+    idx : numpy.ndarray
+        Index array or boolean selection.
+    path : str
+        Path to the new file.
+    axis : int
+        The axis to select along.
+    chunk_size : int
+        Number of elements along the first axis processed at once.
+    """
+    
+    idx = ensure_array(idx)
+    
+    if idx.dtype == np.bool_:
+        
+        idx = np.flatnonzero(idx)
+    
+    shape = list(arr.shape)
+    shape[axis] = idx.shape[0]
+    
+    result = open_memmap(path, shape, arr.dtype)
+    
+    for i in xrange(0, shape[0], chunk_size):
+        
+        result[i:i + chunk_size] = (
+            arr[idx[i:i + chunk_size]]
+                if axis == 0 else
+            np.take(arr[i:i + chunk_size], idx, axis = axis)
+        )
+    
+    if isinstance(result, np.memmap):
+        
+        result.flush()
+    
+    return result
+
+
 def _is_numeric(value, regex):
     
     if hasattr(value, 'decode'):
@@ -20,6 +20,10 @@
 from future.utils import iteritems
 from past.builtins import xrange, range
 
+import operator
+import warnings
+import itertools
+
 import numpy as np
 
 import lipyd.sampleattrs as sampleattrs
@@ -71,10 +75,65 @@ class Feature(object):
         )
 
 
+def nanle(a, b):
+    """
+    Less or equal comparison which is true if any of the operands is
+    `nan`. Works on scalars and elementwise on arrays.
+    """
+    
+    with np.errstate(invalid = 'ignore'):
+        
+        return np.isnan(a) | np.isnan(b) | (a <= b)
+
+
+def sample_indices(samples, sample_ids):
+    """
+    Returns an array with the column indices of the samples with IDs
+    ``sample_ids`` in ``samples``.
+    
+    samples : sample.SampleSet
+        A ``lipyd.sample.SampleSet`` object.
+    sample_ids : list
+        Sample IDs.
+    """
+    
+    return np.array(
+        [
+            samples.attrs.get_sample_index(sample_id)
+            for sample_id in sample_ids
+        ],
+        dtype = np.int64,
+    )
+
+
+def _nanmax_rows(a):
+    """
+    Row-wise ``nanmax`` of a 2D array silently returning `nan` for rows
+    with only `nan` values or without any column.
+    """
+    
+    if not a.shape[1]:
+        
+        return np.full(a.shape[0], np.nan)
+    
+    with warnings.catch_warnings():
+        
+        warnings.simplefilter('ignore', RuntimeWarning)
+        
+        return np.nanmax(a, axis = 1)
+
+
 class FeatureAnalyzer(object):
     
     
-    def __init__(self, names, samples, method, **variables):
+    def __init__(
+            self,
+            names,
+            samples,
+            method,
+            vectorized = False,
+            **variables
+        ):
         """
         Serves for analysis of features using data in the feature vs. sample
         data arrays in ``SampleSet`` objects and feature variables in
@@ -96,6 +155,11 @@ class FeatureAnalyzer(object):
             for each sample one by one. At the end the resulted array
             will be registered as a new variable in the ``FeatureAttrs``
             object of the ``SampleSet`` under the attribute name ``name``.
+        vectorized : bool
+            The method is called only once with the whole arrays instead
+            of the values of one feature. The first axis of each array
+            corresponds to the features. The method should return arrays
+            of the same length as the number of features.
         **variables :
             Custom ``SampleData`` or derived objects. Will be provided to
             ``method`` by their argument name.
@@ -108,6 +172,7 @@ class FeatureAnalyzer(object):
         )
         self.samples = samples
         self.method = method
+        self.vectorized = vectorized
         self.variables = variables
         
         result = self.run()
@@ -123,6 +188,10 @@ class FeatureAnalyzer(object):
         results.
         """
         
+        if self.vectorized:
+            
+            return self.run_vectorized()
+        
         result = [[] for _ in xrange(len(self.names))]
         
         for i in xrange(len(self.samples)):
@@ -151,6 +220,31 @@ class FeatureAnalyzer(object):
         result = tuple(np.array(r) for r in result)
         
         return result
+    
+    
+    def run_vectorized(self):
+        """
+        Calls the method once with the full arrays of all features and
+        returns a tuple of arrays of the results.
+        """
+        
+        featurevars = {}
+        
+        for var in self.samples.feattrs.var:
+            
+            featurevars[var] = getattr(self.samples.feattrs, var)
+        
+        for var in self.samples.var:
+            
+            featurevars[var] = getattr(self.samples, var)
+        
+        result = self.method(**featurevars, **self.variables)
+        
+        if not isinstance(result, tuple):
+            
+            result = (result,)
+        
+        return tuple(np.asarray(r) for r in result)
 
 
 class ProfileAnalyzer(FeatureAnalyzer):
@@ -161,16 +255,38 @@ class ProfileAnalyzer(FeatureAnalyzer):
             protein = None,
             condition = None,
             profile_filter_args = (),
+            vectorized = True,
         ):
+        """
+        Selects the features with intensity profile matching the protein
+        profile across the samples.
+        
+        samples : sample.SampleSet
+            A ``lipyd.sample.SampleSet`` object.
+        profile_filter_args : dict
+            Sample categories by protein content (``peak``, ``small``,
+            ``tiny`` and ``none``) as keys and tuples of sample IDs,
+            threshold and operator as values. The normalized intensity
+            of each sample compared to the threshold by the operator.
+        vectorized : bool
+            Evaluate the profiles of all features at once by array
+            operations instead of calling ``profile_method`` for each
+            feature. The results are the same.
+        """
         
         self.protein = protein
         self.condition = condition
         
-        feature.FeatureAnalyzer.__init__(
+        FeatureAnalyzer.__init__(
             self,
             names = ('profile',),
             samples = samples,
-            method = self.profile_method,
+            method = (
+                self.profile_method_vectorized
+                    if vectorized else
+                self.profile_method
+            ),
+            vectorized = vectorized,
             _samples = samples,
             profile_filter_args = profile_filter_args,
             protein = protein,
@@ -271,6 +387,92 @@ class ProfileAnalyzer(FeatureAnalyzer):
                 return False
         
         return True
+    
+    @staticmethod
+    def profile_method_vectorized(
+            intens_norm,
+            _samples,
+            profile_filter_args = (),
+            protein = None,
+            condition = None,
+            **kwargs,
+        ):
+        """
+        Array version of ``profile_method``: ``intens_norm`` is a features
+        by samples array and a boolean array is returned with one element
+        for each feature. The sample IDs are resolved to column indices
+        only once.
+        """
+        
+        intens_norm = np.asarray(intens_norm, dtype = np.float64)
+        
+        ipeak = sample_indices(_samples, profile_filter_args['peak'][0])
+        isome = sample_indices(
+            _samples,
+            itertools.chain(
+                profile_filter_args['small'][0],
+                profile_filter_args['tiny'][0],
+            ),
+        )
+        inone = sample_indices(_samples, profile_filter_args['none'][0])
+        
+        # exclude those completely missing from the peak
+        result = np.logical_not(
+            np.all(np.isnan(intens_norm[:,ipeak]), axis = 1)
+        )
+        
+        # apply single fraction operators
+        
+        with np.errstate(invalid = 'ignore'):
+            
+            for (
+                label,
+                (sample_ids, threshold, op)
+            ) in iteritems(profile_filter_args):
+                
+                values = intens_norm[:,sample_indices(_samples, sample_ids)]
+                passed = op(values, threshold)
+                
+                if op == operator.le:
+                    
+                    passed |= np.isnan(values)
+                
+                result &= np.all(passed, axis = 1)
+        
+        # additional constraints
+        
+        some_protein = intens_norm[:,isome]
+        some_protein_min = (
+            np.min(some_protein, axis = 1)
+                if some_protein.shape[1] else
+            np.full(intens_norm.shape[0], np.nan)
+        )
+        
+        result &= nanle(
+            _nanmax_rows(intens_norm[:,inone]) * .6,
+            some_protein_min,
+        )
+        
+        # exclude hollow shape profiles
+        
+        peak_area = np.concatenate((
+            ipeak,
+            sample_indices(_samples, profile_filter_args['small'][0]),
+        ))[1:-1]
+        
+        if len(peak_area):
+            
+            with np.errstate(invalid = 'ignore'):
+                
+                double = intens_norm[:,peak_area] * 2
+                hollow = (
+                    (double < intens_norm[:,peak_area - 1]) &
+                    (double < intens_norm[:,peak_area + 1])
+                )
+            
+            result &= np.logical_not(np.any(hollow, axis = 1))
+        
+        return result
 
 
 class PeakSize(FeatureAnalyzer):
@@ -283,6 +485,7 @@ class PeakSize(FeatureAnalyzer):
             threshold = 2.0,
             names = ('peaksize', 'peaksize_value'),
             min_max = 'min',
+            vectorized = True,
         ):
         """
 
@@ -304,6 +507,9 @@ class PeakSize(FeatureAnalyzer):
             selection must be `threshold` times higher than the highest in
             the background. If `max` the `highest` element in the selection
             considered.
+        vectorized : bool
+            Calculate the peak sizes of all features at once by array
+            operations instead of calling ``peak_size`` for each feature.
         """
         
         self.threshold = threshold
@@ -312,7 +518,12 @@ class PeakSize(FeatureAnalyzer):
             self,
             names = names,
             samples = samples,
-            method = self.peak_size,
+            method = (
+                self.peak_size_vectorized
+                    if vectorized else
+                self.peak_size
+            ),
+            vectorized = vectorized,
             sample_selection = sample_selection,
             min_max = min_max,
         )
@@ -339,6 +550,50 @@ class PeakSize(FeatureAnalyzer):
                 np.inf
             ),
         )
+    
+    def peak_size_vectorized(
+            self,
+            intensities,
+            sample_selection,
+            min_max,
+            **kwargs,
+        ):
+        """
+        Array version of ``peak_size``: ``intensities`` is a features by
+        samples array, returns a boolean and a float array.
+        """
+        
+        _method = np.max if min_max == 'max' else np.min
+        sample_selection = np.asarray(sample_selection, dtype = np.bool_)
+        intensities = np.asarray(intensities, dtype = np.float64)
+        protein   = intensities[:,sample_selection]
+        noprotein = intensities[:,np.logical_not(sample_selection)]
+        
+        protein_nan = np.any(np.isnan(protein), axis = 1)
+        noprotein_nan = np.all(np.isnan(noprotein), axis = 1)
+        
+        protein_value = (
+            _method(protein, axis = 1)
+                if protein.shape[1] else
+            np.full(intensities.shape[0], np.nan)
+        )
+        noprotein_max = _nanmax_rows(noprotein)
+        
+        with np.errstate(invalid = 'ignore', divide = 'ignore'):
+            
+            peaksize = protein_value > noprotein_max * self.threshold
+            value = np.where(
+                noprotein_max > 0,
+                protein_value / noprotein_max,
+                np.inf,
+            )
+        
+        peaksize[noprotein_nan] = True
+        value[noprotein_nan] = np.inf
+        peaksize[protein_nan] = False
+        value[protein_nan] = 0.0
+        
+        return peaksize, value
 
 
 class Slope(FeatureAnalyzer):
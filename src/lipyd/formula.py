@@ -53,12 +53,18 @@ class Formula(mass.MassBase, mz.Mz):
             _attrs = copy.deepcopy(formula.attrs.__dict__)
             charge = formula.charge
             isotope = formula.isotope
-            formula = formula.formula
+            formula = formula.vector
             self.attrs = _attrs.update(self.attrs.__dict__)
         
         mass.MassBase.__init__(self, formula, charge, isotope, **kwargs)
         
-        if self.formula == '':
+        if self._vector is not None:
+            
+            # the string is regenerated from the atom counts when needed,
+            # in the canonical order of the elements
+            self._formula = None
+        
+        if self.has_formula() and not self.vector.any():
             
             self.mass = 0.0
             self.mass_calculated = True
@@ -68,9 +74,6 @@ class Formula(mass.MassBase, mz.Mz):
             self.formula = ''
             self.mass_calculated = True
         
-        self.reset_atoms()
-        self.add(self.formula if self.formula else '')
-        
         mz.Mz.__init__(
             self,
             mz = self.mass / z,
@@ -110,12 +113,8 @@ class Formula(mass.MassBase, mz.Mz):
             
         else:
             
-            new = Formula('%s%s' % (
-                    self.formula,
-                    other.formula
-                        if hasattr(other, 'formula')
-                        else other
-                ),
+            new = Formula(
+                self.vector + self._other_vector(other),
                 charge = self.charge + (
                     other.charge
                     if hasattr(other, 'charge')
@@ -137,7 +136,7 @@ class Formula(mass.MassBase, mz.Mz):
                         getattr(self.attrs, a) + getattr(other.attrs, a)
                     )
         
-        if new.mass == 0.0 or new.formula == '':
+        if new.mass == 0.0 or (new.has_formula() and not new.vector.any()):
             
             new.formula = ''
             new.mass_calculated = True
@@ -167,7 +166,7 @@ class Formula(mass.MassBase, mz.Mz):
             
         else:
             
-            self.add(other.formula if hasattr(other, 'formula') else other)
+            self.add(self._other_vector(other))
         
         self.charge += (other.charge if hasattr(other, 'charge') else 0)
         self.isotope += (other.isotope if hasattr(other, 'isotope') else 0)
@@ -198,7 +197,7 @@ class Formula(mass.MassBase, mz.Mz):
             
         else:
             
-            self.sub(other.formula if hasattr(other, 'formula') else other)
+            self.sub(self._other_vector(other))
         
         self.charge -= (other.charge if hasattr(other, 'charge') else 0)
         self.isotope -= (other.isotope if hasattr(other, 'isotope') else 0)
@@ -211,13 +210,15 @@ class Formula(mass.MassBase, mz.Mz):
             
             return self
         
-        for elem, cnt in iteritems(self.atoms):
+        self.isotope = self.isotope * other
+        
+        if self.has_formula():
             
-            self.counts[elem] = cnt * other
+            self.vector = self.vector * other
         
         self.calc_mass()
-        self.formula_from_dict(self.atoms)
-        self.isotope = self.isotope * other
+        
+        return self
     
     def __mul__(self, other):
         
@@ -225,14 +226,10 @@ class Formula(mass.MassBase, mz.Mz):
             
             return copy.deepcopy(self)
         
-        new_atoms = defaultdict(int)
-        
-        for elem, cnt in iteritems(self.atoms):
-            
-            new_atoms[elem] = cnt * other
-        
         return Formula(
-            **new_atoms,
+            self.vector * other
+                if self.has_formula() else
+            None,
             isotope = self.isotope * other,
             charge = self.charge
         )
@@ -241,20 +238,42 @@ class Formula(mass.MassBase, mz.Mz):
         
         yield self
     
+    @staticmethod
+    def _other_vector(other):
+        
+        return (
+            other.vector
+                if hasattr(other, 'vector') else
+            mass.formula_to_vector(other)
+                if hasattr(other, 'lower') else
+            other
+        )
+    
     def reset_atoms(self):
         """
-        Creates an empty ``atoms`` dict (this means empty formula and
-        zero mass).
+        Drops the atom counts processed from the ``formula`` string,
+        they will be processed again when necessary.
         """
         
-        self._atoms = defaultdict(int)
+        if self._formula is not None:
+            
+            self._vector = None
     
     def as_mass(self):
         """
         Returns this ``Formula`` instance as ``mass.MassBase`` object.
         """
         
-        return MassBase(self.formula, self.charge, self.isotope)
+        return mass.MassBase(self.vector, self.charge, self.isotope)
+    
+    
+    def _vector_or_zeros(self):
+        
+        return (
+            self.vector
+                if self.has_formula() else
+            np.zeros(len(mass.elements), dtype = np.int64)
+        )
     
     
     def add(self, formula):
@@ -263,12 +282,11 @@ class Formula(mass.MassBase, mz.Mz):
         
         Parameters
         ----------
-        formula : str
-            Chemical formula.
+        formula : str,numpy.ndarray
+            Chemical formula or vector of atom counts.
         """
         
-        for elem, cnt in mass._re_form.findall(formula):
-            self.atoms[elem] += int(cnt or '1')
+        self.vector = self._vector_or_zeros() + self._other_vector(formula)
         
         self.update()
     
@@ -279,31 +297,38 @@ class Formula(mass.MassBase, mz.Mz):
 
         Parameters
         ----------
-        formula : str
-            Chemical formula.
+        formula : str,numpy.ndarray
+            Chemical formula or vector of atom counts.
         """
         
-        for elem, cnt in mass._re_form.findall(formula):
-            self.atoms[elem] -= int(cnt or '1')
+        vector = self._vector_or_zeros() - self._other_vector(formula)
+        negative = (vector < 0).nonzero()[0]
+        
+        if len(negative):
             
-            if self.atoms[elem] < 0:
-                
-                raise ValueError('Can not remove %s from %s: '
-                    'too few %s atoms!' % (formula, self.formula, elem))
+            raise ValueError('Can not remove %s from %s: '
+                'too few %s atoms!' % (
+                    formula
+                        if hasattr(formula, 'lower') else
+                    mass.vector_to_formula(self._other_vector(formula)),
+                    self.formula,
+                    mass.elements[negative[0]],
+                )
+            )
+        
+        self.vector = vector
         
         self.update()
     
     
     def update(self):
         """
-        Updates the ``formula`` (string) from the ``atoms`` dict and
-        re-calculates the mass.
+        Re-calculates the mass from the atom counts. The ``formula``
+        string is created only when it is accessed.
         """
         
-        if len(self.atoms):
+        if self.has_formula():
             
-            self.formula = ''.join('%s%u' % (elem, self.atoms[elem])
-                                    for elem in sorted(self.atoms.keys()))
             self.calc_mass()
     
     
@@ -21,8 +21,11 @@ from __future__ import print_function
 from future.utils import iteritems
 from past.builtins import xrange, range, reduce
 
+import os
 import sys
 import imp
+import hashlib
+import pickle
 import itertools
 import collections
 import copy
@@ -33,6 +36,7 @@ import lipyd.formula as formula
 import lipyd.settings as settings
 import lipyd.lookup as lookup_
 import lipyd.session as session
+import lipyd._version as _version
 
 
 class FragmentDatabaseAggregator(object):
@@ -44,6 +48,13 @@ class FragmentDatabaseAggregator(object):
         'FAL': 'fal_default'
     }
     
+    # the arrays and dicts stored in the cache
+    cached_attrs = (
+        'mz', 'charge', 'c', 'u', 'names',
+        'fragtype', 'fragtypes', 'chaintype', 'chaintypes',
+        'headgroup', 'headgroups', 'constraints',
+    )
+    
     def __init__(
             self,
             ionmode = 'pos',
@@ -54,7 +65,8 @@ class FragmentDatabaseAggregator(object):
             fa_default  = None,
             sph_default = None,
             fal_default = None,
-            build = True
+            build = True,
+            cache = None,
         ):
         """
         Builds and serves a database of MS2 fragment ions according to
@@ -94,9 +106,13 @@ class FragmentDatabaseAggregator(object):
             fragment series.
         :param bool build:
             Build the fragment database at initialization.
+        :param bool cache:
+            Load the database from the cache directory if it has been
+            built already with the same files and parameters, otherwise
+            build it and save it into the cache. By default the
+            `fragdb_cache` setting is used.
         """
         
-        self.fragments = []
         self.ionmode  = ionmode
         self.tolerance = tolerance
         self.files = files
@@ -114,7 +130,9 @@ class FragmentDatabaseAggregator(object):
             'u': (0, 1)
         }
         
+        self.cache = settings.get('fragdb_cache') if cache is None else cache
         self.constraints = {}
+        self.set_columns([])
         
         if build:
             
@@ -143,23 +161,265 @@ class FragmentDatabaseAggregator(object):
 
         """
         
-        self.fragments = []
-        
         self.set_filenames()
-        self.fragments = self.read_files()
-        self.fragments.extend(self.generate_series())
-        self.fragments = np.array(
-            sorted(
-                self.fragments,
-                key = lambda x: x[0]
-            ),
-            dtype = np.object
+        
+        if self.cache and self.load_cache():
+            
+            return
+        
+        fraglines = self.read_files()
+        fraglines.extend(self.generate_series())
+        self.set_columns(fraglines)
+        
+        if self.cache:
+            
+            self.save_cache()
+    
+    def cache_key(self):
+        """Returns an MD5 hash of everything the contents of the database
+        depend on: the ion mode, the checksums of the fragment list files,
+        the homolog series arguments and the version of `lipyd`.
+        """
+        
+        def normalize(obj):
+            
+            iterable = hasattr(obj, '__iter__') and not hasattr(obj, 'lower')
+            
+            return (
+                tuple(sorted((k, normalize(v)) for k, v in iteritems(obj)))
+                    if isinstance(obj, dict) else
+                tuple(sorted(normalize(v) for v in obj))
+                    if isinstance(obj, (set, frozenset)) else
+                tuple(normalize(v) for v in obj)
+                    if iterable else
+                obj
+            )
+        
+        md5 = hashlib.md5()
+        
+        for fname in self.files:
+            
+            with open(fname, 'rb') as fp:
+                
+                md5.update(hashlib.md5(fp.read()).digest())
+        
+        md5.update(repr(normalize([
+            _version.__version__,
+            self.ionmode,
+            self.include,
+            self.exclude,
+            self.fa_default,
+            self.fal_default,
+            self.sph_default,
+        ])).encode('utf-8'))
+        
+        return md5.hexdigest()
+    
+    def get_cache_file(self):
+        """Returns the path to the cache file of this database."""
+        
+        return os.path.join(
+            settings.get('cachedir'),
+            'fragdb-%s-%s.pickle' % (self.ionmode, self.cache_key()),
+        )
+    
+    def load_cache(self):
+        """Loads the database from the cache file.
+        Returns `True` if the cache file exists and could be loaded.
+        """
+        
+        cachefile = self.get_cache_file()
+        
+        if not os.path.exists(cachefile):
+            
+            return False
+        
+        try:
+            
+            with open(cachefile, 'rb') as fp:
+                
+                data = pickle.load(fp)
+        
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            
+            return False
+        
+        for attr in self.cached_attrs:
+            
+            setattr(self, attr, data[attr])
+        
+        self.set_views()
+        
+        return True
+    
+    def save_cache(self):
+        """Saves the database into the cache file."""
+        
+        cachefile = self.get_cache_file()
+        
+        if not os.path.exists(os.path.dirname(cachefile)):
+            
+            os.makedirs(os.path.dirname(cachefile))
+        
+        # other processes might read the file meanwhile hence we write
+        # into a temporary file and rename it only when it's complete
+        tmpfile = '%s.%u.tmp' % (cachefile, os.getpid())
+        
+        with open(tmpfile, 'wb') as fp:
+            
+            pickle.dump(
+                dict(
+                    (attr, getattr(self, attr))
+                    for attr in self.cached_attrs
+                ),
+                fp,
+                protocol = pickle.HIGHEST_PROTOCOL,
+            )
+        
+        os.replace(tmpfile, cachefile)
+    
+    def set_columns(self, fraglines):
+        """Creates the typed arrays of the database from a list of
+        fragment lines.
+        
+        Each fragment line is a list of m/z, name, fragment type,
+        chain type, carbon count, unsaturation and charge. Types
+        are stored as integer codes in the `fragtype`, `chaintype`
+        and `headgroup` arrays, the values themselves in the
+        `fragtypes`, `chaintypes` and `headgroups` tables; the code
+        of missing values is -1, pointing to the `nan` at the end
+        of the tables. Missing carbon counts and unsaturations are
+        also stored as -1. Charged fragments come first and neutral
+        losses (zero charge) after them, both sorted by m/z; the
+        `mz_charged` and `mz_nl` arrays are views of these two parts.
+        
+        Parameters
+        ----------
+        fraglines : list
+            Fragment lines as read from files or generated by the
+            homolog series classes.
+        
+        Returns
+        -------
+        
+        """
+        
+        fraglines = sorted(fraglines, key = lambda fl: (fl[6] == 0, fl[0]))
+        
+        self.mz = np.array([fl[0] for fl in fraglines], dtype = np.float64)
+        self.charge = np.array([fl[6] for fl in fraglines], dtype = np.int8)
+        self.c = np.array(
+            [-1 if self._missing(fl[4]) else fl[4] for fl in fraglines],
+            dtype = np.int16,
+        )
+        self.u = np.array(
+            [-1 if self._missing(fl[5]) else fl[5] for fl in fraglines],
+            dtype = np.int16,
         )
+        self.names = np.array([fl[1] for fl in fraglines], dtype = np.object)
+        self.fragtype, self.fragtypes = self._encode(
+            [fl[2] for fl in fraglines],
+            dtype = np.int16,
+        )
+        self.chaintype, self.chaintypes = self._encode(
+            [fl[3] for fl in fraglines],
+            dtype = np.int8,
+        )
+        self.headgroup, self.headgroups = self._encode(
+            [self._get_headgroups(fl[1], fl[2]) for fl in fraglines],
+            dtype = np.int16,
+        )
+        
+        self.set_views()
+    
+    def set_views(self):
+        """Sets the views and the name index of the typed arrays."""
+        
+        self.n_charged = int(np.count_nonzero(self.charge))
+        self.mz_charged = self.mz[:self.n_charged]
+        self.mz_nl = self.mz[self.n_charged:]
+        
         self.frags_by_name = dict(
-            (frag[1], i)
-            for i, frag in enumerate(self.fragments)
+            (name, i)
+            for i, name in enumerate(self.names)
+        )
+    
+    @staticmethod
+    def _missing(value):
+        
+        return (
+            value is None or
+            value == '' or
+            (isinstance(value, float) and np.isnan(value))
+        )
+    
+    @classmethod
+    def _encode(cls, values, dtype = np.int16):
+        """Encodes a list of values as integer codes.
+        Returns the array of codes and the table of values.
+        """
+        
+        table = sorted(set(v for v in values if not cls._missing(v)))
+        codes = dict((v, i) for i, v in enumerate(table))
+        
+        return (
+            np.array(
+                [-1 if cls._missing(v) else codes[v] for v in values],
+                dtype = dtype,
+            ),
+            # the code of missing values is -1, hence `nan` is the last
+            np.array(table + [np.nan], dtype = np.object),
         )
     
+    def _get_headgroups(self, name, fragtype):
+        """Returns the headgroups from the constraints of a fragment
+        as a semicolon separated string.
+        Constraints of fragments read from files are stored by the
+        name while of the homolog series by the fragment type.
+        """
+        
+        constr = self.get_constraints(name) or self.get_constraints(fragtype)
+        
+        return ';'.join(sorted(set(c.hg for c in constr if c.hg)))
+    
+    def rows(self, idx):
+        """Returns fragment data as 2 dimensional object array.
+        Each row contains m/z, name, fragment type, chain type,
+        carbon count, unsaturation and charge of a fragment,
+        missing values are `nan`.
+        
+        Parameters
+        ----------
+        idx : list,numpy.ndarray
+            Indices of the fragments.
+        
+        Returns
+        -------
+        
+        """
+        
+        idx = np.array(idx, dtype = np.int64)
+        c = self.c[idx]
+        u = self.u[idx]
+        
+        result = np.empty((idx.shape[0], 7), dtype = np.object)
+        result[:,0] = self.mz[idx]
+        result[:,1] = self.names[idx]
+        result[:,2] = self.fragtypes[self.fragtype[idx]]
+        result[:,3] = self.chaintypes[self.chaintype[idx]]
+        result[:,4] = c
+        result[:,4][c < 0] = np.nan
+        result[:,5] = u
+        result[:,5][u < 0] = np.nan
+        result[:,6] = self.charge[idx]
+        
+        return result
+    
+    @property
+    def fragments(self):
+        
+        return self.rows(np.arange(len(self)))
+    
     def __iter__(self):
         
         return self.fragments.__iter__()
@@ -454,11 +714,15 @@ class FragmentDatabaseAggregator(object):
     
     def __getitem__(self, i):
         
-        return self.fragments[i,:]
+        if isinstance(i, (int, np.integer)):
+            
+            return self.rows([i])[0]
+        
+        return self.rows(np.arange(len(self))[i])
     
     def __len__(self):
         
-        return self.fragments.shape[0]
+        return self.mz.shape[0]
     
     def lookup(self, mz, nl = False, tolerance = None):
         """Searches for fragments in the database matching the `mz` within the
@@ -485,22 +749,33 @@ class FragmentDatabaseAggregator(object):
 
         """
         
+        return self.rows(self.lookup_idx(mz, nl = nl, tolerance = tolerance))
+    
+    def lookup_idx(self, mz, nl = False, tolerance = None):
+        """Same as `lookup` but returns the indices of the matching
+        fragments.
+        
+        Parameters
+        ----------
+        mz :
+        
+        nl :
+             (Default value = False)
+        tolerance :
+             (Default value = None)
+        
+        Returns
+        -------
+        
+        """
+        
         idx = lookup_.findall(
-            self.fragments[:,0],
+            self.mz_nl if nl else self.mz_charged,
             mz,
             tolerance or self.tolerance
         )
-        # filtering for NL or not NL
-        idx = [
-            i for i in idx
-            if (
-                nl and self.fragments[i, 6] == 0
-            ) or (
-                not nl and self.fragments[i, 6] != 0
-            )
-        ]
         
-        return self.fragments[idx,:]
+        return np.array(idx, dtype = np.int64) + (self.n_charged if nl else 0)
     
     def lookup_nl(self, mz, precursor, tolerance = None):
         """Searches for neutral loss fragments in the database matching the
@@ -547,7 +822,7 @@ class FragmentDatabaseAggregator(object):
         
         i = self.frags_by_name.get(name, None)
         
-        return self.fragments[i] if i is not None else None
+        return self.rows([i])[0] if i is not None else None
     
     def mz_by_name(self, name):
         """Returns the m/z of a fragment by its name.
@@ -571,7 +846,7 @@ class FragmentDatabaseAggregator(object):
         
         i = self.frags_by_name.get(name, None)
         
-        return self.fragments[i][0] if i is not None else None
+        return float(self.mz[i]) if i is not None else None
 
 
 def init_db(ionmode, **kwargs):
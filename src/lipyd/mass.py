@@ -20,7 +20,6 @@
 from past.builtins import xrange, range
 from future.utils import iteritems
 
-import bs4
 import re
 import warnings
 import imp
@@ -33,12 +32,7 @@ import collections
 
 import numpy as np
 
-try:
-    import pyopenms as oms
-except:
-    pass
-
-import lipyd._curl as _curl
+import lipyd.settings as settings
 
 
 #: Mass of a proton
@@ -60,6 +54,12 @@ _re_form  = re.compile(r'([A-Za-z][a-z]*)([0-9]*)')
 replmi  = re.compile(r'([-+])')
 refloat = re.compile(r'[0-9\.]+')
 
+#: Elements in the order of the atom count vectors,
+#: set up by :py:func:`setup_elements`
+elements = ()
+_element_idx = {}
+_element_mass = np.array([])
+
 
 def formula_to_atoms(formula):
     """
@@ -84,10 +84,95 @@ def formula_to_atoms(formula):
     return atoms
 
 
+def _formula_to_vector(formula):
+    """
+    Converts chemical formula string to a vector of atom counts.
+    The results are cached hence the returned array is read only.
+    The cache is created by :py:func:`setup_elements` with the size
+    in the ``formula_cache_size`` setting, and the function is available
+    as :py:func:`formula_to_vector`.
+    
+    Parameters
+    ----------
+    formula : str
+        Chemical formula, e.g. ``CH3COOH``.
+    
+    Returns
+    -------
+    Array of integers with the count of each element in the order of
+    :py:data:`elements`.
+    """
+    
+    vector = np.zeros(len(elements), dtype = np.int64)
+    
+    for elem, cnt in _re_form.findall(formula):
+        
+        vector[_element_idx[elem]] += int(cnt or '1')
+    
+    vector.setflags(write = False)
+    
+    return vector
+
+
+def atoms_to_vector(atoms):
+    """
+    Converts a dict of atom counts to a vector of atom counts.
+    
+    Parameters
+    ----------
+    atoms : dict
+        Elements as keys and counts as values, e.g. ``{'c': 2, 'h': 6}``.
+    """
+    
+    vector = np.zeros(len(elements), dtype = np.int64)
+    
+    for elem, cnt in iteritems(atoms):
+        
+        vector[_element_idx[elem.capitalize()]] += cnt
+    
+    return vector
+
+
+def vector_to_formula(vector):
+    """
+    Creates a formula string from a vector of atom counts. The elements
+    are in alphabetic order and the counts are always shown, e.g.
+    ``C2H4O2``.
+    """
+    
+    return ''.join(
+        '%s%u' % (elements[i], vector[i])
+        for i in vector.nonzero()[0]
+    )
+
+
+def vector_to_atoms(vector):
+    """
+    Creates a dict of atom counts from a vector of atom counts.
+    """
+    
+    atoms = collections.defaultdict(int)
+    
+    for i in vector.nonzero()[0]:
+        
+        atoms[elements[i]] = int(vector[i])
+    
+    return atoms
+
+
+def vector_mass(vector):
+    """
+    Calculates the exact mass from a vector of atom counts.
+    """
+    
+    return float(np.dot(vector, _element_mass))
+
+
 class MassDatabase(object):
     """
-    Downloads, processes and serves data for atomic and isotopic masses
-    and weights.
+    Serves data for atomic and isotopic masses and weights.
+    By default the data is loaded from the table shipped with the module.
+    Optionally it can be downloaded and processed from CIAAW webpages.
     """
     
     #: URL for atomic masses
@@ -98,7 +183,17 @@ class MassDatabase(object):
     url_abundances = 'http://www.ciaaw.org/isotopic-abundances.htm'
     
     
-    def __init__(self):
+    def __init__(self, fname = None, online = False):
+        """
+        fname : str
+            Path to a table of isotopes as written by ``export_table``.
+            By default the file in the ``isotopes_file`` setting is used.
+        online : bool
+            Download the data from CIAAW instead of reading the table.
+        """
+        
+        self.fname = fname
+        self.online = online
         
         self.setup()
     
@@ -117,13 +212,122 @@ class MassDatabase(object):
         Populates the mass database.
         """
         
-        self.load_mass_monoiso()
-        self.load_freq_iso()
+        if self.online:
+            
+            self.load_mass_monoiso()
+            self.load_freq_iso()
+        
+        else:
+            
+            self.load_table()
+        
         self.setup_mass_first_iso()
         # self.get_weights() # this does not work at the moment
         self.setup_isotopes()
     
     
+    def update(self, fname = None):
+        """
+        Downloads the data from CIAAW webpages and optionally saves it
+        in a table which can be loaded later without network access.
+        
+        Parameters
+        ----------
+        fname : str
+            Path to the output table. If ``None`` the data is only
+            loaded but not saved.
+        """
+        
+        self.online = True
+        self.setup()
+        
+        if fname:
+            
+            self.export_table(fname)
+    
+    
+    @staticmethod
+    def _particle_masses(masses):
+        
+        masses['proton']   = proton
+        masses['electron'] = electron
+        masses['neutron']  = neutron
+    
+    
+    def load_table(self, fname = None):
+        """
+        Reads the monoisotopic masses and abundances of the isotopes from
+        a tab separated table with element symbol, nominal mass, exact
+        mass and abundance (empty if not known) in each row.
+        
+        Parameters
+        ----------
+        fname : str
+            Path to the table. By default the ``fname`` attribute or the
+            file in the ``isotopes_file`` setting.
+        """
+        
+        fname = fname or self.fname or settings.get('isotopes_file')
+        
+        mass_monoiso = collections.OrderedDict()
+        freq_iso = collections.OrderedDict()
+        
+        with open(fname, 'r') as fp:
+            
+            _ = next(fp)
+            
+            for l in fp:
+                
+                l = l.rstrip('\n').split('\t')
+                
+                if len(l) < 3:
+                    
+                    continue
+                
+                symbol = l[0]
+                a = int(l[1])
+                
+                mass_monoiso.setdefault(symbol, {})[a] = float(l[2])
+                
+                if len(l) > 3 and l[3]:
+                    
+                    freq_iso.setdefault(symbol, {})[a] = float(l[3])
+        
+        self._particle_masses(mass_monoiso)
+        
+        self.mass_monoiso = mass_monoiso
+        self.freq_iso = freq_iso
+    
+    
+    def export_table(self, fname):
+        """
+        Writes the monoisotopic masses and abundances of the isotopes
+        into a table which can be read by ``load_table``.
+        """
+        
+        with open(fname, 'w') as fp:
+            
+            _ = fp.write('element\tnominal_mass\tmass\tabundance\n')
+            
+            for symbol, isos in iteritems(self.mass_monoiso):
+                
+                if not isinstance(isos, dict):
+                    
+                    # proton, electron and neutron
+                    continue
+                
+                for a, m in iteritems(isos):
+                    
+                    freq = self.freq_iso.get(symbol, {}).get(a)
+                    
+                    _ = fp.write('%s\t%u\t%r\t%s\n' % (
+                        symbol,
+                        a,
+                        m,
+                        '' if freq is None else repr(freq),
+                    ))
+    
+    
     @staticmethod
     def load_masses(url):
         """
@@ -140,6 +344,9 @@ class MassDatabase(object):
         Dict of masses or weights.
         """
         
+        import bs4
+        import lipyd._curl as _curl
+        
         c = _curl.Curl(url, silent = False)
         req_masses = c.result
         
@@ -173,9 +380,7 @@ class MassDatabase(object):
             m = sum(m) / len(m)
             masses[symbol][a] = m
         
-        masses['proton']   = 1.00727646677
-        masses['electron'] = 0.00054857990924
-        masses['neutron']  = 1.00866491588
+        MassDatabase._particle_masses(masses)
         
         return masses
     
@@ -195,6 +400,9 @@ class MassDatabase(object):
         Stores the result in :py:attr:`.freqIso` attribute of the module.
         """
         
+        import bs4
+        import lipyd._curl as _curl
+        
         c = _curl.Curl(self.url_abundances, silent = False)
         req_abundances = c.result.split('\n')
         
@@ -389,6 +597,27 @@ class MassDatabase(object):
 def init_db():
     
     globals()['db'] = MassDatabase()
+    setup_elements()
+
+
+def setup_elements():
+    """
+    Sets up the alphabet of elements used in the atom count vectors
+    from the mass database.
+    """
+    
+    globals()['elements'] = tuple(sorted(db.mass_first_iso.keys()))
+    globals()['_element_idx'] = dict(
+        (elem, i) for i, elem in enumerate(elements)
+    )
+    globals()['_element_mass'] = np.array(
+        [db.mass_first_iso[elem] for elem in elements]
+    )
+    # a new cache: the vectors of the previous alphabet are dropped
+    # and the current value of the setting is used
+    globals()['formula_to_vector'] = functools.lru_cache(
+        maxsize = settings.get('formula_cache_size'),
+    )(_formula_to_vector)
 
 
 # databases set up at module loading
@@ -401,6 +630,9 @@ class MassBase(object):
     formula.
     """
     
+    _formula = None
+    _vector = None
+    
     def __init__(
             self,
             formula_mass = None,
@@ -423,9 +655,10 @@ class MassBase(object):
         
         Parameters
         ----------
-        formula_mass : str,float,NoneType
+        formula_mass : str,float,numpy.ndarray,NoneType
             Either a string expressing a chemical formula (e.g. H2O) or
-            a molecular mass (e.g. 237.1567) or `None` if you provide the
+            a molecular mass (e.g. 237.1567) or a vector of atom counts
+            (see :py:func:`formula_to_vector`) or `None` if you provide the
             formula as keyword arguments.
         **kwargs :
             Elements & counts, e.g. ``c = 6, h = 12, o = 6``.
@@ -448,16 +681,18 @@ class MassBase(object):
             
             self.formula = formula_mass
             
+        elif isinstance(formula_mass, np.ndarray):
+            
+            self.vector = formula_mass
+        
         elif isinstance(formula_mass, MassBase):
             
             if hasattr(formula_mass, 'mass'):
                 
                 self.mass = formula_mass.mass
-                
-            if hasattr(formula_mass, 'formula'):
-                
-                self.formula = formula_mass.formula
             
+            self._formula = formula_mass._formula
+            self._vector = formula_mass._vector
             self.mass_calculated = formula_mass.mass_calculated
             
         else:
@@ -545,6 +780,48 @@ class MassBase(object):
         return abs(self.mass - float(other)) <= 0.01
     
     
+    @property
+    def formula(self):
+        """
+        The formula as string. If the formula has been calculated as a
+        vector of atom counts the string is created only at first access.
+        """
+        
+        if self._formula is None and self._vector is not None:
+            
+            self._formula = vector_to_formula(self._vector)
+        
+        return self._formula
+    
+    
+    @formula.setter
+    def formula(self, formula):
+        
+        self._formula = formula
+        self._vector = None
+    
+    
+    @property
+    def vector(self):
+        """
+        The formula as a vector of atom counts. ``None`` if the formula
+        is not known.
+        """
+        
+        if self._vector is None and self._formula is not None:
+            
+            self._vector = formula_to_vector(self._formula)
+        
+        return self._vector
+    
+    
+    @vector.setter
+    def vector(self, vector):
+        
+        self._vector = vector
+        self._formula = None
+    
+    
     def calc_mass(self):
         """
         Calculates the mass from the formula.
@@ -552,25 +829,21 @@ class MassBase(object):
         
         if self.has_formula():
             
-            if self.formula == '':
+            vector = self.vector
+            
+            if not vector.any():
                 
                 self.mass = 0.0
                 self.mass_calculated = True
                 
             else:
                 
-                atoms = (
-                    _re_form.findall(self.formula)
-                    if not hasattr(self, '_atoms')
-                    else iteritems(self._atoms)
-                )
-                m = 0.0
-                for element, count in atoms:
-                    count = int(count or '1')
-                    m += self.exmass[element] * count
+                m = vector_mass(vector)
                 
                 if self.isotope:
                     
+                    import pyopenms as oms
+                    
                     oms_formula = oms.EmpiricalFormula(self.formula)
                     iso_pattern_gen = oms.CoarseIsotopePatternGenerator(
                         self.isotope + 1
@@ -593,12 +866,16 @@ class MassBase(object):
     
     def has_mass(self):
         
-        return self.mass > 0.0 or (self.formula == '' and self.mass == 0.0)
+        return self.mass > 0.0 or (
+            self.mass == 0.0 and
+            self.has_formula() and
+            not self.vector.any()
+        )
     
     
     def has_formula(self):
         
-        return self.formula is not None
+        return self._formula is not None or self._vector is not None
     
     
     def formula_from_dict(self, atoms):
@@ -611,8 +888,7 @@ class MassBase(object):
             Dict of atoms i.e. elements as keys and counts as values.
         """
         
-        self.formula = ''.join('%s%u'%(elem.capitalize(), num) \
-            for elem, num in iteritems(atoms))
+        self.vector = atoms_to_vector(atoms)
     
     @staticmethod
     def formula_to_atoms(formula):
@@ -626,20 +902,22 @@ class MassBase(object):
     
     def update_atoms(self):
         """
-        Sets the atoms dict by processing the ``formula`` attribute.
+        Sets the atom counts by processing the ``formula`` attribute.
         """
         
-        if self.formula:
+        if self._vector is None and self._formula:
             
-            self._atoms = formula_to_atoms(self.formula)
+            self._vector = formula_to_vector(self._formula)
     
     
     @property
     def atoms(self):
         
-        self.update_atoms()
-        
-        return self._atoms if hasattr(self, '_atoms') else {}
+        return (
+            vector_to_atoms(self.vector)
+                if self.has_formula() else
+            collections.defaultdict(int)
+        )
     
     
     def reload(self):
@@ -45,6 +45,7 @@ class MgfReader(object):
     stRcharge = 'CHARGE'
     reln0 = re.compile(r'^([A-Z]+).*=([\d\.]+)[\s]?([\d\.]*)["]?$')
     reln1 = re.compile(r'^([A-Z]+).*=(.*)$')
+    index_ext = 'index.npz'
     
     def __init__(
             self,
@@ -90,6 +91,10 @@ class MgfReader(object):
             -- scan num
             -- offset in file
             -- fraction num
+        
+        If an up to date index file written together with the MGF file
+        (see ``write_index``) is available the index is loaded from there,
+        otherwise the MGF file is processed.
 
         Parameters
         ----------
@@ -99,6 +104,50 @@ class MgfReader(object):
 
         """
         
+        features = self.read_index()
+        
+        if features is None:
+            
+            features = self.index_file()
+        
+        # sorted by precursor mass
+        self.mgfindex = np.array(
+            sorted(features, key = lambda x: x[0]),
+            dtype = np.object
+        ).reshape(-1, 6)
+        
+        self.scan_index = dict(zip(
+            self.mgfindex[:,3].astype(int), # scan indices
+            range(len(self)) # row numbers
+        ))
+    
+    def read_index(self):
+        """Reads the index from the index file beside the MGF file.
+        
+        Returns
+        -------
+        List of the index rows or ``None`` if the index file does not
+        exist or the MGF file has been modified since it has been written.
+        """
+        
+        index = read_index(self.fname)
+        
+        if index is None:
+            
+            return None
+        
+        return [
+            [pepmass, intensity, rtime, scan, int(offset), self.label]
+            for pepmass, intensity, rtime, scan, offset, charge
+            in index.tolist()
+            # scans without charge line have zero charge
+            if self.charge is None or (charge and charge == self.charge)
+        ]
+    
+    def index_file(self):
+        """Reads the whole MGF file and collects the index rows.
+        """
+        
         features = []
         offset = 0
         cap_next = False
@@ -200,16 +249,7 @@ class MgfReader(object):
                 
                 offset += len(l)
         
-        # sorted by precursor mass
-        self.mgfindex = np.array(
-            sorted(features, key = lambda x: x[0]),
-            dtype = np.object
-        )
-        
-        self.scan_index = dict(zip(
-            self.mgfindex[:,3].astype(int), # scan indices
-            range(len(self)) # row numbers
-        ))
+        return features
     
     def lookup(self, mz, rt = None, tolerance = None):
         """Looks up an MS1 m/z and returns the indices of MS2 scans in the
@@ -470,3 +510,70 @@ class MgfReader(object):
         if hasattr(self, 'fp') and not self.fp.closed:
             
             self.fp.close()
+
+
+def index_path(fname):
+    """Returns the path of the index file of an MGF file.
+    """
+    
+    return '%s.%s' % (fname, MgfReader.index_ext)
+
+
+def write_index(fname, index):
+    """Writes the index of an MGF file, so ``MgfReader`` does not need to
+    process the MGF file. The size and modification time of the MGF
+    file are stored too, hence the MGF file must be closed already.
+    
+    Parameters
+    ----------
+    fname : str
+        Path to the MGF file.
+    index : list
+        One row for each scan in the order of the file, with the
+        precursor m/z, precursor intensity, retention time in minutes,
+        scan number, byte offset of the first peak line and charge
+        (zero if the scan has no charge line).
+    """
+    
+    stat = os.stat(fname)
+    path = index_path(fname)
+    tmp_path = '%s.%u.tmp' % (path, os.getpid())
+    
+    with open(tmp_path, 'wb') as fp:
+        
+        np.savez(
+            fp,
+            index = np.array(index, dtype = np.float64).reshape(-1, 6),
+            stat = np.array(
+                [stat.st_size, stat.st_mtime_ns],
+                dtype = np.int64,
+            ),
+        )
+    
+    os.replace(tmp_path, path)
+
+
+def read_index(fname):
+    """Reads the index of an MGF file written by ``write_index``.
+    
+    Returns
+    -------
+    Array with the index or ``None`` if the index file does not exist or
+    the MGF file has been modified since it has been written.
+    """
+    
+    path = index_path(fname)
+    
+    if not os.path.exists(path) or not os.path.exists(fname):
+        
+        return None
+    
+    stat = os.stat(fname)
+    
+    with np.load(path) as data:
+        
+        if list(data['stat']) != [stat.st_size, stat.st_mtime_ns]:
+            
+            return None
+        
+        return data['index']
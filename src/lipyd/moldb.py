@@ -33,27 +33,7 @@ import functools
 from argparse import Namespace
 
 import numpy as np
-import pandas as pd
-
-try:
-    import openbabel.pybel as pybel
-    if 'ipykernel' not in sys.modules and pybel.tk is None:
-        try:
-            import tkinter
-            import PIL
-            import PIL.ImageTk
-            pybel.tk = tkinter
-            pybel.PIL = PIL.Image
-            pybel.piltk = PIL.ImageTk
-        except:
-            sys.stdout.write(
-                '\t:: `PIL` or `tkinter` not available.\n'
-                '     `pybel` won\'t be able to draw molecules.\n'
-            )
-except:
-    sys.stdout.write(':: Module `pybel` not available.\n')
 
-import lipyd._curl as _curl
 import lipyd.common as common
 import lipyd.settings as settings
 import lipyd.mz as mzmod
@@ -115,6 +95,8 @@ class LipidMaps(sdf.SdfReader):
     
     def __init__(self, extract_file = True):
         
+        import lipyd._curl as _curl
+        
         self.url   = settings.get('lipidmaps_url')
         self.fname = settings.get('lipidmaps_fname')
         self.curl  = _curl.Curl(self.url, large = True, silent = False)
@@ -266,6 +248,8 @@ class SwissLipids(Reader):
     
     def load(self):
         
+        import lipyd._curl as _curl
+        
         self.close_gzfile()
         
         self._curl = _curl.Curl(self.url, silent = False,
@@ -566,12 +550,12 @@ class SwissLipids(Reader):
             if record[8]:
                 
                 # processing from SMILES
-                return pybel.readstring('smi', record[8])
+                return sdf.get_pybel().readstring('smi', record[8])
             
             return None
         
         # processing from InChI
-        return pybel.readstring('inchi', record[9])
+        return sdf.get_pybel().readstring('inchi', record[9])
     
     @staticmethod
     def add_annotations(mol, record, exact_mass_formula_fallback = True):
@@ -1211,9 +1195,19 @@ class MoleculeDatabaseAggregator(object):
 
         """
         
-        result = {}
+        return self.adduct_lookup_many(
+            (mz,),
+            adducts = adducts,
+            ionmode = ionmode,
+            charge = charge,
+            adduct_constraints = adduct_constraints,
+            tolerance = tolerance,
+        )[0]
+    
+    
+    @staticmethod
+    def _adduct_table(adducts = None, ionmode = None, charge = None):
         
-        mz = mzmod.Mz(mz)
         charge = (
             charge
                 if charge is not None else
@@ -1225,43 +1219,45 @@ class MoleculeDatabaseAggregator(object):
         if not adducts and ionmode in {'pos', 'neg'}:
             
             # we look up all adducts we have a method for
-            adducts = list(settings.get('ex2ad')[abs(charge)][ionmode].keys())
+            adducts = list(
+                settings.get_frozen('ex2ad')[abs(charge)][ionmode].keys()
+            )
         
-        ad_default = settings.get('adducts_default')[ionmode][abs(charge)]
-        ad_constr  = settings.get('adduct_constraints')[ionmode]
+        return charge, mzmod.adduct_table(
+            ionmode = ionmode,
+            charges = abs(charge),
+            adducts = adducts,
+        )
+    
+    
+    def adduct_mzs(self, adducts = None, ionmode = None, charge = None):
+        """
+        Calculates the m/z of adducts for all records in the database,
+        e.g. for reverse lookups.
         
-        exmethods = settings.get('ad2ex')[abs(charge)][ionmode]
-        methods = dict((ad, exmethods[ad]) for ad in adducts)
+        Parameters
+        ----------
+        adducts : list
+            Names of adducts. By default all adducts of the ion mode
+            and charge.
+        ionmode : str
+            ``pos`` or ``neg``.
+        charge : int
+            By default 1 or -1 according to the ion mode.
         
-        for ad, method in iteritems(methods):
-            
-            exmz = getattr(mz, method)()
-            
-            res  = self.lookup_accuracy(exmz, tolerance = tolerance)
-            
-            if adduct_constraints:
-                
-                ires = tuple(
-                    i for i in xrange(res[0].shape[0])
-                    if (
-                        (
-                            res[1][i].hg not in ad_constr and
-                            ad in ad_default
-                        ) or
-                        (
-                            res[1][i].hg in ad_constr and
-                            ad in ad_constr[res[1][i].hg]
-                        )
-                    )
-                )
-                
-                res = (res[0][ires,], res[1][ires,], res[2][ires,])
-            
-            if len(res[0]):
-                
-                result[ad] = res
+        Returns
+        -------
+        Tuple of the adduct names and an array of m/z values with one row
+        for each adduct and one column for each record in the database.
+        """
         
-        return result
+        charge, adtable = self._adduct_table(
+            adducts = adducts,
+            ionmode = ionmode,
+            charge = charge,
+        )
+        
+        return adtable.adducts, adtable.adduct_mzs(self.masses)
     
     
     def adduct_lookup_many(
@@ -1274,7 +1270,9 @@ class MoleculeDatabaseAggregator(object):
             tolerance = None,
         ):
         """Performs the lookup on a vector of m/z values.
-        Calls the ``adduct_lookup`` method on all m/z's.
+        The exact masses for all m/z's and adducts are calculated at once
+        by ``mz.AdductTable``, then each of them is looked up in the
+        database.
         
         Returns array of dicts with lookup results.
 
@@ -1298,20 +1296,57 @@ class MoleculeDatabaseAggregator(object):
 
         """
         
+        charge, adtable = self._adduct_table(
+            adducts = adducts,
+            ionmode = ionmode,
+            charge = charge,
+        )
+        
+        # read-only views of the settings, no copies made
+        ad_default = settings.get_frozen('adducts_default')[ionmode][
+            abs(charge)
+        ]
+        ad_constr  = settings.get_frozen('adduct_constraints')[ionmode]
+        
+        # exact masses for all adducts and m/z's at once
+        exmzs = adtable.exact_masses(mzs)
+        
         result = []
         
-        for mz in mzs:
+        for j in xrange(exmzs.shape[1]):
+            
+            this_result = {}
             
-            result.append(
-                self.adduct_lookup(
-                    mz,
-                    adducts = adducts,
-                    ionmode = ionmode,
-                    charge = charge,
-                    adduct_constraints = adduct_constraints,
+            for i, ad in enumerate(adtable.adducts):
+                
+                res = self.lookup_accuracy(
+                    exmzs[i, j],
                     tolerance = tolerance,
                 )
-            )
+                
+                if adduct_constraints:
+                    
+                    ires = tuple(
+                        k for k in xrange(res[0].shape[0])
+                        if (
+                            (
+                                res[1][k].hg not in ad_constr and
+                                ad in ad_default
+                            ) or
+                            (
+                                res[1][k].hg in ad_constr and
+                                ad in ad_constr[res[1][k].hg]
+                            )
+                        )
+                    )
+                    
+                    res = (res[0][ires,], res[1][ires,], res[2][ires,])
+                
+                if len(res[0]):
+                    
+                    this_result[ad] = res
+            
+            result.append(this_result)
         
         return np.array(result)
     
@@ -1612,11 +1647,9 @@ class MoleculeDatabaseAggregator(object):
         
         if exmass is not None:
             
-            adduct_method = (
-                settings.get('ex2ad_all')[adduct]
+            return float(
+                mzmod.adduct_table(adducts = (adduct,)).adduct_mzs(exmass)[0]
             )
-            
-            return getattr(formula.Formula(exmass), adduct_method)()
     
     
     def mz_lowest_error_from_name(
@@ -1635,19 +1668,11 @@ class MoleculeDatabaseAggregator(object):
         
         if exmasses is not None:
             
-            adduct_method = (
-                settings.get('ex2ad_all')[adduct]
-            )
-            
-            addmasses = np.array([
-                getattr(formula.Formula(exmass), adduct_method)()
-                for exmass in exmasses
-            ])
+            addmasses = mzmod.adduct_table(
+                adducts = (adduct,)
+            ).adduct_mzs(exmasses)[0]
             
-            ppms = np.array([
-                common.ppm(addmass, measured_mz)
-                for addmass in addmasses
-            ])
+            ppms = common.ppm(addmasses, measured_mz)
             
             return addmasses[np.argmin(np.abs(ppms))]
     
@@ -26,6 +26,7 @@ import imp
 import re
 import math
 import copy
+import hashlib
 import itertools
 import collections
 from argparse import Namespace
@@ -33,6 +34,7 @@ import numpy as np
 
 from lipyd.common import *
 import lipyd.mgf as mgf
+import lipyd.mzml as mzml
 import lipyd.mz as mzmod
 import lipyd.session as session
 import lipyd.settings as settings
@@ -40,7 +42,7 @@ import lipyd.lookup as lookup
 import lipyd.fragdb as fragdb
 import lipyd.moldb as moldb
 import lipyd.lipproc as lipproc
-import lipyd.plot as plot
+import lipyd.ms2_profiler as ms2_profiler
 
 
 ChainFragment = collections.namedtuple(
@@ -677,6 +679,9 @@ class Scan(ScanBase):
     
     def plot(self, **kwargs):
         
+        # matplotlib is imported only if necessary
+        import lipyd.plot as plot
+        
         _ = plot.SpectrumPlot(
             mzs = self.mzs,
             intensities = self.intensities,
@@ -3448,7 +3453,7 @@ class Scan(ScanBase):
             
             return
         
-        ad2ex = settings.get('ad2ex')[1][self.ionmode][adduct]
+        ad2ex = settings.get_frozen('ad2ex')[1][self.ionmode][adduct]
         ex2ad = 'remove_h' if self.ionmode == 'neg' else 'add_h'
         
         fake_precursor = (
@@ -6829,6 +6834,145 @@ idmethods = {
 }
 
 
+class ScanCache(object):
+    
+    
+    def __init__(
+            self,
+            mz_resolution = None,
+            intensity_resolution = None,
+            min_intensity = None,
+        ):
+        """
+        Keeps the identification results of MS2 scans by a signature of
+        their peak lists. Scans with the same signature are identified only
+        once, the others reuse the result of the first one, only their
+        own scan details (sample ID, scan ID, delta RT) are attached.
+        
+        The signature consists of the ion mode, the precursor m/z and the
+        peak list sorted by m/z, with the m/z values and the normalized
+        intensities rounded by the resolutions below.
+        
+        mz_resolution : float
+            Resolution of m/z values in Da.
+        intensity_resolution : float
+            Resolution of the intensities normalized to the highest peak.
+        min_intensity : float
+            Peaks below this normalized intensity are not considered.
+        """
+        
+        self.mz_resolution = (
+            mz_resolution or
+            settings.get('ms2_deduplicate_mz_resolution')
+        )
+        self.intensity_resolution = (
+            intensity_resolution or
+            settings.get('ms2_deduplicate_intensity_resolution')
+        )
+        self.min_intensity = (
+            min_intensity
+                if min_intensity is not None else
+            settings.get('ms2_deduplicate_min_intensity')
+        )
+        
+        self.results = {}
+        self.hits = 0
+        self.misses = 0
+    
+    
+    def __len__(self):
+        
+        return len(self.results)
+    
+    
+    def signature(self, scan):
+        """
+        Creates a hashable signature from the peak list of a scan.
+        
+        Parameters
+        ----------
+        scan : Scan
+            An MS2 scan.
+        
+        Returns
+        -------
+        Tuple of ion mode, rounded precursor m/z and the hash of the
+        rounded peak list.
+        """
+        
+        keep = scan.inorm >= self.min_intensity
+        mzs = scan.mzs[keep]
+        inorm = scan.inorm[keep]
+        imzsort = np.argsort(mzs)
+        
+        peaks = np.concatenate((
+            np.round(mzs[imzsort] / self.mz_resolution),
+            np.round(inorm[imzsort] / self.intensity_resolution),
+        )).astype(np.int64)
+        
+        precursor = (
+            None
+                if scan.precursor is None else
+            int(np.round(scan.precursor / self.mz_resolution))
+        )
+        
+        return (
+            scan.ionmode,
+            precursor,
+            hashlib.md5(peaks.tobytes()).hexdigest(),
+        )
+    
+    
+    def identify(self, scan):
+        """
+        Returns the identification result for a scan. Calls
+        ``Scan.identify`` only if no scan with the same signature has been
+        identified before.
+        
+        Parameters
+        ----------
+        scan : Scan
+            An MS2 scan.
+        
+        Returns
+        -------
+        Same as ``Scan.identify``.
+        """
+        
+        key = self.signature(scan)
+        
+        if key in self.results:
+            
+            self.hits += 1
+            
+            return self._with_scan_details(self.results[key], scan)
+        
+        self.misses += 1
+        identity = scan.identify()
+        self.results[key] = identity
+        
+        return identity
+    
+    
+    @staticmethod
+    def _with_scan_details(identity, scan):
+        """
+        Copies an identification result replacing the scan details
+        with the ones from ``scan``.
+        """
+        
+        return dict(
+            (
+                rec_str,
+                tuple(
+                    i._replace(scan_details = scan.scan_details)
+                    for i in ids
+                )
+            )
+            for rec_str, ids in iteritems(identity)
+        )
+
+
 class MS2Feature(object):
     
     
@@ -6848,6 +6992,8 @@ class MS2Feature(object):
             rt_range_width = .5,
             check_rt = True,
             add_precursor_details = False,
+            deduplicate = None,
+            scan_cache = None,
         ):
         """
         Collects the MS2 scans from the provided resources for a single
@@ -6859,9 +7005,9 @@ class MS2Feature(object):
             Ion mode of the experiment. Either ``pos`` or ``neg``.
         resources : dict
             ``dict`` of MS2 scan resources. These are either ``mgf.MgfReader``
-            objects or paths to MGF files. Later more resource types
-            will be available, for example MzML format. Keys of the ``dict``
-            are used as sample labels. Thes can be strings or tuples.
+            or ``mzml.MzmlReader`` objects or paths to MGF or mzML files.
+            Keys of the ``dict`` are used as sample labels. Thes can be
+            strings or tuples.
         ms1_records : dict
             A data structure resulted by ``moldb.adduct_lookup``. If ``None``
             the lookup will be done here.
@@ -6879,6 +7025,14 @@ class MS2Feature(object):
             precursor's RT. If ``False``, scans will be matched only by the
             m/z value of the precursor and scans with any large RT difference
             will be analysed.
+        deduplicate : bool
+            Identify only once the scans with the same peak list and reuse
+            the result for the others (see ``ScanCache``). If ``None``
+            the value from the settings is used.
+        scan_cache : ScanCache
+            A ``ScanCache`` instance to use at deduplication, e.g. to share
+            the cache among features. If provided, ``deduplicate`` is
+            ignored.
         """
         
         self.mz = mz
@@ -6892,6 +7046,19 @@ class MS2Feature(object):
         self.rt_range = rt_range
         self.check_rt = check_rt
         
+        deduplicate = (
+            deduplicate
+                if deduplicate is not None else
+            settings.get('ms2_deduplicate_scans')
+        )
+        self.scan_cache = (
+            scan_cache
+                if scan_cache is not None else
+            ScanCache()
+                if deduplicate else
+            None
+        )
+        
         self._set_rt()
         self._set_rt_range()
     
@@ -7124,6 +7291,7 @@ class MS2Feature(object):
         
         closest_rtdiff  = np.inf
         closest_mgffile = None
+        closest_type    = None
         closest_i       = np.nan
         
         for resource, res_type, sample_id in self.iterresources(
@@ -7143,12 +7311,13 @@ class MS2Feature(object):
                 closest_rtdiff  = np.min(np.abs(rtdiff))
                 closest_i       = idx[np.argmin(np.abs(rtdiff))]
                 closest_mgffile = resource
+                closest_type    = res_type
         
         return (
             None
                 if closest_mgffile is None else
             self.get_scan(
-                self.get_mgf(closest_mgffile),
+                getattr(self, 'get_%s' % closest_type)(closest_mgffile),
                 closest_i,
                 sample_id = sample_id
             )
@@ -7177,22 +7346,60 @@ class MS2Feature(object):
         return False
     
     
-    def mzml_iterscans(self, mzml_resource, sample_id = None):
+    def get_mzml(self, mzml_resource):
         """
-
-        Parameters
-        ----------
-        mzml_resource :
+        Returns an ``mzml.MzmlReader`` for an mzML file name or the
+        reader itself if a reader provided.
+        """
+        
+        if isinstance(mzml_resource, basestring):
             
-        sample_id :
-             (Default value = None)
-
-        Returns
-        -------
-
+            mzmlfile = mzml.MzmlReader(mzml_resource, charge = None)
+        
+        elif isinstance(mzml_resource, mzml.MzmlReader):
+            
+            mzmlfile = mzml_resource
+        
+        else:
+            
+            raise ValueError(
+                'mzML files should be lipyd.mzml.MzmlReader '
+                'instances or file names.'
+            )
+        
+        return mzmlfile
+    
+    
+    # ``mzml.MzmlReader`` provides the same interface as ``mgf.MgfReader``
+    # hence the methods for MGF work with it
+    
+    def mzml_iterscanidx(self, mzml_resource):
+        """
+        Selects scans from an mzML resource and yields tuples of scan ID
+        and RT difference.
+        """
+        
+        return self.mgf_iterscanidx(self.get_mzml(mzml_resource))
+    
+    
+    def mzml_get_scans_summary(self, mzml_resource):
+        """
+        For a single mzML resource finds scans matching this feature and
+        returns arrays of scan indices and RT differences.
         """
         
-        raise NotImplementedError
+        return self.mgf_get_scans_summary(self.get_mzml(mzml_resource))
+    
+    
+    def mzml_iterscans(self, mzml_resource, sample_id = None):
+        """
+        Iterates over scans from an mzML resource belonging to this feature.
+        """
+        
+        return self.mgf_iterscans(
+            self.get_mzml(mzml_resource),
+            sample_id = sample_id,
+        )
     
     
     @staticmethod
@@ -7215,6 +7422,15 @@ class MS2Feature(object):
                 
                 return 'mgf'
             
+            if res[-4:].lower() == 'mzml':
+                
+                return 'mzml'
+        
+        # `MzmlReader` is a subclass of `MgfReader`
+        elif isinstance(res, mzml.MzmlReader):
+            
+            return 'mzml'
+        
         elif isinstance(res, mgf.MgfReader):
             
             return 'mgf'
@@ -7245,7 +7461,11 @@ class MS2Feature(object):
         
         for scan in self.scans:
             
-            identity = scan.identify()
+            identity = (
+                self.scan_cache.identify(scan)
+                    if self.scan_cache is not None else
+                scan.identify()
+            )
             
             if identity:
                 
@@ -7625,3 +7845,27 @@ class MS2Feature(object):
         if self.ms1_records is None:
             
             self.ms1_records = moldb.adduct_lookup(self.mz)
+
+
+def _profiled_classes():
+    """
+    Returns the classes and methods to be profiled by ``profiler``:
+    ``Scan.identify`` and all methods of the identifier classes.
+    """
+    
+    classes = {Scan: ['identify']}
+    identifiers = [AbstractMS2Identifier]
+    
+    while identifiers:
+        
+        cls = identifiers.pop()
+        classes[cls] = None
+        identifiers.extend(cls.__subclasses__())
+    
+    return classes
+
+
+#: Measures call counts and times of the identification methods.
+#: Enable it by ``profiler.enable()`` or use it as a context, e.g.
+#: ``with profiler: sample.ms2_analysis()``, then call ``profiler.dump()``.
+profiler = ms2_profiler.MethodProfiler(_profiled_classes)
@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+#  This file is part of the `lipyd` python module
+#
+#  Copyright (c) 2015-2019 - EMBL
+#
+#  File author(s):
+#  Dénes Türei (turei.denes@gmail.com)
+#  Igor Bulanov
+#
+#  Distributed under the GNU GPLv3 License.
+#  See accompanying file LICENSE.txt or copy at
+#      http://www.gnu.org/licenses/gpl-3.0.html
+#
+#  Website: http://denes.omnipathdb.org/
+#
+
+from future.utils import iteritems
+
+import time
+import types
+import inspect
+import functools
+import collections
+
+import lipyd.session as session
+
+
+ProfileRecord = collections.namedtuple(
+    'ProfileRecord',
+    ['cls', 'method', 'calls', 'time', 'per_second'],
+)
+
+
+class MethodProfiler(session.Logger):
+    
+    
+    def __init__(self, classes):
+        """
+        Measures the number of calls and the cumulative wall time of
+        methods of a group of classes. The methods are replaced by timed
+        wrappers only while the profiler is enabled, otherwise the
+        classes are left untouched, hence there is no overhead.
+        
+        Calls are recorded by the name of the class of the instance, so
+        inherited methods are accounted separately for each subclass.
+        If a method returns a generator the time spent in the iteration
+        is added to the method.
+        
+        classes : callable
+            A function returning a ``dict`` with classes as keys and
+            lists of method names as values. If the value is ``None``
+            all the public methods defined in the class will be profiled.
+        """
+        
+        session.Logger.__init__(self, name = 'ms2_profiler')
+        
+        self.classes = classes
+        self._originals = []
+        self.reset()
+    
+    
+    def __enter__(self):
+        
+        self.enable()
+        
+        return self
+    
+    
+    def __exit__(self, exception_type, exception_value, traceback):
+        
+        self.disable()
+    
+    
+    @property
+    def enabled(self):
+        
+        return bool(self._originals)
+    
+    
+    def reset(self):
+        """
+        Clears all the counts and times recorded so far.
+        """
+        
+        self.calls = collections.defaultdict(int)
+        self.times = collections.defaultdict(float)
+        self._depth = collections.defaultdict(int)
+    
+    
+    def enable(self):
+        """
+        Replaces the methods by timed wrappers.
+        """
+        
+        if self.enabled:
+            
+            return
+        
+        for cls, methods in iteritems(self.classes()):
+            
+            methods = methods or [
+                name
+                for name, attr in iteritems(cls.__dict__)
+                if not name.startswith('_') and inspect.isfunction(attr)
+            ]
+            
+            for name in methods:
+                
+                original = cls.__dict__[name]
+                self._originals.append((cls, name, original))
+                setattr(cls, name, self._wrap(original, name))
+        
+        self._log(
+            'Profiling enabled for %u methods.' % len(self._originals)
+        )
+    
+    
+    def disable(self):
+        """
+        Restores the original methods.
+        """
+        
+        for cls, name, original in reversed(self._originals):
+            
+            setattr(cls, name, original)
+        
+        self._originals = []
+    
+    
+    def _wrap(self, method, name):
+        
+        profiler = self
+        
+        @functools.wraps(method)
+        def timed_method(obj, *args, **kwargs):
+            
+            key = (obj.__class__.__name__, name)
+            profiler.calls[key] += 1
+            profiler._depth[key] += 1
+            t0 = time.perf_counter()
+            
+            try:
+                
+                result = method(obj, *args, **kwargs)
+            
+            finally:
+                
+                profiler._depth[key] -= 1
+                
+                # for recursive or `super` calls we account the time
+                # only at the outermost call
+                if not profiler._depth[key]:
+                    
+                    profiler.times[key] += time.perf_counter() - t0
+            
+            if isinstance(result, types.GeneratorType):
+                
+                result = profiler._timed_generator(result, key)
+            
+            return result
+        
+        return timed_method
+    
+    
+    def _timed_generator(self, generator, key):
+        
+        while True:
+            
+            t0 = time.perf_counter()
+            
+            try:
+                
+                item = next(generator)
+            
+            except StopIteration:
+                
+                break
+            
+            finally:
+                
+                self.times[key] += time.perf_counter() - t0
+            
+            yield item
+    
+    
+    def report(self):
+        """
+        Returns a list of ``ProfileRecord`` tuples with the class name,
+        method name, number of calls, cumulative time in seconds and
+        calls per second for each method called while profiling.
+        The list is sorted by the cumulative time descending.
+        """
+        
+        return sorted(
+            (
+                ProfileRecord(
+                    cls = cls,
+                    method = method,
+                    calls = calls,
+                    time = self.times[(cls, method)],
+                    per_second = (
+                        calls / self.times[(cls, method)]
+                            if self.times[(cls, method)] else
+                        float('inf')
+                    ),
+                )
+                for (cls, method), calls in iteritems(self.calls)
+            ),
+            key = lambda rec: rec.time,
+            reverse = True,
+        )
+    
+    
+    def report_str(self):
+        """
+        Returns the report as a tab separated table.
+        """
+        
+        return '\n'.join(
+            ['\t'.join(ProfileRecord._fields)] +
+            [
+                '%s\t%s\t%u\t%.06f\t%.02f' % rec
+                for rec in self.report()
+            ]
+        )
+    
+    
+    def dump(self, fname = None):
+        """
+        Writes the report into a tab separated file. If no file name
+        provided writes it into the log.
+        """
+        
+        report = self.report_str()
+        
+        if fname is None:
+            
+            self._log('MS2 identification profile:\n%s' % report)
+        
+        else:
+            
+            with open(fname, 'w') as fp:
+                
+                fp.write(report)
+            
+            self._log('MS2 identification profile written to `%s`.' % fname)
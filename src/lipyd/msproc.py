@@ -25,7 +25,12 @@ import sys
 import imp
 import re
 import copy
+import json
+import operator
+import hashlib
+import itertools
 import collections
+import concurrent.futures
 
 import numpy as np
 import pandas as pd
@@ -34,6 +39,8 @@ import pyopenms as oms
 import lipyd.session as session
 import lipyd.common as common
 import lipyd.settings as settings
+import lipyd._version as _version
+import lipyd.mgf as mgf
 
 OPENMS_OBJ_TYPES = (
     oms.PeakMap,
@@ -511,11 +518,23 @@ class MethodPathHandler(PathHandlerBase):
         A method which decides if an input file should be used. Should return
         ``True`` if the file is to be used. Alternatively a regex as a string
         which matches the desired input files.
+    cache : bool
+        Skip the processing if the output from a previous run with the
+        same input files, parameters and software versions is available.
+        For this a manifest is written beside each output file. The
+        inputs are identified by the checksums of the files at the input
+        paths, hence if the input is provided as an object the path of
+        the file it has been read from must be provided as well.
+    force : bool
+        Run the processing even if the output is available from a
+        previous run. The manifest is updated nevertheless.
     
     Attributes
     ----------
     multi_file_input : bool
         Tells if the object has single or multiple input paths.
+    cached : bool
+        Tells if the output has been taken from a previous run.
     """
     
     _outexts = {
@@ -538,6 +557,7 @@ class MethodPathHandler(PathHandlerBase):
             'export',
         )
     }
+    _manifest_ext = 'manifest.json'
     
     def __init__(
             self,
@@ -553,6 +573,8 @@ class MethodPathHandler(PathHandlerBase):
             name = 'path_handler',
             n_experiment = None,
             n_sample = None,
+            cache = False,
+            force = False,
         ):
         
         # most of the times log initialized in the OpenmsMethodWrapper
@@ -577,6 +599,10 @@ class MethodPathHandler(PathHandlerBase):
         self.output_path = output_path
         self.method_key = method_key
         self.output_dir = output_dir
+        self.cache = cache
+        self.force = force
+        self.cached = False
+        self.cache_key = None
     
     
     def main(self):
@@ -703,6 +729,253 @@ class MethodPathHandler(PathHandlerBase):
             )
             
             raise RuntimeError('Identical in/out path, please check the log.')
+    
+    
+    def check_cache(self):
+        """
+        Tells if the output from a previous run can be used. This is the
+        case if the key in the manifest of the output file is identical
+        to the key of the current inputs, parameters and software
+        versions, and the output file has not been changed since.
+        The key is calculated here even if the output can not be used,
+        hence this method must be called before ``save_manifest``.
+        """
+        
+        self.cached = False
+        self.cache_key = None
+        
+        if not self.cache:
+            
+            return False
+        
+        inputs = self.cache_inputs()
+        
+        if not inputs or not all(
+            isinstance(path, common.basestring) and os.path.isfile(path)
+            for path in inputs
+        ):
+            
+            self._log(
+                'Inputs not available as files, '
+                'the output of previous runs can not be used.'
+            )
+            
+            return False
+        
+        manifest = self._read_manifest(self.output_path)
+        # checksums known from the manifests of the inputs (outputs of
+        # the previous step) and from the previous run of this step
+        known = dict(
+            (rec['path'], rec)
+            for rec in manifest.get('inputs', [])
+        )
+        
+        for path in inputs:
+            
+            output = self._read_manifest(path).get('output')
+            
+            if output:
+                
+                known[path] = output
+        
+        self._cache_input_records = [
+            self._file_record(path, known.get(path))
+            for path in inputs
+        ]
+        self._cache_param = self._normalize(self.cache_param())
+        self._cache_versions = self.cache_versions()
+        
+        md5 = hashlib.md5()
+        md5.update(repr((
+            self.__class__.__name__,
+            [rec['md5'] for rec in self._cache_input_records],
+            self._cache_param,
+            self._cache_versions,
+        )).encode('utf-8'))
+        self.cache_key = md5.hexdigest()
+        
+        if self.force:
+            
+            return False
+        
+        output = manifest.get('output')
+        
+        self.cached = (
+            manifest.get('key') == self.cache_key and
+            self._file_unchanged(self.output_path, output)
+        )
+        
+        if self.cached:
+            
+            self._log(
+                'Output of a previous run with identical inputs and '
+                'parameters is available at `%s`, skipping.' % (
+                    self.output_path
+                )
+            )
+        
+        return self.cached
+    
+    
+    def save_manifest(self):
+        """
+        Writes the manifest beside the output file. It records the key
+        calculated by ``check_cache``, the checksums of the input and
+        output files, the parameters and the software versions.
+        """
+        
+        if not self.cache_key or not os.path.isfile(self.output_path):
+            
+            return
+        
+        manifest = {
+            'key': self.cache_key,
+            'method': self.__class__.__name__,
+            'inputs': self._cache_input_records,
+            'output': self._file_record(self.output_path),
+            'param': repr(self._cache_param),
+            'versions': self._cache_versions,
+        }
+        
+        manifest_path = self._manifest_path(self.output_path)
+        # written under a temporary name and then renamed, so other
+        # processes never read incomplete manifests
+        tmp_path = '%s.%u.tmp' % (manifest_path, os.getpid())
+        
+        with open(tmp_path, 'w') as fp:
+            
+            json.dump(manifest, fp, indent = 2)
+        
+        os.replace(tmp_path, manifest_path)
+        
+        self._log('Manifest written to `%s`.' % manifest_path)
+    
+    
+    def cache_inputs(self):
+        """
+        Returns the list of the input paths which the output depends on.
+        """
+        
+        return (
+            list(self._input_path)
+                if self.multi_file_input else
+            [getattr(self, 'input_path', None)]
+        )
+    
+    
+    def cache_param(self):
+        """
+        Returns the parameters which the output depends on.
+        """
+        
+        return getattr(self, 'param', {})
+    
+    
+    @staticmethod
+    def cache_versions():
+        
+        return {
+            'lipyd': _version.__version__,
+            'openms': common.ensure_unicode(oms.VersionInfo.getVersion()),
+        }
+    
+    
+    @classmethod
+    def _manifest_path(cls, path):
+        
+        return '%s.%s' % (path, cls._manifest_ext)
+    
+    
+    @classmethod
+    def _read_manifest(cls, path):
+        
+        manifest_path = cls._manifest_path(path)
+        
+        if os.path.isfile(manifest_path):
+            
+            try:
+                
+                with open(manifest_path, 'r') as fp:
+                    
+                    return json.load(fp)
+            
+            except ValueError:
+                
+                pass
+        
+        return {}
+    
+    
+    @classmethod
+    def _file_record(cls, path, known = None):
+        """
+        Returns a dict with the size, modification time and MD5 checksum
+        of a file. The checksum is taken from ``known`` if the size and
+        the modification time are the same, otherwise the file is read.
+        """
+        
+        stat = os.stat(path)
+        
+        if cls._file_unchanged(path, known, stat = stat):
+            
+            md5 = known['md5']
+        
+        else:
+            
+            md5 = hashlib.md5()
+            
+            with open(path, 'rb') as fp:
+                
+                for chunk in iter(lambda: fp.read(1 << 20), b''):
+                    
+                    md5.update(chunk)
+            
+            md5 = md5.hexdigest()
+        
+        return {
+            'path': path,
+            'size': stat.st_size,
+            'mtime': stat.st_mtime_ns,
+            'md5': md5,
+        }
+    
+    
+    @staticmethod
+    def _file_unchanged(path, record, stat = None):
+        
+        if not record or not os.path.isfile(path):
+            
+            return False
+        
+        stat = stat or os.stat(path)
+        
+        return (
+            record.get('size') == stat.st_size and
+            record.get('mtime') == stat.st_mtime_ns
+        )
+    
+    
+    @classmethod
+    def _normalize(cls, obj):
+        """
+        Converts ``obj`` to nested tuples so its representation does not
+        depend on the order of the elements of dicts and sets.
+        """
+        
+        iterable = hasattr(obj, '__iter__') and not hasattr(obj, 'lower')
+        
+        return (
+            tuple(sorted(
+                (repr(k), cls._normalize(v))
+                for k, v in iteritems(obj)
+            ))
+                if isinstance(obj, dict) else
+            tuple(sorted(repr(cls._normalize(v)) for v in obj))
+                if isinstance(obj, (set, frozenset)) else
+            tuple(cls._normalize(v) for v in obj)
+                if iterable else
+            obj
+        )
 
 
 class OpenmsMethodWrapper(MethodParamHandler, MethodPathHandler):
@@ -723,6 +996,11 @@ class OpenmsMethodWrapper(MethodParamHandler, MethodPathHandler):
         the current settings.
     method_key : str
         
+    cache : bool
+        Use the output of a previous run if available, see
+        ``MethodPathHandler``.
+    force : bool
+        Run even if the output of a previous run is available.
     """
     
     def __init__(
@@ -735,6 +1013,8 @@ class OpenmsMethodWrapper(MethodParamHandler, MethodPathHandler):
             method_key = None,
             sample_id = None,
             sample_id_method = None,
+            cache = False,
+            force = False,
             **kwargs
         ):
         
@@ -756,13 +1036,21 @@ class OpenmsMethodWrapper(MethodParamHandler, MethodPathHandler):
             output_path = output_path,
             sample_id = sample_id,
             sample_id_method = sample_id_method,
+            cache = cache,
+            force = force,
         )
     
     
     def main(self):
         
         self.openms_wrapper_setup()
+        
+        if self.check_cache():
+            
+            return
+        
         self.run()
+        self.save_manifest()
     
     
     def openms_wrapper_setup(self):
@@ -993,6 +1281,8 @@ class FeatureFindingMetabo(OpenmsMethodWrapper):
         mass_trace_detection_param = None,
         elution_peak_detection_param = None,
         feature_finding_metabo_param = None,
+        cache = False,
+        force = False,
         **kwargs
     ):
         
@@ -1015,6 +1305,8 @@ class FeatureFindingMetabo(OpenmsMethodWrapper):
             name = 'feature_finding_metabo',
             sample_id = sample_id,
             sample_id_method = sample_id_method,
+            cache = cache,
+            force = force,
             **self.feature_finding_metabo_param,
         )
     
@@ -1117,6 +1409,36 @@ class FeatureFindingMetabo(OpenmsMethodWrapper):
         )
     
     
+    def cache_param(self):
+        """
+        Beside the parameters of ``pyopenms.FeatureFindingMetabo`` the
+        parameters of the mass trace and elution peak detection steps
+        are included.
+        """
+        
+        param = {'feature_finding_metabo': self.param}
+        
+        for key, method, kwargs_param in (
+            (
+                'mass_trace_detection',
+                oms.MassTraceDetection,
+                self.mass_trace_detection_param,
+            ),
+            (
+                'elution_peak_detection',
+                oms.ElutionPeakDetection,
+                self.elution_peak_detection_param,
+            ),
+        ):
+            
+            param[key] = [
+                settings.get(settings_key)
+                for settings_key in self._module_param_keys[method]
+            ] + [kwargs_param]
+        
+        return param
+    
+    
     def adjust_featurefindermetabo_param(self):
         
         self.param.pop(b'noise_threshold_int', None)
@@ -1212,6 +1534,14 @@ class MapAlignmentAlgorithmPoseClustering(OpenmsMethodWrapper):
         self.reference_map = reference_map
     
     
+    def cache_inputs(self):
+        
+        return (
+            OpenmsMethodWrapper.cache_inputs(self) +
+            [self.reference_path]
+        )
+    
+    
     def run(self):
         
         self.read_input()
@@ -1322,6 +1652,8 @@ class MgfExport(MethodPathHandler):
         output_path = None,
         sample_id = None,
         sample_id_method = None,
+        cache = False,
+        force = False,
     ):
         
         MethodPathHandler.__init__(
@@ -1333,14 +1665,22 @@ class MgfExport(MethodPathHandler):
             method_key = 'mgf_export',
             sample_id = sample_id,
             sample_id_method = sample_id_method,
+            cache = cache,
+            force = force,
         )
     
     
     def main(self):
         
         self.set_paths()
+        
+        if self.check_cache():
+            
+            return
+        
         self.read()
         self.write()
+        self.save_manifest()
     
     
     def read(self):
@@ -1360,8 +1700,17 @@ class MgfExport(MethodPathHandler):
     
     
     def write(self):
+        """
+        Writes the MS2 spectra into the MGF file and the scan index
+        (see ``lipyd.mgf.write_index``) beside it.
+        """
         
-        with open(self.output_path, 'w') as fp:
+        # the index rows: precursor m/z and intensity, RT, scan number,
+        # byte offset of the peaks and charge
+        index = []
+        
+        # binary mode so the offsets are the number of bytes written
+        with open(self.output_path, 'wb') as fp:
             
             self._log('Exporting MS2 spectra to `%s`.' % self.output_path)
             # I commented this out at the moment,
@@ -1376,6 +1725,7 @@ class MgfExport(MethodPathHandler):
             # Iterate through all spectra,
             # skip all MS1 spectra and then write mgf format
             nr_ms2_spectra = 0
+            offset = 0
             
             for spectrum in self.input_obj:
                 
@@ -1383,37 +1733,31 @@ class MgfExport(MethodPathHandler):
                     continue
                 
                 nr_ms2_spectra += 1
-                _ = fp.write("BEGIN IONS\n")
-                _ = fp.write("TITLE=%s\n" % spectrum.getNativeID().decode())
-                _ = fp.write("RTINSECONDS=%.09f\n" % spectrum.getRT())
                 self.spectrum = spectrum
                 
-                try:
-                    _ = fp.write(
-                        "PEPMASS=%.018f %.09f\n" % (
-                            spectrum.getPrecursors()[0].getMZ(),
-                            spectrum.getPrecursors()[0].getIntensity(),
-                        )
+                header, record = self._spectrum_header(
+                    spectrum,
+                    nr_ms2_spectra,
+                )
+                block = (
+                    '%s%sEND IONS\n' % (
+                        header,
+                        self._peaks_block(spectrum),
                     )
-                    ch = spectrum.getPrecursors()[0].getCharge()
-                    
-                    if ch > 0:
-                        _ = fp.write("CHARGE=%u%s\n" % (
-                                abs(ch),
-                                '-' if ch < 0 else ''
-                            )
-                        )
-                    
-                except IndexError:
-                    
-                    _ = fp.write("PEPMASS=unknown\n")
+                ).encode('utf-8')
                 
-                for peak in spectrum:
-                    _ = fp.write(
-                        "%s %s\n" % (peak.getMZ(), peak.getIntensity())
+                # spectra without peaks are indexed too, at the offset
+                # of `END IONS`, the same way `mgf.MgfReader` does
+                if record:
+                    
+                    index.append(
+                        record[:4] +
+                        [offset + len(header.encode('utf-8'))] +
+                        record[4:]
                     )
                 
-                _ = fp.write("END IONS\n")
+                offset += len(block)
+                _ = fp.write(block)
             
             if nr_ms2_spectra == 0:
                 
@@ -1431,6 +1775,78 @@ class MgfExport(MethodPathHandler):
                         self.output_path,
                     )
                 )
+        
+        mgf.write_index(self.output_path, index)
+    
+    
+    @staticmethod
+    def _spectrum_header(spectrum, n):
+        """
+        Returns the header lines of one spectrum and its index row without
+        the offset. The index row is ``None`` if the spectrum has no
+        precursor.
+        """
+        
+        title = "TITLE=%s\n" % spectrum.getNativeID().decode()
+        rt = "%.09f" % spectrum.getRT()
+        lines = [
+            "BEGIN IONS\n",
+            title,
+            "RTINSECONDS=%s\n" % rt,
+        ]
+        
+        try:
+            
+            pepmass = "%.018f" % spectrum.getPrecursors()[0].getMZ()
+            intensity = "%.09f" % spectrum.getPrecursors()[0].getIntensity()
+            lines.append("PEPMASS=%s %s\n" % (pepmass, intensity))
+            ch = spectrum.getPrecursors()[0].getCharge()
+            
+            if ch > 0:
+                lines.append("CHARGE=%u%s\n" % (
+                        abs(ch),
+                        '-' if ch < 0 else ''
+                    )
+                )
+            
+            # scan number as `mgf.MgfReader` parses it from the title,
+            # the number of the spectrum if it does not match
+            scan = mgf.MgfReader.reln0.match(title.strip())
+            scan = float(scan.group(2)) if scan else float(n)
+            
+            # values as `mgf.MgfReader` reads them from the MGF
+            record = [
+                float(pepmass),
+                float(intensity),
+                float(rt) / 60.0,
+                scan,
+                max(ch, 0),
+            ]
+        
+        except IndexError:
+            
+            lines.append("PEPMASS=unknown\n")
+            record = None
+        
+        return ''.join(lines), record
+    
+    
+    @staticmethod
+    def _peaks_block(spectrum):
+        """
+        Returns the peak lines of one spectrum, the m/z and intensity
+        separated by space.
+        """
+        
+        mzs, intensities = spectrum.get_peaks()
+        
+        # floats from `tolist` are formatted the same way as the values
+        # from `Peak1D.getMZ` and `Peak1D.getIntensity`
+        peaks = np.empty((len(mzs), 2), dtype = np.float64)
+        peaks[:,0] = mzs
+        peaks[:,1] = intensities
+        
+        return ('%s %s\n' * len(peaks)) % tuple(peaks.ravel().tolist())
 
 
 class FeatureGroupingAlgorithmQT(OpenmsMethodWrapper):
@@ -1647,6 +2063,24 @@ class MSPreprocess(PathHandlerBase):
         A step where the workflow has to stop. E.g. if it's
         ``feature_finding``, the last step executed will be
         ``feature_finding``.
+    processes : int
+        Number of worker processes for the steps processing each sample
+        separately (peak picking, feature finding, map alignment and MGF
+        export). If ``None``, the ``preprocess_processes`` setting is
+        used; if that is ``None`` too, one process is started for each
+        CPU. 1 means all samples are processed in this process.
+        Parallel processing is possible only if the inputs are files;
+        the outputs are written to the usual paths and the next step
+        reads them from there.
+    cache : bool
+        Reuse the outputs of previous runs. For each output file a
+        manifest is written with a key calculated from the checksums of
+        the input files, the parameters and the versions of ``lipyd``
+        and OpenMS. At the next run each step is skipped for those
+        samples where the key is the same, and only the affected samples
+        and steps are processed again. The steps in ``force`` are
+        executed in any case. By default the ``preprocess_cache``
+        setting.
     """
     
     _stages = (
@@ -1698,6 +2132,12 @@ class MSPreprocess(PathHandlerBase):
         'feature_grouping',
         'data_extraction',
     }
+    _cached_methods = {
+        'peak_picking',
+        'feature_finding',
+        'map_alignment',
+        'feature_grouping',
+    }
     
     def __init__(
         self,
@@ -1730,6 +2170,8 @@ class MSPreprocess(PathHandlerBase):
         force = None,
         stop = None,
         mgf_export = True,
+        processes = None,
+        cache = None,
         # attributes
         ionmode = None,
         # nothing
@@ -1787,6 +2229,16 @@ class MSPreprocess(PathHandlerBase):
         self.mgf_export = mgf_export
         self.reference_sample = reference_sample
         self.ionmode = ionmode
+        self.processes = (
+            processes
+                if processes is not None else
+            settings.get('preprocess_processes')
+        )
+        self.cache = (
+            cache
+                if cache is not None else
+            settings.get('preprocess_cache')
+        )
     
     
     def reload(self):
@@ -1950,6 +2402,12 @@ class MSPreprocess(PathHandlerBase):
         sample_ids_in = self.sample_id or [None] * len(source)
         sample_ids_out = []
         
+        if method in self._cached_methods:
+            
+            param = copy.deepcopy(param)
+            param['cache'] = self.cache
+            param['force'] = method in self.force
+        
         if method in self._multi_input_methods:
             
             input_arg = (
@@ -1962,7 +2420,13 @@ class MSPreprocess(PathHandlerBase):
             )
             
             param = copy.deepcopy(param)
-            param[input_arg] = source
+            param[input_arg] = (
+                # objects mixed with paths if some of the samples
+                # in the previous step have been taken from the cache
+                source_paths
+                    if input_arg == 'input_path' and all(source_paths) else
+                source
+            )
             param['sample_id'] = sample_ids_in
             
             if input_arg != 'input_path':
@@ -1975,16 +2439,14 @@ class MSPreprocess(PathHandlerBase):
             
             worker = _class(**param)
             worker.main()
-            target = (
-                [worker.output_map,]
-                    if hasattr(worker, 'output_map') else
-                [worker,]
-            )
+            target = [self._step_result(worker)]
             target_paths = [worker.output_path,]
             sample_ids_out = worker.sample_id
             
         else:
             
+            params = []
+            
             for resource, source_path, sample_id in zip(
                     source,
                     source_paths,
@@ -1996,30 +2458,49 @@ class MSPreprocess(PathHandlerBase):
                         if isinstance(resource, OPENMS_OBJ_TYPES) else
                     'input_path'
                 )
-                param = copy.deepcopy(param)
-                param[input_arg] = resource
-                param['sample_id'] = sample_id
+                this_param = copy.deepcopy(param)
+                this_param[input_arg] = resource
+                this_param['sample_id'] = sample_id
                 
                 if input_arg != 'input_path':
                     
-                    param['input_path'] = source_path
+                    this_param['input_path'] = source_path
+                
+                params.append(this_param)
+            
+            if self._parallel(params):
                 
-                worker = _class(**param)
-                worker.main()
-                target.append(
-                    worker.output_map
-                        if hasattr(worker, 'output_map') else
-                    worker
+                target_paths, sample_ids_out = self._step_parallel(
+                    _class,
+                    params,
+                    mgf_export = (
+                        self.mgf_export and
+                        method == 'peak_picking'
+                    ),
                 )
-                target_paths.append(worker.output_path)
-                sample_ids_out.append(worker.sample_id)
+                # the next step reads the outputs from the files
+                target = list(target_paths)
+                target_paths = list(target_paths)
+                sample_ids_out = list(sample_ids_out)
+            
+            else:
                 
-                if self.mgf_export and method == 'peak_picking':
+                for param in params:
                     
-                    self.export_mgf(
-                        input_obj = worker.output_map,
-                        input_path = worker.output_path,
-                    )
+                    worker = _class(**param)
+                    worker.main()
+                    target.append(self._step_result(worker))
+                    target_paths.append(worker.output_path)
+                    sample_ids_out.append(worker.sample_id)
+                    
+                    if self.mgf_export and method == 'peak_picking':
+                        
+                        self.export_mgf(
+                            input_obj = getattr(worker, 'output_map', None),
+                            input_path = worker.output_path,
+                            cache = self.cache,
+                            force = method in self.force,
+                        )
         
         self.result = target
         self.result_paths = target_paths
@@ -2030,6 +2511,81 @@ class MSPreprocess(PathHandlerBase):
         self.sample_ids = sample_ids_out
     
     
+    @staticmethod
+    def _step_result(worker):
+        """
+        Returns the result of one step which will be the input of the next
+        step: the output object or, if the step has been skipped as its
+        output is available from a previous run, the output path.
+        """
+        
+        return (
+            worker.output_path
+                if worker.cached else
+            worker.output_map
+                if hasattr(worker, 'output_map') else
+            worker
+        )
+    
+    
+    def _parallel(self, params):
+        """
+        Tells if the samples can be processed in parallel.
+        """
+        
+        if self.processes == 1 or len(params) < 2:
+            
+            return False
+        
+        # OpenMS objects can not be passed to other processes
+        if any(
+            isinstance(value, OPENMS_OBJ_TYPES)
+            for param in params
+            for value in param.values()
+        ):
+            
+            self._log(
+                'Inputs provided as OpenMS objects, processing the '
+                'samples one by one instead of parallel.'
+            )
+            
+            return False
+        
+        return True
+    
+    
+    def _step_parallel(self, _class, params, mgf_export = False):
+        """
+        Runs one step for each sample in a pool of worker processes.
+        Returns the output paths and the sample IDs in the order of the
+        samples.
+        """
+        
+        self._log(
+            'Running `%s` on %u samples in %s worker processes.' % (
+                _class.__name__,
+                len(params),
+                'one per CPU' if self.processes is None else self.processes,
+            )
+        )
+        
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers = self.processes,
+        ) as executor:
+            
+            # `map` yields the results in the order of the inputs
+            result = list(
+                executor.map(
+                    _step_worker,
+                    itertools.repeat(_class),
+                    params,
+                    itertools.repeat(mgf_export),
+                )
+            )
+        
+        return tuple(zip(*result))
+    
+    
     def peak_picking(self):
         
         self._step_base(method = 'peak_picking')
@@ -2114,6 +2670,16 @@ class MSPreprocess(PathHandlerBase):
         else:
             
             self.map_alignment_param['reference_path'] = refmap
+        
+        # the path identifies the reference for the manifest
+        if isinstance(refmap, oms.FeatureMap) and hasattr(
+            self,
+            'features_paths',
+        ):
+            
+            self.map_alignment_param['reference_path'] = (
+                self.features_paths[iref]
+            )
     
     
     def _map_alignment_manually_select_reference(self, sample_id = None):
@@ -2162,7 +2728,52 @@ class MSPreprocess(PathHandlerBase):
         return {}
 
 
+def _step_worker(_class, param, mgf_export = False):
+    """
+    Runs the method of a workflow step on one sample in a worker process.
+    Returns the output path and the sample ID, the OpenMS objects remain
+    in the worker.
+    """
+    
+    worker = _class(**param)
+    worker.main()
+    
+    if mgf_export:
+        
+        mgf_exporter = MgfExport(
+            input_obj = getattr(worker, 'output_map', None),
+            input_path = worker.output_path,
+            cache = param.get('cache', False),
+            force = param.get('force', False),
+        )
+        mgf_exporter.main()
+    
+    return worker.output_path, worker.sample_id
+
+
 class ConsensusMapExtractor(session.Logger):
+    """
+    Extracts the data from a ``pyopenms.ConsensusMap``.
+    
+    The consensus map is processed in one pass, the coordinates of the
+    consensus features and of the features in each sample are stored in
+    arrays: in ``consensus_arrays`` one dimensional arrays, in
+    ``sample_arrays`` arrays of features x samples, both ``dict``s with the
+    name of the OpenMS getter method as keys (e.g. ``getMZ``). Features
+    missing from a sample are ``nan`` in the latter arrays. All other
+    methods return data from these arrays.
+    
+    Parameters
+    ----------
+    consensus_map : pyopenms.ConsensusMap
+        The consensus map.
+    sample_ids : list
+        Sample IDs in the order of the maps in the consensus map.
+    ionmode : str
+        Ion mode, ``pos`` or ``neg``.
+    output_path : str
+        Path to the tab delimited output file.
+    """
     
     _common_fields = [
         'index',
@@ -2181,6 +2792,23 @@ class ConsensusMapExtractor(session.Logger):
         'width__%s',
     ]
     
+    # getter methods of consensus features and their types
+    _consensus_methods = (
+        ('getQuality', np.float64),
+        ('getWidth', np.float64),
+        ('getMZ', np.float64),
+        ('getRT', np.float64),
+        ('getIntensity', np.float64),
+        ('getCharge', np.int64),
+    )
+    # getter methods of features in the order of the sample fields
+    _sample_methods = (
+        'getMZ',
+        'getRT',
+        'getIntensity',
+        'getWidth',
+    )
+    
     def __init__(
             self,
             consensus_map,
@@ -2212,30 +2840,100 @@ class ConsensusMapExtractor(session.Logger):
         self._set_sample_ids()
         self._set_fields()
         self.define_record()
+        self.extract()
         self.make_dataframe()
         self.export()
     
     
+    def extract(self):
+        """
+        Iterates through the consensus map and fills the arrays.
+        """
+        
+        self._set_sample_ids()
+        
+        n_features = self.consensus_map.size()
+        n_samples = len(self.sample_ids)
+        
+        self.consensus_arrays = dict(
+            (method, np.zeros(n_features, dtype = dtype))
+            for method, dtype in self._consensus_methods
+        )
+        self.sample_arrays = dict(
+            (method, np.full((n_features, n_samples), np.nan))
+            for method in self._sample_methods
+        )
+        
+        consensus_getters = [
+            (self.consensus_arrays[method], operator.methodcaller(method))
+            for method, dtype in self._consensus_methods
+        ]
+        sample_getters = [
+            (self.sample_arrays[method], operator.methodcaller(method))
+            for method in self._sample_methods
+        ]
+        
+        for i, cfeature in enumerate(self.consensus_map):
+            
+            for array, getter in consensus_getters:
+                
+                array[i] = getter(cfeature)
+            
+            for feature in cfeature.getFeatureList():
+                
+                j = feature.getMapIndex()
+                
+                # like in the `features` dict of `iter_features`
+                # indices beyond the samples are ignored
+                if j < n_samples:
+                    
+                    for array, getter in sample_getters:
+                        
+                        array[i, j] = getter(feature)
+        
+        self._log(
+            'Extracted %u consensus features from %u samples.' % (
+                n_features,
+                n_samples,
+            )
+        )
+    
+    
+    def _ensure_extracted(self):
+        
+        if not hasattr(self, 'consensus_arrays'):
+            
+            self.extract()
+    
+    
     def __iter__(self):
         
-        for i, cfeature, features in self.iter_features():
+        self._ensure_extracted()
+        
+        if not hasattr(self, 'record'):
+            
+            self._set_fields()
+            self.define_record()
+        
+        columns = [
+            self.consensus_arrays[method].tolist()
+            for method, dtype in self._consensus_methods
+        ]
+        sample_columns = [
+            self.sample_arrays[method]
+            for method in self._sample_methods
+        ]
+        
+        for i in xrange(self.consensus_map.size()):
+            
+            samples = zip(*(column[i].tolist() for column in sample_columns))
             
             yield self.record(
-                index = i,
-                quality = cfeature.getQuality(),
-                width = cfeature.getWidth(),
-                mz = cfeature.getMZ(),
-                rt = cfeature.getRT(),
-                intensity = cfeature.getIntensity(),
-                charge = cfeature.getCharge(),
-                **dict(zip(
-                    self._sample_fields,
-                    (
-                        value
-                        for j in xrange(len(self.sample_ids))
-                        for value in self.get_sample_fields(features, j)
-                    )
-                ))
+                i,
+                *(
+                    [column[i] for column in columns] +
+                    [value for values in samples for value in values]
+                )
             )
     
     
@@ -2277,7 +2975,7 @@ class ConsensusMapExtractor(session.Logger):
             
             self.sample_ids = [
                 '%03u' % i
-                for i in xrange(self.consensus_map.getColumnHeaders())
+                for i in xrange(len(self.consensus_map.getColumnHeaders()))
             ]
     
     
@@ -2306,12 +3004,27 @@ class ConsensusMapExtractor(session.Logger):
     
     
     def make_dataframe(self):
+        """
+        Creates a ``pandas.DataFrame`` from the arrays, one column for
+        each field.
+        """
         
-        hdr = self.record._fields
+        self._ensure_extracted()
+        
+        columns = [
+            np.arange(self.consensus_map.size())
+        ] + [
+            self.consensus_arrays[method]
+            for method, dtype in self._consensus_methods
+        ] + [
+            self.sample_arrays[method][:,j]
+            for j in xrange(len(self.sample_ids))
+            for method in self._sample_methods
+        ]
         
         self.dataframe = pd.DataFrame(
-            list(self.__iter__()),
-            columns = hdr,
+            collections.OrderedDict(zip(self._fields, columns)),
+            columns = self._fields,
         )
     
     
@@ -2334,9 +3047,7 @@ class ConsensusMapExtractor(session.Logger):
     
     def _iter_consensus_coordinates(self, method):
         
-        for cfeature in self.consensus_map:
-            
-            yield getattr(cfeature, method)()
+        return iter(self._to_array(method))
     
     
     def iter_mz(self):
@@ -2375,7 +3086,9 @@ class ConsensusMapExtractor(session.Logger):
     
     def _to_array(self, method):
         
-        return np.array(list(self._iter_consensus_coordinates(method)))
+        self._ensure_extracted()
+        
+        return self.consensus_arrays[method]
     
     
     def mz_array(self):
@@ -2418,12 +3131,7 @@ class ConsensusMapExtractor(session.Logger):
     
     def _iter_sample_coordinates(self, method):
         
-        for i, cfeature, feature in self.iter_features():
-            
-            yield np.array([
-                getattr(feature[j], method)() if j in feature else np.nan
-                for j in xrange(len(self.sample_ids))
-            ])
+        return iter(self._get_samples_array(method))
     
     
     def iter_sample_intensities(self):
@@ -2451,7 +3159,9 @@ class ConsensusMapExtractor(session.Logger):
     
     def _get_samples_array(self, method):
         
-        return np.vstack(list(self._iter_sample_coordinates(method)))
+        self._ensure_extracted()
+        
+        return self.sample_arrays[method]
     
     
     def sample_mzs_array(self):
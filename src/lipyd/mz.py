@@ -26,8 +26,12 @@ from future.utils import iteritems
 from past.builtins import xrange, range, reduce
 
 import imp
+import collections
+
+import numpy as np
 
 import lipyd.mass as mass
+import lipyd.settings as settings
 
 class Mz():
     """Represents one m/z value.
@@ -111,6 +115,14 @@ class Mz():
         """ """
         return self.adduct(3 * mass.proton)
     
+    def remove_2h(self):
+        """ """
+        return self.adduct(-2 * mass.proton)
+    
+    def remove_3h(self):
+        """ """
+        return self.adduct(-3 * mass.proton)
+    
     def add_oh(self):
         """ """
         m = mass.MassBase('OH')
@@ -294,3 +306,168 @@ class Mz():
         imp.reload(mod)
         new = getattr(mod, self.__class__.__name__)
         setattr(self, '__class__', new)
+
+
+class AdductTable(object):
+    
+    
+    def __init__(self, ionmode = None, charges = None, adducts = None):
+        """
+        Converts arrays of m/z values to exact masses assuming various
+        adducts, and exact masses to m/z values of adducts.
+        
+        Each adduct defined in the ``ad2ex`` and ``ex2ad`` settings is
+        reduced to constants: the charge, a multiplier (the absolute value
+        of the charge) and an offset for each direction. The offsets are
+        obtained from the methods of ``Mz``. Then the conversion of an
+        array of m/z values to an adducts x values matrix of exact masses
+        is a single operation.
+        
+        Parameters
+        ----------
+        ionmode : str
+            ``pos`` or ``neg``; by default adducts of both ion modes
+            are included.
+        charges : int,list
+            Absolute values of charges; by default all charges
+            available in the settings.
+        adducts : list
+            Names of the adducts, e.g. ``['[M+H]+', '[M+Na]+']``. By default
+            all adducts of the ion mode and charges. The rows of the result
+            matrices are in this order.
+        """
+        
+        ad2ex = settings.get_frozen('ad2ex')
+        ex2ad = settings.get_frozen('ex2ad')
+        
+        ionmodes = (ionmode,) if ionmode else ('pos', 'neg')
+        charges = (
+            sorted(ad2ex.keys())
+                if charges is None else
+            (charges,)
+                if isinstance(charges, int) else
+            charges
+        )
+        
+        available = collections.OrderedDict()
+        
+        for z in charges:
+            
+            for _ionmode in ionmodes:
+                
+                for ad, method in iteritems(ad2ex[z][_ionmode]):
+                    
+                    available[ad] = (
+                        z if _ionmode == 'pos' else -z,
+                        method,
+                        ex2ad[z][_ionmode][ad],
+                    )
+        
+        self.adducts = tuple(adducts or available.keys())
+        self.charge = np.array(
+            [available[ad][0] for ad in self.adducts],
+            dtype = np.int64,
+        )
+        self.multiplier = np.abs(self.charge).astype(np.float64)
+        self.offset_exact = np.array(
+            [self._offset(available[ad][1]) for ad in self.adducts]
+        )
+        self.offset_adduct = np.array(
+            [self._offset(available[ad][2]) for ad in self.adducts]
+        )
+    
+    
+    def __len__(self):
+        
+        return len(self.adducts)
+    
+    
+    @staticmethod
+    def _offset(method):
+        
+        return getattr(Mz(0.0), method)()
+    
+    
+    def exact_masses(self, mzs):
+        """
+        Calculates the exact masses from m/z values assuming each adduct.
+        
+        Parameters
+        ----------
+        mzs : float,numpy.ndarray
+            One or more m/z values.
+        
+        Returns
+        -------
+        Array of exact masses, one row for each adduct and one column for
+        each m/z value.
+        """
+        
+        mzs = np.atleast_1d(np.asarray(mzs, dtype = np.float64))
+        
+        return (
+            mzs[None,:] * self.multiplier[:,None] +
+            self.offset_exact[:,None]
+        )
+    
+    
+    def adduct_mzs(self, masses):
+        """
+        Calculates the m/z of each adduct from exact masses.
+        
+        Parameters
+        ----------
+        masses : float,numpy.ndarray
+            One or more exact masses, e.g. all masses in a database.
+        
+        Returns
+        -------
+        Array of m/z values, one row for each adduct and one column for
+        each exact mass.
+        """
+        
+        masses = np.atleast_1d(np.asarray(masses, dtype = np.float64))
+        
+        return (
+            (masses[None,:] + self.offset_adduct[:,None]) /
+            self.multiplier[:,None]
+        )
+
+
+_adduct_tables = {}
+_adduct_tables_version = None
+
+
+def adduct_table(ionmode = None, charges = None, adducts = None):
+    """
+    Returns an ``AdductTable``. The tables are cached until the settings
+    change.
+    
+    Parameters
+    ----------
+    See ``AdductTable``.
+    """
+    
+    global _adduct_tables_version
+    
+    if _adduct_tables_version != settings.version():
+        
+        _adduct_tables.clear()
+        _adduct_tables_version = settings.version()
+    
+    key = (
+        ionmode,
+        charges if charges is None or isinstance(charges, int) else
+        tuple(charges),
+        tuple(adducts) if adducts else None,
+    )
+    
+    if key not in _adduct_tables:
+        
+        _adduct_tables[key] = AdductTable(
+            ionmode = ionmode,
+            charges = charges,
+            adducts = adducts,
+        )
+    
+    return _adduct_tables[key]
@@ -17,12 +17,16 @@
 #  Website: http://denes.omnipathdb.org/
 #
 
-# from pyteomics import mzml
+import re
+import zlib
+import base64
+import xml.etree.ElementTree as ET
+
+import numpy as np
 
-try:
-    import pyopenms as oms
-except:
-    pass
+import lipyd.mgf as mgf
+
+# from pyteomics import mzml
 
 mzml_example = ('/home/denes/archive/ltp/STARD10_invivo_raw/mzml/'
     '150310_Popeye_MLH_AC_STARD10_A10_pos.mzML')
@@ -47,6 +51,8 @@ class Reader(object):
         Opens an mzML file.
         """
         
+        import pyopenms as oms
+        
         options = oms.PeakFileOptions()
         options.setMSLevels([2])
         self.mzml = oms.MzMLFile()
@@ -66,3 +72,352 @@ class Reader(object):
             self.seeds,
         )
         self.features.setUniqueIds()
+
+
+# accessions of the controlled vocabulary terms we use
+_cv_ms_level = 'MS:1000511'
+_cv_scan_start_time = 'MS:1000016'
+_cv_selected_ion_mz = 'MS:1000744'
+_cv_peak_intensity = 'MS:1000042'
+_cv_charge_state = 'MS:1000041'
+_cv_mz_array = 'MS:1000514'
+_cv_intensity_array = 'MS:1000515'
+_cv_zlib = 'MS:1000574'
+_cv_minute = 'UO:0000031'
+_cv_dtypes = {
+    'MS:1000519': '<i4',
+    'MS:1000521': '<f4',
+    'MS:1000522': '<i8',
+    'MS:1000523': '<f8',
+}
+_cv_numpress = {
+    'MS:1002312',
+    'MS:1002313',
+    'MS:1002314',
+}
+
+
+def _local(tag):
+    """
+    Returns the tag name without the namespace.
+    """
+    
+    return tag.rsplit('}', 1)[-1]
+
+
+class MzmlReader(mgf.MgfReader):
+    """
+    Provides methods for looking up MS2 scans from an mzML file, the same
+    way as ``mgf.MgfReader`` does from MGF files, without pyopenms.
+    
+    At indexing the file is processed chunk by chunk, only the headers of
+    the spectra (the part before the binary data arrays) are parsed, and
+    only the precursor m/z, precursor intensity, RT, scan number and byte
+    offset of the MS2 spectra are kept, hence the memory use does not
+    depend on the size of the file. The scans are read by seeking to
+    their offset and parsing only the ``spectrum`` element. The peak
+    arrays are decoded from base64 and zlib directly into arrays.
+    
+    The index has the same columns as in ``mgf.MgfReader``, the RT is in
+    minutes and the scan number is taken from the native ID the same way
+    as from the title in MGF files exported by ``msproc.MgfExport``.
+    """
+    
+    index_chunk_size = 1 << 20
+    scan_chunk_size = 1 << 16
+    respectrum_start = re.compile(br'<((?:\w+:)?spectrum)[\s>]')
+    respectrum_end = re.compile(br'</(?:\w+:)?spectrum\s*>')
+    # the header of a spectrum is the part before the binary arrays
+    reheader_end = re.compile(
+        br'<(?:\w+:)?binaryDataArrayList[\s>]|</(?:\w+:)?spectrum\s*>'
+    )
+    
+    def index_file(self):
+        """
+        Reads the whole mzML file and collects the index rows of the MS2
+        spectra.
+        
+        The file is processed in chunks. In each chunk the beginning of
+        the spectra is looked up and only the part before the binary data
+        arrays is parsed.
+        """
+        
+        features = []
+        n_spectra = 0
+        # the absolute offset of the beginning of the buffer
+        base = 0
+        data = b''
+        
+        with open(self.fname, 'rb') as fp:
+            
+            for chunk in iter(lambda: fp.read(self.index_chunk_size), b''):
+                
+                data += chunk
+                pos = 0
+                keep = max(len(data) - 64, 0)
+                
+                while True:
+                    
+                    start = self.respectrum_start.search(data, pos)
+                    
+                    if not start:
+                        
+                        break
+                    
+                    end = self.reheader_end.search(data, start.end())
+                    
+                    if not end:
+                        
+                        # the header of the spectrum continues in the next
+                        # chunk
+                        keep = start.start()
+                        break
+                    
+                    header = data[start.start():end.end()]
+                    
+                    if not end.group(0).startswith(b'</'):
+                        
+                        # closing the spectrum element before the arrays
+                        header = b'%s</%s>' % (
+                            data[start.start():end.start()],
+                            start.group(1),
+                        )
+                    
+                    row = self._index_row(
+                        ET.fromstring(header),
+                        base + start.start(),
+                        n_spectra,
+                    )
+                    n_spectra += 1
+                    
+                    if row is not None:
+                        
+                        features.append(row)
+                    
+                    pos = end.end()
+                    keep = max(keep, pos)
+                
+                # the beginning of a spectrum tag might be at the end of
+                # the chunk, that's why we keep a tail from it
+                base += keep
+                data = data[keep:]
+        
+        return features
+    
+    def _index_row(self, elem, offset, n):
+        """
+        Returns the index row for a spectrum element or ``None`` if it is
+        not an MS2 spectrum or its charge does not match.
+        """
+        
+        info = self.spectrum_info(elem)
+        
+        if (
+            not info['ms_level'] or
+            info['ms_level'] < 2 or
+            info['mz'] is None or
+            (self.charge is not None and info['charge'] != self.charge)
+        ):
+            
+            return None
+        
+        scan = self.reln0.match('%s=%s' % (self.stRtitle, elem.get('id')))
+        scan = (
+            float(scan.group(2))
+                if scan else
+            float(elem.get('index', n))
+        )
+        
+        return [
+            info['mz'],
+            info['intensity'],
+            info['rt'],
+            scan,
+            offset,
+            self.label,
+        ]
+    
+    @staticmethod
+    def spectrum_info(elem):
+        """
+        Collects the MS level, the RT in minutes and the m/z, intensity
+        and charge of the (first) precursor from a spectrum element.
+        Missing values are ``None``, missing charge is zero.
+        """
+        
+        info = {
+            'ms_level': None,
+            'rt': None,
+            'mz': None,
+            'intensity': 0.0,
+            'charge': 0,
+        }
+        in_precursor = False
+        
+        for e in elem.iter():
+            
+            tag = _local(e.tag)
+            
+            if tag == 'binaryDataArrayList':
+                
+                break
+            
+            if tag == 'selectedIon':
+                
+                # only the first precursor ion is considered
+                in_precursor = info['mz'] is None
+            
+            if tag != 'cvParam':
+                
+                continue
+            
+            accession = e.get('accession')
+            
+            if accession == _cv_ms_level and info['ms_level'] is None:
+                
+                info['ms_level'] = int(e.get('value'))
+            
+            elif accession == _cv_scan_start_time and info['rt'] is None:
+                
+                info['rt'] = (
+                    float(e.get('value'))
+                        if e.get('unitAccession') == _cv_minute else
+                    float(e.get('value')) / 60.0
+                )
+            
+            elif in_precursor:
+                
+                if accession == _cv_selected_ion_mz:
+                    
+                    info['mz'] = float(e.get('value'))
+                
+                elif accession == _cv_peak_intensity:
+                    
+                    info['intensity'] = float(e.get('value'))
+                
+                elif accession == _cv_charge_state:
+                    
+                    info['charge'] = int(e.get('value'))
+        
+        return info
+    
+    @staticmethod
+    def decode_array(elem):
+        """
+        Decodes a ``binaryDataArray`` element.
+        
+        Returns
+        -------
+        Tuple of the accession of the array type (e.g. m/z or intensity)
+        and the values as an array of floats.
+        """
+        
+        dtype = '<f8'
+        compressed = False
+        array_type = None
+        data = b''
+        
+        for e in elem:
+            
+            tag = _local(e.tag)
+            
+            if tag == 'binary':
+                
+                data = base64.b64decode(e.text or '')
+            
+            elif tag == 'cvParam':
+                
+                accession = e.get('accession')
+                
+                if accession in _cv_dtypes:
+                    
+                    dtype = _cv_dtypes[accession]
+                
+                elif accession == _cv_zlib:
+                    
+                    compressed = True
+                
+                elif accession in _cv_numpress:
+                    
+                    raise ValueError(
+                        'MS-Numpress compressed mzML is not supported.'
+                    )
+                
+                elif accession in (_cv_mz_array, _cv_intensity_array):
+                    
+                    array_type = accession
+        
+        if compressed:
+            
+            data = zlib.decompress(data)
+        
+        return (
+            array_type,
+            np.frombuffer(data, dtype = dtype).astype(np.float64),
+        )
+    
+    def get_scan(self, i):
+        """
+        Reads MS2 fragment peaks from one scan.
+        
+        Returns m/z's and intensities in 2 columns array.
+        """
+        
+        self.get_file()
+        self.fp.seek(int(self.mgfindex[i, 4]), 0)
+        
+        data = b''
+        
+        while True:
+            
+            chunk = self.fp.read(self.scan_chunk_size)
+            # the closing tag might start in the previous chunk
+            searchfrom = max(len(data) - 16, 0)
+            data += chunk
+            end = self.respectrum_end.search(data, searchfrom)
+            
+            if end or not chunk:
+                
+                break
+        
+        if not end:
+            
+            raise ValueError(
+                'Could not find the end of scan #%u in file `%s`.' % (
+                    self.mgfindex[i, 3],
+                    self.fname,
+                )
+            )
+        
+        elem = ET.fromstring(data[:end.end()])
+        
+        arrays = dict(
+            self.decode_array(e)
+            for e in elem.iter()
+            if _local(e.tag) == 'binaryDataArray'
+        )
+        mzs = arrays.get(_cv_mz_array, np.array([]))
+        intensities = arrays.get(_cv_intensity_array, np.zeros_like(mzs))
+        positive = intensities > 0.0
+        
+        scan = np.column_stack((mzs[positive], intensities[positive]))
+        
+        if self.log.verbosity > 4:
+            
+            self.log.msg(
+                'Read scan #%u from file `%s`;'
+                '%u peaks retrieved.' % (
+                    self.mgfindex[i, 3],
+                    self.fname,
+                    len(scan),
+                )
+            )
+        
+        return scan
+    
+    def get_file(self):
+        """Returns the file pointer, opens the file if necessary."""
+        
+        if not hasattr(self, 'fp') or self.fp.closed:
+            
+            self.fp = open(self.fname, 'rb')
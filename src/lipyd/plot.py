@@ -274,7 +274,7 @@ class PlotBase(session.Logger):
             afterwards.
         """
         
-        if not hasattr(self, '_logger'):
+        if not hasattr(self, '_log_name'):
             
             session.Logger.__init__(self, name = log_label or 'plot')
         
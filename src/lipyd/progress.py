@@ -19,7 +19,6 @@
 import sys
 import imp
 import time
-import tqdm
 
 __all__ = ['Progress']
 
@@ -69,6 +68,8 @@ class Progress(object):
     
     def init_tqdm(self):
         
+        import tqdm
+        
         self.tqdm = tqdm.tqdm(total = self.total,
                               desc = '%s: %s' % (self.name, self.status),
                               unit_scale = True,
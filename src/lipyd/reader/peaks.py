@@ -16,6 +16,7 @@
 #
 
 from past.builtins import xrange
+from future.utils import iteritems
 
 import os
 import sys
@@ -25,6 +26,7 @@ import csv
 import mimetypes
 import warnings
 import numpy as np
+import pandas as pd
 
 import lipyd.reader.xls
 import lipyd.common as common
@@ -67,6 +69,8 @@ class PeaksReader(object):
             sample_id_method = None,
             sample_sorter = None,
             skip = None,
+            basic_filters = None,
+            chunk_size = None,
         ):
         """
         Reads data from an output file of the PEAKS software.
@@ -83,6 +87,16 @@ class PeaksReader(object):
         :param set skip:
             Sample IDs to be skipped. By default ``('Z', 0)`` is skipped
             which represents the empty buffer.
+        :param bool,dict basic_filters:
+            Apply the same filters as ``sample.Sample.basic_filters``
+            already while reading. ``True`` means the default thresholds,
+            a ``dict`` of arguments for ``basic_filters_selection`` can be
+            provided to override them. The features filtered out are
+            never stored.
+        :param int chunk_size:
+            Read and process the file in chunks of this many lines.
+            Together with ``basic_filters`` the memory usage scales with
+            the number of features retained instead of the file size.
         """
         
         self.set_file(fname)
@@ -92,6 +106,12 @@ class PeaksReader(object):
         self.sample_sorter = sample_sorter or self.default_sample_sorter
         self.sample_id_method = sample_id_method or peaks_sample_id_method
         self.skip = skip or {('Z', 0)}
+        self.basic_filters = (
+            {}
+                if basic_filters is True else
+            basic_filters
+        )
+        self.chunk_size = chunk_size
         
         self.read()
     
@@ -113,82 +133,261 @@ class PeaksReader(object):
         )
     
     def read(self):
-        """ """
-        
-        # feature data
-        quality           = []
-        significance      = []
-        z                 = []
-        total_intensities = []
-        centr_mzs         = []
-        rt_ranges         = []
-        total_rt_means    = []
-        
-        # sample data
-        mzs               = []
-        rt_means          = []
-        intensities       = []
+        """Reads the file and creates the arrays of feature and sample
+        data. The header is processed once and the columns are converted
+        in bulk.
+        """
         
         lines = self.iterlines()
         self.hdr_raw = next(lines)
+        lines.close()
         self.process_header()
         
-        for i, line in enumerate(lines):
+        chunks = []
+        
+        for table in self.iter_tables():
             
-            rtrange = self.rertr.search(line[4])
+            data = self.process_table(table)
             
-            if not rtrange:
+            if self.basic_filters is not None:
                 
-                warnings.warn(
-                    'Could not parse RT range: %s\n'
-                    'File `%s`, line %u' % (line[4], self.fname, i)
+                selection = self.basic_filters_selection(
+                    data,
+                    **self.basic_filters
+                )
+                
+                data = dict(
+                    (attr, arr[selection] if arr.shape[0] else arr)
+                    for attr, arr in iteritems(data)
                 )
-                rtrange = (np.nan, np.nan)
+            
+            chunks.append(data)
+        
+        for attr in chunks[0].keys():
+            
+            setattr(
+                self,
+                attr,
+                np.concatenate([data[attr] for data in chunks])
+                    if len(chunks) > 1 else
+                chunks[0][attr]
+            )
+    
+    def iter_tables(self):
+        """Yields the contents of the file in chunks of ``chunk_size``
+        lines as ``pandas.DataFrame``s, or in one piece if ``chunk_size``
+        is ``None``.
+        """
+        
+        table = self.read_table(chunk_size = self.chunk_size)
+        
+        if isinstance(table, pd.DataFrame):
+            
+            if self.chunk_size is None:
                 
+                yield table
+            
             else:
                 
-                rtrange = rtrange.groups()
+                for i in xrange(0, max(table.shape[0], 1), self.chunk_size):
+                    
+                    yield table.iloc[i:i + self.chunk_size]
+        
+        else:
+            
+            for chunk in table:
+                
+                yield chunk
+    
+    @staticmethod
+    def basic_filters_selection(
+            data,
+            quality_min = .2,
+            charge = 1,
+            rt_min = 1.,
+            intensity_min = 10000.,
+        ):
+        """Returns a boolean array selecting the features which pass the
+        same thresholds as ``sample.Sample.basic_filters``.
+        
+        Parameters
+        ----------
+        data : dict
+            Arrays of feature data as returned by ``process_table``.
+        """
+        
+        selection = (
+            (data['quality'] > quality_min) &
+            (np.abs(data['z']) == abs(charge)) &
+            (data['total_intensities'] > intensity_min)
+        )
+        
+        if data['total_rt_means'].shape[0]:
+            
+            selection &= data['total_rt_means'] > rt_min
+        
+        return selection
+    
+    def columns(self):
+        """Returns the indices of the columns used."""
+        
+        return sorted(
+            set(range(1, 7)) |
+            ({self.rt_mean_idx} if self.rt_mean_idx else set()) |
+            {
+                sample[field]
+                for sample in self.samples
+                for field in ('m/z', 'RT mean', 'Normalized Area')
+            }
+        )
+    
+    def read_table(self, chunk_size = None):
+        """Returns the contents of the file (except the header) as a
+        ``pandas.DataFrame`` with the indices of the columns as column
+        labels. Only the columns used are read, numeric columns are
+        converted by the parser of ``pandas``. If ``chunk_size`` is
+        provided, for ``csv`` files an iterator of ``DataFrame``s is
+        returned.
+        """
+        
+        usecols = self.columns()
+        
+        if self.format == 'csv':
+            
+            with open(self.fname, 'r') as fp:
+                
+                dialect = csv.Sniffer().sniff(fp.read(20000))
             
+            return pd.read_csv(
+                self.fname,
+                sep = dialect.delimiter,
+                quotechar = dialect.quotechar,
+                skipinitialspace = dialect.skipinitialspace,
+                header = None,
+                skiprows = 1,
+                usecols = usecols,
+                # the RT range we parse later
+                dtype = {4: str},
+                # PEAKS marks missing values by dash
+                na_values = ['-'],
+                chunksize = chunk_size,
+            )
+        
+        lines = self.iterlines()
+        _ = next(lines)
+        
+        return pd.DataFrame(
+            [
+                [line[i] if i < len(line) else '' for i in usecols]
+                for line in lines
+            ],
+            columns = usecols,
+            dtype = np.object,
+        )
+    
+    def process_table(self, table):
+        """Converts the table (without the header) to the arrays of feature
+        and sample data. Returns a ``dict`` with attribute names as keys.
+        """
+        
+        def column(i):
             
-            quality.append(common.to_float(line[1]))
-            significance.append(common.to_float(line[2]))
-            centr_mzs.append(common.to_float(line[3]))
-            rt_ranges.append((
-                common.to_float(rtrange[0]),
-                common.to_float(rtrange[1]),
-            ))
-            z.append(common.to_int(line[5]))
-            total_intensities.append(common.to_float(line[6]))
+            return self.float_array(table[i])
+        
+        def sample_columns(field):
             
-            if self.rt_mean_idx:
-                total_rt_means.append(common.to_float(line[self.rt_mean_idx]))
+            return (
+                np.column_stack([
+                    column(sample[field])
+                    for sample in self.samples
+                ])
+                    if self.samples else
+                np.empty((table.shape[0], 0))
+            )
+        
+        return {
+            # feature data
+            'quality': column(1),
+            'significance': column(2),
+            'centr_mzs': column(3),
+            'rt_ranges': self.rt_range_array(table[4]),
+            'z': self.int_array(table[5]),
+            'total_intensities': column(6),
+            'total_rt_means': (
+                column(self.rt_mean_idx)
+                    if self.rt_mean_idx else
+                np.array([])
+            ),
+            # sample data
+            'mzs': sample_columns('m/z'),
+            'rt_means': sample_columns('RT mean'),
+            'intensities': sample_columns('Normalized Area'),
+        }
+    
+    @staticmethod
+    def float_array(values):
+        """Converts a ``pandas.Series`` to a float array. Numeric series
+        are simply converted, otherwise ``common.to_float`` is applied on
+        the non empty elements.
+        """
+        
+        if values.dtype.kind in 'biuf':
             
-            mzs.append([
-                common.to_float(line[sample['m/z']])
-                for sample in self.samples
-            ])
-            intensities.append([
-                common.to_float(line[sample['Normalized Area']])
-                for sample in self.samples
-            ])
-            rt_means.append([
-                common.to_float(line[sample['RT mean']])
-                for sample in self.samples
-            ])
-        
-        # feature data
-        self.quality           = np.array(quality)
-        self.significance      = np.array(significance)
-        self.z                 = np.array(z)
-        self.total_intensities = np.array(total_intensities)
-        self.centr_mzs         = np.array(centr_mzs)
-        self.rt_ranges         = np.array(rt_ranges)
-        self.total_rt_means    = np.array(total_rt_means)
-        
-        # sample data
-        self.mzs               = np.array(mzs)
-        self.rt_means          = np.array(rt_means)
-        self.intensities       = np.array(intensities)
+            return values.values.astype(np.float64)
+        
+        values = values.fillna('')
+        result = pd.to_numeric(values, errors = 'coerce').values
+        result = result.astype(np.float64)
+        values = values.values
+        
+        for i in np.flatnonzero(np.isnan(result) & (values != '')):
+            
+            result[i] = common.to_float(values[i])
+        
+        return result
+    
+    @classmethod
+    def int_array(cls, values):
+        """Converts a ``pandas.Series`` to an integer array.
+        Raises ``ValueError`` if any of the elements is not a number.
+        """
+        
+        result = cls.float_array(values)
+        missing = np.isnan(result)
+        
+        if missing.any():
+            
+            raise ValueError(
+                'Integer expected: %s' % values.values[missing][0]
+            )
+        
+        return np.round(result).astype(np.int64)
+    
+    def rt_range_array(self, values):
+        """Parses a ``pandas.Series`` of RT range strings.
+        Returns an array with lower and upper limits in its two columns.
+        """
+        
+        limits = values.fillna('').astype(str).str.extract(
+            self.rertr.pattern,
+            expand = True,
+        )
+        
+        for i in np.flatnonzero(limits[0].isna().values):
+            
+            warnings.warn(
+                'Could not parse RT range: %s\n'
+                'File `%s`, line %u' % (
+                    values.values[i],
+                    self.fname,
+                    values.index[i],
+                )
+            )
+        
+        return np.column_stack((
+            limits[0].values.astype(np.float64),
+            limits[1].values.astype(np.float64),
+        )).reshape((values.shape[0], 2))
     
     def process_header(self):
         """ """
@@ -18,11 +18,14 @@
 #
 
 from future.utils import iteritems
+from past.builtins import xrange, range
 
 import imp
 
 import numpy as np
 
+import lipyd.lookup as lookup
+
 
 class Recalibration(object):
     
@@ -32,6 +35,10 @@ class Recalibration(object):
             first = None,
             last = None,
             by_sample = None,
+            standards = None,
+            standards_tolerance = 10,
+            mz_dependent = False,
+            interpolate_mz = False,
             **kwargs,
         ):
         """
@@ -51,11 +58,30 @@ class Recalibration(object):
             detailed at argument ``first``: float or array with one or
             two columns. ``**kwargs`` handled the same way as ``by_sample``
             but the latter has priority.
+        :arg list,numpy.ndarray standards:
+            Exact m/z values of internal standards. If provided, the
+            errors for each sample are fitted from the closest features
+            to the standards (found by ``lookup.find``) and the other
+            arguments are ignored.
+        :arg float standards_tolerance:
+            Tolerance in ppm at the search of the standards.
+        :arg bool mz_dependent:
+            Use the errors of the individual standards as an m/z
+            dependent curve. By default the median error of the standards
+            is used for each sample.
+        :arg bool interpolate_mz:
+            For m/z dependent errors (arrays of 2 columns) interpolate
+            linearly between the m/z values. By default the error belonging
+            to the closest lower m/z value is used.
         """
         
         self.first = first
         self.last = last
         self.by_sample = by_sample or kwargs
+        self.standards = standards
+        self.standards_tolerance = standards_tolerance
+        self.mz_dependent = mz_dependent
+        self.interpolate_mz = interpolate_mz
     
     
     def reload(self):
@@ -83,21 +109,29 @@ class Recalibration(object):
         self.numof_features = len(self.samples)
         self.samples.sort_all('mzs')
         self.sample_id_proc = samples.attrs.proc
+        
+        if self.standards is not None:
+            
+            self.fit_standards()
+        
         self.process_ppms()
         self._by_feature_ppms()
         
         # keeping the original mzs
-        self.samples._add_var(self.samples.mzs, 'mzs_original')
-        self.samples._add_var(
-            self.samples.mzs_by_sample,
-            'mzs_by_sample_original'
-        )
+        self.samples._add_var(self.samples.mzs.copy(), 'mzs_original')
         
-        # doing the recalibration
-        self.samples.mzs_by_sample = self._recalibrate(
-            mzs = self.samples.mzs_by_sample,
-            ppms = self.ppms,
-        )
+        if hasattr(self.samples, 'mzs_by_sample'):
+            
+            self.samples._add_var(
+                self.samples.mzs_by_sample.copy(),
+                'mzs_by_sample_original'
+            )
+            
+            # doing the recalibration
+            self.samples.mzs_by_sample = self._recalibrate(
+                mzs = self.samples.mzs_by_sample,
+                ppms = self.ppms,
+            )
         
         self.samples.mzs = self._recalibrate(
             mzs = self.samples.mzs,
@@ -106,73 +140,83 @@ class Recalibration(object):
     
     
     def _recalibrate(self, mzs, ppms):
+        """
+        Corrects the m/z values, in place if the array is of float type.
+        ``ppms`` is a single value, an array with one value for each sample
+        or a features by samples array.
+        """
+        
+        factor = 1. - np.asarray(ppms, dtype = np.float64) / 1e6
+        
+        if not np.issubdtype(mzs.dtype, np.floating):
+            
+            return mzs * factor
+        
+        mzs *= factor
+        
+        return mzs
+    
+    
+    def _mzs_of_sample(self, i):
+        
+        return (
+            self.samples.mzs_by_sample[:,i]
+            # this only to keep compatibility with Sample
+                if hasattr(self.samples, 'mzs_by_sample') else
+            self.samples.mzs
+        )
+    
+    
+    def _ppm_values(self, ppm, mzs):
+        """
+        Returns a float if ``ppm`` is a single number, otherwise an array
+        with one value for each feature.
+        """
+        
+        if isinstance(ppm, (float, int, np.float64)):
+            
+            return float(ppm)
         
-        return mzs - mzs / 1e6 * ppms
+        return self.align_array(np.asarray(ppm, dtype = np.float64), mzs)
     
     
     def process_ppms(self):
         """
         Arranges ppms in a way as described argument definitions for
         ``__init__``, taking into consideration the current samples object.
+        
+        The result is either a single number, an array with one value for
+        each sample or an array with features in rows and samples in
+        columns. All of these broadcast with the array of m/z values by
+        samples.
         """
         
+        self.ppms = 0.
+        
         if self.first is not None:
             
-            if isinstance(self.first, (float, int, np.float64)):
+            first = self._ppm_values(self.first, self._mzs_of_sample(0))
+            
+            if self.last is None:
                 
-                if self.last is None:
-                    
-                    # we got one single ppm value for all samples
-                    self.ppms = self.first
-                    
-                else:
-                    
-                    # we got 2 values for first and last sample, respectively
-                    # extrapolate these over all samples
-                    self.ppms = np.linspace(
-                        self.first,
-                        self.last,
-                        self.numof_samples,
-                    )
+                # we got ppms only for the first sample
+                # we use this for all samples
+                self.ppms = first
                 
-            elif isinstance(self.first, np.ndarray):
+            else:
                 
-                # we got array of ppms for the first sample, this means
-                # the ppms are not even across the m/z range
-                # here we make sure we have an array of ppms with the
-                # same length as number of features
-                mzs_first = (
-                    self.samples.mzs_by_sample[:,0]
-                        if hasattr(self.samples, 'mzs_by_sample') else
-                    self.samples.mzs
+                # we got ppms for first and last sample, respectively
+                # interpolate these over all samples
+                last = self._ppm_values(
+                    self.last,
+                    self._mzs_of_sample(self.numof_samples - 1),
                 )
-                first = self.align_array(self.first, mzs_first)
-                
-                if not isinstance(self.last, np.ndarray):
-                    
-                    # ppm values provided only for the first sample
-                    # we use this for all samples
-                    self.ppms = first
-                    
-                else:
-                    
-                    # ppms for the last sample also provided
-                    # we extrapolate for other samples in between
-                    mzs_last = (
-                        self.samples.mzs_by_sample[:,-1]
-                            if hasattr(self.samples, 'mzs_by_sample') else
-                        self.samples.mzs
-                    )
-                    last = self.align_array(self.last, mzs_last)
-                    
-                    ppms = []
-                    
-                    for f, l in zip(first, last):
-                        
-                        ppms.append(np.linspace(f, l, self.numof_samples))
-                    
-                    self.ppms = np.vstack(ppms)
-            
+                weights = np.linspace(0., 1., self.numof_samples)
+                self.ppms = (
+                    np.asarray(first)[...,None] +
+                    np.multiply.outer(np.subtract(last, first), weights)
+                )
+        
         if (isinstance(self.by_sample, (list, np.ndarray)) and
             len(self.by_sample) == self.numof_samples
         ):
@@ -188,52 +232,94 @@ class Recalibration(object):
         
         if self.by_sample:
             
-            self.ppms = []
+            # we got ppms for each sample, the samples not in the dict
+            # remain uncorrected
+            by_index = {}
             
-            # we got ppms for each sample, iterate through the dict
             for sample_id, sample_ppm in iteritems(self.by_sample):
                 
-                if isinstance(sample_ppm, (float, int, np.float64)):
-                    
-                    self.ppms.append(sample_ppm)
-                    
-                else:
-                    
-                    sample_id = self.sample_id_proc(sample_id)
-                    
-                    sampl_mzs = mzs_last = (
-                        self.samples.mzs_by_sample[
-                            :,
-                            self.samples.attrs.sample_id_to_index[sample_id]
-                        ]
-                        # this only to keep compatibility with Sample
-                            if hasattr(self.samples, 'mzs_by_sample') else
-                        self.samples.mzs
-                    )
-                    sample_ppm = self.align_array(sample_ppm, sample_mzs)
-                    self.ppms.append(sample_ppm)
+                i = self.samples.attrs.sample_id_to_index[
+                    self.sample_id_proc(sample_id)
+                ]
+                by_index[i] = self._ppm_values(
+                    sample_ppm,
+                    self._mzs_of_sample(i),
+                )
             
-            if all(isinstance(ppms, np.ndarray) for ppms in self.ppms):
-                
-                # if above we produced ppms for each feature
-                # we create an array with dimensions features x samples
-                self.ppms = np.hstack(self.ppms)
-                
-            if isinstance(self.ppms, list):
+            if all(np.ndim(ppms) == 0 for ppms in by_index.values()):
                 
                 # if we have one number for each sample, simply
                 # create a one dimensional array
-                self.ppms = np.array(self.ppms)
+                self.ppms = np.zeros(self.numof_samples)
+            
+            else:
+                
+                # if we got ppms for each feature we create an array
+                # with dimensions features x samples
+                self.ppms = np.zeros((self.numof_features, self.numof_samples))
+            
+            for i, ppms in iteritems(by_index):
+                
+                self.ppms[...,i] = ppms
+    
+    
+    def fit_standards(self):
+        """
+        Looks up the internal standards in each sample and sets the
+        ``by_sample`` attribute to the errors found. Samples without any
+        of the standards found remain uncorrected.
+        """
+        
+        standards = np.sort(np.asarray(self.standards, dtype = np.float64))
+        self.standards_found = np.full(
+            (len(standards), self.numof_samples),
+            np.nan,
+        )
+        
+        for i in xrange(self.numof_samples):
+            
+            mzs = self._mzs_of_sample(i)
+            mzs = np.sort(mzs[~np.isnan(mzs)])
+            
+            for j, mz in enumerate(standards):
+                
+                k = lookup.find(mzs, mz, t = self.standards_tolerance)
+                
+                if k is not None:
+                    
+                    self.standards_found[j,i] = mzs[k]
+        
+        # errors in ppm, positive if the measured value is higher
+        errors = (self.standards_found - standards[:,None]) / (
+            standards[:,None] / 1e6
+        )
+        
+        self.by_sample = {}
+        self.first = self.last = None
+        
+        for i, sample_id in enumerate(self.samples.attrs.sample_index_to_id):
+            
+            found = ~np.isnan(errors[:,i])
+            
+            if not found.any():
+                
+                continue
+            
+            self.by_sample[sample_id] = (
+                np.column_stack((standards[found], errors[found,i]))
+                    if self.mz_dependent else
+                float(np.median(errors[found,i]))
+            )
     
     
     def _by_feature_ppms(self):
         
-        if isinstance(self.ppms, (float, int, np.float64)):
+        if np.ndim(self.ppms) == 0:
             
             # if it's a single number
             self.ppms_by_feature = self.ppms
             
-        elif isinstance(self.ppms, np.ndarray) and self.ppms.ndim == 1:
+        elif self.ppms.ndim == 1:
             
             # if it's an array with one number for each sample
             self.ppms_by_feature = np.median(self.ppms)
@@ -245,40 +331,37 @@ class Recalibration(object):
     
     
     def align_array(self, array, mzs):
+        """
+        Returns an array of ppms with one value for each feature.
+        
+        :arg numpy.ndarray array:
+            Either an array with one value for each feature or an array
+            of 2 columns: m/z values and ppms.
+        :arg numpy.ndarray mzs:
+            The m/z values of the features.
+        """
         
-        if len(array) == self.numof_features:
+        if array.ndim == 1 and len(array) == self.numof_features:
             
             return array
+        
+        if array.ndim < 2 or array.shape[1] != 2:
             
-        else:
-            
-            if ndim(array) < 2:
-                
-                raise(
-                    ValueError,
-                    'ppm arrays must be the same length as '
-                    'number of features in the samples or must have '
-                    '2 columns: first with m/z values second with ppms.'
-                )
-            
-            # sorting by m/z
-            array = array[array[:,0].argsort(),:]
-            
-            ppms = []
-            
-            ppm = array[0,1]
-            i = 1
-            
-            for mz in mzs:
-                
-                if mz >= array[i,0]:
-                    
-                    ppm = array[i,1]
-                    
-                    if i < array.shape[0]:
-                        
-                        i += 1
-                
-                ppms.append(ppm)
+            raise ValueError(
+                'ppm arrays must be the same length as '
+                'number of features in the samples or must have '
+                '2 columns: first with m/z values second with ppms.'
+            )
+        
+        # sorting by m/z
+        array = array[array[:,0].argsort(),:]
+        
+        if self.interpolate_mz:
             
-            return np.array(ppms)
+            return np.interp(mzs, array[:,0], array[:,1])
+        
+        # the ppm of the highest m/z lower or equal to each feature m/z,
+        # below the lowest m/z the first value applies
+        i = np.searchsorted(array[:,0], mzs, side = 'right') - 1
+        
+        return array[np.maximum(i, 0),1]
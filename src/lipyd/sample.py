@@ -24,9 +24,13 @@ from past.builtins import xrange, range
 import os
 import re
 import imp
+import shutil
+import weakref
+import tempfile
 import warnings
 import itertools
 import operator
+import collections
 import numpy as np
 
 
@@ -37,6 +41,7 @@ import lipyd.reader.peaks
 import lipyd.moldb as moldb
 import lipyd.ms2 as ms2
 import lipyd.mgf as mgf
+import lipyd.mzml as mzml
 import lipyd.settings as settings
 import lipyd.progress as progress
 import lipyd.sampleattrs as sampleattrs
@@ -44,10 +49,13 @@ import lipyd.feature as feature
 import lipyd.recalibration as recalibration
 import lipyd.lookup as lookup
 import lipyd.common as common
+import lipyd.align as align
 
 
 remgf  = re.compile(r'(\w+)_(pos|neg)_([A-Z])([0-9]{1,2})\.mgf')
 remgf2 = re.compile(r'(\w+)_([A-Z])([0-9]{1,2})_(pos|neg)\.mgf')
+remzml  = re.compile(r'(\w+)_(pos|neg)_([A-Z])([0-9]{1,2})\.mzML', re.I)
+remzml2 = re.compile(r'(\w+)_([A-Z])([0-9]{1,2})_(pos|neg)\.mzML', re.I)
 
 
 class SampleReader(object):
@@ -80,7 +88,10 @@ class SampleReader(object):
             convenient to provide it here.
         **kwargs:
             Arguments for the reader. Depends on the input format, please
-            refer to classes in ``lipyd.reader`` modules.
+            refer to classes in ``lipyd.reader`` modules. E.g. for
+            ``peaks`` ``basic_filters`` and ``chunk_size`` make it possible
+            to read large files in chunks and discard the features not
+            passing the filters of ``Sample.basic_filters`` right away.
         """
         
         if input_type not in self.reader_classes:
@@ -214,6 +225,10 @@ class SampleReader(object):
 
 class FeatureBase(object):
     
+    # store numeric variables in memory-mapped files
+    memmap = False
+    memmap_dir = None
+    
     def __init__(self, sorter = None, **kwargs):
         """
         Serves as a base class for various classes handling arrays of
@@ -260,6 +275,236 @@ class FeatureBase(object):
         new = getattr(mod, self.__class__.__name__)
         setattr(self, '__class__', new)
     
+    def __getattr__(self, attr):
+        
+        # variables waiting for lazy reordering
+        # are reordered at the first access
+        if self.__dict__.get('_lazy'):
+            
+            for group in self._lazy:
+                
+                if attr in group[1]:
+                    
+                    return self._reorder_lazy_var(attr)
+        
+        raise AttributeError(
+            '`%s` object has no attribute `%s`.' % (
+                self.__class__.__name__,
+                attr,
+            )
+        )
+    
+    @property
+    def lazy(self):
+        """
+        Tells if sorting and filtering are lazy, i.e. the data arrays
+        are reordered only when accessed. This is decided by the
+        ``FeatureIdx`` object, see its ``lazy`` attribute.
+        """
+        
+        return (
+            self.sorter is not None and
+            self.sorter is not self and
+            self.sorter.lazy
+        )
+    
+    def _reorder(self, idx):
+        """
+        Reorders all data arrays by an index array or boolean selection.
+        In lazy mode only composes the index arrays.
+        """
+        
+        if not self.lazy:
+            
+            for var in self.var:
+                
+                setattr(self, var, self._take(var, getattr(self, var), idx))
+            
+            return
+        
+        if idx.dtype == np.bool_:
+            
+            idx = np.flatnonzero(idx)
+        
+        lazy = self.__dict__.setdefault('_lazy', [])
+        
+        for group in lazy:
+            
+            group[0] = group[0][idx]
+        
+        # arrays in their actual order form a new group
+        # with the index array as it is
+        actual = {}
+        
+        for var in self.var:
+            
+            if var in self.__dict__:
+                
+                actual[var] = self.__dict__.pop(var)
+                
+                for group in lazy:
+                    
+                    group[1].pop(var, None)
+        
+        lazy[:] = [group for group in lazy if group[1]]
+        
+        if actual:
+            
+            lazy.append([idx, actual])
+    
+    def _reorder_lazy_var(self, var):
+        """
+        Applies the pending index array on a variable.
+        """
+        
+        for group in self._lazy:
+            
+            if var in group[1]:
+                
+                data = self._take(var, group[1].pop(var), group[0])
+                self._lazy = [group for group in self._lazy if group[1]]
+                setattr(self, var, data)
+                
+                return data
+    
+    def _var_length(self, var):
+        """
+        Returns the length of a variable without reordering it.
+        """
+        
+        for group in self.__dict__.get('_lazy', ()):
+            
+            if var in group[1]:
+                
+                return group[0].shape[0]
+        
+        return getattr(self, var).shape[0]
+    
+    def compact(self):
+        """
+        Applies the pending sorting and filtering on all data arrays.
+        Does nothing if the object is not in lazy mode.
+        """
+        
+        for var in list(self.var):
+            
+            if var not in self.__dict__:
+                
+                getattr(self, var)
+    
+    def _take(self, var, data, idx, axis = 0):
+        """
+        Selects elements of a variable along an axis by an index array
+        or boolean selection. Memory-mapped variables are written into
+        new files chunk by chunk.
+        """
+        
+        if isinstance(data, np.memmap):
+            
+            result = common.memmap_take(
+                data,
+                idx,
+                path = self._memmap_path(var),
+                axis = axis,
+                chunk_size = settings.get('memmap_chunk_size'),
+            )
+            self._remove_memmap(data)
+            
+            return result
+        
+        return data[idx] if axis == 0 else np.take(data, idx, axis = axis)
+    
+    def _to_memmap(self, data, attr):
+        """
+        Moves a numeric array into a memory-mapped file if the object
+        is in memory mapping mode, otherwise returns the data unchanged.
+        """
+        
+        if (
+            self.memmap and
+            isinstance(data, np.ndarray) and
+            not isinstance(data, np.memmap) and
+            data.dtype.kind in 'biuf' and
+            data.size
+        ):
+            
+            data = common.to_memmap(
+                data,
+                path = self._memmap_path(attr),
+                chunk_size = settings.get('memmap_chunk_size'),
+            )
+        
+        return data
+    
+    def _memmap_path(self, attr):
+        """
+        Returns a new file name for a memory-mapped variable.
+        """
+        
+        if self.memmap_dir is None:
+            
+            self.memmap_dir = tempfile.mkdtemp(prefix = 'lipyd_memmap_')
+            # directories created here are removed together with the
+            # object, the ones given by the user are kept
+            self._memmap_cleanup = weakref.finalize(
+                self,
+                shutil.rmtree,
+                self.memmap_dir,
+                ignore_errors = True,
+            )
+        
+        if not os.path.exists(self.memmap_dir):
+            
+            os.makedirs(self.memmap_dir)
+        
+        path = os.path.abspath(os.path.join(
+            self.memmap_dir,
+            '%s_%s.npy' % (attr, common.random_string(16)),
+        ))
+        self.__dict__.setdefault('_memmap_files', set()).add(path)
+        
+        return path
+    
+    def _remove_memmap(self, data):
+        """
+        Deletes the file of a memory-mapped array if it has been
+        created by this object.
+        """
+        
+        path = getattr(data, 'filename', None)
+        
+        if path in self.__dict__.get('_memmap_files', ()):
+            
+            self._memmap_files.remove(path)
+            
+            if os.path.exists(path):
+                
+                os.remove(path)
+    
+    def remove_memmaps(self):
+        """
+        Deletes all the memory-mapped files created by this object.
+        If the directory of these files has been created by this object
+        too, it is removed as well.
+        The variables become unusable, call this only if you don't
+        need the object any more.
+        """
+        
+        for path in self.__dict__.get('_memmap_files', ()):
+            
+            if os.path.exists(path):
+                
+                os.remove(path)
+        
+        self._memmap_files = set()
+        
+        cleanup = self.__dict__.pop('_memmap_cleanup', None)
+        
+        if cleanup is not None:
+            
+            cleanup()
+            self.memmap_dir = None
+    
     def _add_var(self, data, attr):
         """Registers a variable (array of data). If an array added this way
         it will be always sorted the same way as all the other arrays in
@@ -279,6 +524,8 @@ class FeatureBase(object):
 
         """
         
+        data = self._to_memmap(data, attr)
+        
         setattr(self, attr, data)
         
         if data is None:
@@ -408,9 +655,7 @@ class FeatureBase(object):
         
         if isort is not None:
             
-            for var in self.var:
-                
-                setattr(self, var, getattr(self, var)[isort])
+            self._reorder(isort)
             
             if propagate and self.sorter is not None:
                 
@@ -419,7 +664,7 @@ class FeatureBase(object):
     def __len__(self):
         
         return (
-            getattr(self, next(self.var.__iter__())).shape[0]
+            self._var_length(next(self.var.__iter__()))
             if self.var else
             0
         )
@@ -509,9 +754,7 @@ class FeatureBase(object):
 
         """
         
-        for var in self.var:
-            
-            setattr(self, var, getattr(self, var)[selection])
+        self._reorder(selection)
         
         if propagate:
             
@@ -673,9 +916,11 @@ class FeatureAttributes(FeatureBase):
     
     def __len__(self):
         
-        obj = self if self.var else self.sorter
-        
-        return len(getattr(obj, next(iter(obj.var))))
+        return (
+            self._var_length(next(iter(self.var)))
+                if self.var else
+            len(self.sorter)
+        )
     
     def charges(self):
         """Returns a set of ion charges observed in the sample(set)."""
@@ -708,6 +953,8 @@ class Sample(FeatureBase):
             sample_id_proc_method = None,
             sample_id_proc_names = None,
             attr_args = None,
+            memmap = None,
+            memmap_dir = None,
             **kwargs,
         ):
         """
@@ -722,7 +969,8 @@ class Sample(FeatureBase):
             to use the fraction ID from the attributes. If fails it uses
             a random string as a unique identifier for the sample.
         :param str ms2_format:
-            Format of the MS2 data. At the moment ``mgf`` is accepted.
+            Format of the MS2 data, either ``mgf`` or ``mzml``. For mzML
+            the parameters below are the same with ``mzml`` prefix.
         :param dict ms2_param:
             - ``mgf_files``:
             A list of MGF file paths.
@@ -740,10 +988,24 @@ class Sample(FeatureBase):
             Use only the MS2 scans which are within the RT range of the
             feature. You can set it to False if you want to check retention
             times later.
+        :param bool memmap:
+            Store the numeric variables in memory-mapped files instead
+            of the memory. Sorting and filtering write new files chunk by
+            chunk. By default the ``memmap_variables`` setting is used.
+        :param str memmap_dir:
+            Directory for the memory-mapped files. By default the
+            ``memmap_dir`` setting is used, if that's ``None`` a new
+            temporary directory is created.
         """
         
         self.var     = set()
         self.missing = set()
+        self.memmap = (
+            settings.get('memmap_variables')
+                if memmap is None else
+            memmap
+        )
+        self.memmap_dir = memmap_dir or settings.get('memmap_dir')
         
         if mzs is None:
             
@@ -776,7 +1038,6 @@ class Sample(FeatureBase):
             'proc': sample_id_proc,
             'proc_method': sample_id_proc_method,
             'proc_names': sample_id_proc_names,
-            'length': length,
         }
         
         self._set_attrs(**attr_args)
@@ -920,7 +1181,7 @@ class Sample(FeatureBase):
         Returns number of MS1 ions (m/z's) detected in the sample.
         """
         
-        return len(self.mzs)
+        return self._var_length('mzs')
     
     def index_by_mz(self, mz, tolerance = 10):
         
@@ -1169,6 +1430,10 @@ class Sample(FeatureBase):
         first = None,
         last = None,
         by_sample = None,
+        standards = None,
+        standards_tolerance = 10,
+        mz_dependent = False,
+        interpolate_mz = False,
         **kwargs,
     ):
         """
@@ -1191,12 +1456,26 @@ class Sample(FeatureBase):
             detailed at argument ``first``: float or array with one or
             two columns. ``**kwargs`` handled the same way as ``by_sample``
             but the latter has priority.
+        :arg list,numpy.ndarray standards:
+            Exact m/z values of internal standards. If provided the errors
+            are fitted from the features closest to the standards in each
+            sample, within ``standards_tolerance`` ppm.
+        :arg bool mz_dependent:
+            Fit an m/z dependent error curve from the standards instead
+            of using their median error.
+        :arg bool interpolate_mz:
+            Interpolate linearly between the m/z values of the m/z
+            dependent errors.
         """
         
         recalibrator = recalibration.Recalibration(
             first = first,
             last = last,
             by_sample = by_sample,
+            standards = standards,
+            standards_tolerance = standards_tolerance,
+            mz_dependent = mz_dependent,
+            interpolate_mz = interpolate_mz,
             **kwargs,
         )
         
@@ -1480,78 +1759,101 @@ class Sample(FeatureBase):
 
         """
         
+        return self._collect_ms2_files(
+            ms2_format = 'mgf',
+            reader_class = mgf.MgfReader,
+            default_match_method = self._default_mgf_match_method,
+            sample_id = sample_id,
+            attrs = attrs,
+        )
+    
+    def _collect_ms2_files(
+            self,
+            ms2_format,
+            reader_class,
+            default_match_method,
+            sample_id = None,
+            attrs = None,
+        ):
+        """Collects MS2 files of one format and creates readers for them.
+        The parameters are taken from ``ms2_param`` by keys prefixed with
+        the name of the format, e.g. ``mgf_files`` or ``mzmldir``.
+        """
+        
         # if list of filenames provided we simply use those
-        if 'mgf_files' in self.ms2_param:
+        if '%s_files' % ms2_format in self.ms2_param:
             
-            mgf_files = self.ms2_param['mgf_files']
+            ms2_files = self.ms2_param['%s_files' % ms2_format]
             
             # if directory provided create paths
-            if 'mgfdir' in self.ms2_param:
+            if '%sdir' % ms2_format in self.ms2_param:
                 
-                mgf_files = [
-                    os.path.join(self.ms2_param['mgfdir'], fname)
-                    for fname in mgf_files
+                ms2_files = [
+                    os.path.join(self.ms2_param['%sdir' % ms2_format], fname)
+                    for fname in ms2_files
                 ]
             
         # otherwise we need to collect the files
         else:
             
-            # check if directory with MGF files provided
-            mgfdir = (
-                self.ms2_param['mgfdir']
-                    if 'mgfdir' in self.ms2_param else
+            # check if directory with MS2 files provided
+            ms2dir = (
+                self.ms2_param['%sdir' % ms2_format]
+                    if '%sdir' % ms2_format in self.ms2_param else
                 # fall back to this default
-                'mgf'
+                ms2_format
             )
             
             # if dir does not exist we can do nothing
-            if not os.path.isdir(mgfdir):
+            if not os.path.isdir(ms2dir):
                 
                 raise FileNotFoundError(
-                    'Please provide a directory with MGF files.'
+                    'Please provide a directory with %s files.' % (
+                        ms2_format.upper()
+                    )
                 )
             
-            # ok, now we can find the MGF files by matching against
+            # ok, now we can find the MS2 files by matching against
             # the sample attributes
             attrs = attrs or self.attrs
             sample_id = attrs.sample_id
             
             # see if a matching method provided
-            mgf_match_method = (
-                self.ms2_param['mgf_match_method']
-                    if 'mgf_match_method' in self.ms2_param else
+            match_method = (
+                self.ms2_param['%s_match_method' % ms2_format]
+                    if '%s_match_method' % ms2_format in self.ms2_param else
                 # otherwise we use our default
-                self._default_mgf_match_method
+                default_match_method
             )
             
-            mgf_files = []
+            ms2_files = []
             
-            for fname in os.listdir(mgfdir):
+            for fname in os.listdir(ms2dir):
                 
-                mgf_path     = os.path.join(mgfdir, fname)
-                mgf_matches  = mgf_match_method(mgf_path, attrs)
+                ms2_path = os.path.join(ms2dir, fname)
+                matches  = match_method(ms2_path, attrs)
                 
-                if mgf_matches:
+                if matches:
                     
-                    mgf_files.append(mgf_path)
+                    ms2_files.append(ms2_path)
         
-        # check if mgf_charge provided in params
-        mgf_charge = (
-            self.ms2_param['mgf_charge']
-                if 'mgf_charge' in self.ms2_param else
+        # check if charge provided in params
+        charge = (
+            self.ms2_param['%s_charge' % ms2_format]
+                if '%s_charge' % ms2_format in self.ms2_param else
             None
         )
         
         # dict with one key and list of files probably only one element:
         # do like this to be able to directly pass to ms2.MS2Feature
-        if sample_id in mgf_files:
+        if sample_id in ms2_files:
             
-            mgf_files = mgf_files[sample_id]
+            ms2_files = ms2_files[sample_id]
         
         return  {
             sample_id: [
-                mgf.MgfReader(fname, charge = mgf_charge)
-                for fname in mgf_files
+                reader_class(fname, charge = charge)
+                for fname in ms2_files
             ]
         }
     
@@ -1571,8 +1873,21 @@ class Sample(FeatureBase):
 
         """
         
-        match  = remgf.search(path)
-        match2 = remgf2.search(path)
+        return Sample._match_ms2_file(path, attrs, remgf, remgf2)
+    
+    @staticmethod
+    def _default_mzml_match_method(path, attrs):
+        """The default method for matching names of mzML files against
+        attributes, the same way as for MGF files.
+        """
+        
+        return Sample._match_ms2_file(path, attrs, remzml, remzml2)
+    
+    @staticmethod
+    def _match_ms2_file(path, attrs, refile, refile2):
+        
+        match  = refile.search(path)
+        match2 = refile2.search(path)
         
         if match:
             
@@ -1589,11 +1904,17 @@ class Sample(FeatureBase):
             ionmode == attrs['label']['ionmode']
         )
     
-    def collect_mzml(self, attrs = None):
-        """
+    def collect_mzml(self, sample_id = None, attrs = None):
+        """Collects mzML files containing the MS2 spectra.
+        
+        The parameters in ``ms2_param`` are the same as for MGF files:
+        ``mzml_files``, ``mzml_match_method``, ``mzmldir`` and
+        ``mzml_charge``.
 
         Parameters
         ----------
+        sample_id :
+             (Default value = None)
         attrs :
              (Default value = None)
 
@@ -1602,15 +1923,35 @@ class Sample(FeatureBase):
 
         """
         
-        raise NotImplementedError
+        return self._collect_ms2_files(
+            ms2_format = 'mzml',
+            reader_class = mzml.MzmlReader,
+            default_match_method = self._default_mzml_match_method,
+            sample_id = sample_id,
+            attrs = attrs,
+        )
     
-    def ms2_analysis(self, resources = None):
+    def ms2_analysis(
+            self,
+            resources = None,
+            deduplicate = None,
+            profile = False,
+        ):
         """Runs MS2 identification methods on all features.
 
         Parameters
         ----------
         resources :
              (Default value = None)
+        deduplicate : bool
+            Identify only once the identical MS2 scans of a feature, see
+            ``ms2.ScanCache``. If ``None`` the value from the settings
+            is used.
+        profile : bool
+            Measure the number of calls and time spent in the
+            identification methods. The results are available from
+            ``ms2.profiler`` after the analysis, e.g. call
+            ``ms2.profiler.dump(fname)`` to write them into a file.
 
         Returns
         -------
@@ -1635,33 +1976,48 @@ class Sample(FeatureBase):
         
         ms2_identities = []
         
-        if not self.silent:
+        if profile:
             
-            prg = progress.Progress(len(self), 'Analysing MS2 spectra', 1)
+            ms2.profiler.enable()
         
-        for i in xrange(len(self)):
+        # the profiler must be disabled even if the analysis fails,
+        # otherwise the classes remain wrapped
+        try:
             
             if not self.silent:
                 
-                prg.step()
+                prg = progress.Progress(len(self), 'Analysing MS2 spectra', 1)
             
-            # MS2 identifications:
-            ms2_fe = ms2.MS2Feature(
-                mz = self.mzs[i],
-                ionmode = self.ionmode,
-                resources = resources,
-                rt = self.feattrs.rt_means[i],
-                ms1_records = self.feattrs.records[i],
-                check_rt = self.ms2_check_rt,
-            )
+            for i in xrange(len(self)):
+                
+                if not self.silent:
+                    
+                    prg.step()
+                
+                # MS2 identifications:
+                ms2_fe = ms2.MS2Feature(
+                    mz = self.mzs[i],
+                    ionmode = self.ionmode,
+                    resources = resources,
+                    rt = self.feattrs.rt_means[i],
+                    ms1_records = self.feattrs.records[i],
+                    check_rt = self.ms2_check_rt,
+                    deduplicate = deduplicate,
+                )
+                
+                ms2_fe.main()
+                
+                ms2_identities.append(ms2_fe)
             
-            ms2_fe.main()
+            if not self.silent:
+                
+                prg.terminate()
             
-            ms2_identities.append(ms2_fe)
-        
-        if not self.silent:
+        finally:
             
-            prg.terminate()
+            if profile:
+                
+                ms2.profiler.disable()
         
         ms2_identities = np.array(ms2_identities)
         
@@ -1711,12 +2067,27 @@ class Sample(FeatureBase):
                 
                 yield rec
     
+    # columns of the exported tables: header in text tables,
+    # column name in binary tables
+    table_columns = (
+        ('m/z', 'mz'),
+        ('average area', 'area'),
+        ('RT range', 'rt_range'),
+        ('quality', 'quality'),
+        ('significance', 'significance'),
+        ('database lookups', 'records'),
+        ('MS2 top', 'ms2_top'),
+        ('MS2 all', 'ms2_all'),
+    )
+    
     def table(
             self,
             variables = None,
             headers = None,
         ):
         """Returns results as a header and a table as list of lists.
+        The rows are generated one by one, the full table is never
+        kept in memory.
 
         Parameters
         ----------
@@ -1732,16 +2103,7 @@ class Sample(FeatureBase):
         
         self.feattrs.sort_all('total_intensities', desc = True)
         
-        hdr = [
-            'm/z',
-            'average area',
-            'RT range',
-            'quality',
-            'significance',
-            'database lookups',
-            'MS2 top',
-            'MS2 all',
-        ]
+        hdr = [col[0] for col in self.table_columns]
         
         if variables:
             
@@ -1753,32 +2115,25 @@ class Sample(FeatureBase):
         
         for i in xrange(len(self)):
             
-            ms2_id = self.feattrs.ms2_identities[i]
-            ms2_best = ms2_id.identities_str_best()
-            ms2_all = ms2_id.identities_str_all()
+            values = self._table_values(i)
             
             line = [
-                '%08f' % self.mzs[i],
-                '%u' % self.feattrs.total_intensities[i],
+                '%08f' % values['mz'],
+                '%u' % values['area'],
                 (
-                    '%.02f - %.02f' % tuple(self.feattrs.rt_ranges[i])
-                        if hasattr(self.feattrs, 'rt_ranges') else
+                    '%.02f - %.02f' % tuple(values['rt_range'])
+                        if values['rt_range'] is not None else
                     ''
                 ),
-                '%.02f' % self.feattrs.quality[i],
+                '%.02f' % values['quality'],
                 (
-                    '%.02f' % self.feattrs.significance[i]
-                        if hasattr(self.feattrs, 'significance') else
+                    '%.02f' % values['significance']
+                        if values['significance'] is not None else
                     ''
                 ),
-                moldb.records_string(
-                    records = self.feattrs.records[i],
-                    show_ppm = True,
-                    show_adduct = True,
-                    show_db = True,
-                ),
-                ms2_best,
-                ms2_all,
+                values['records'],
+                values['ms2_top'],
+                values['ms2_all'],
             ]
             
             if variables:
@@ -1789,22 +2144,230 @@ class Sample(FeatureBase):
             
             yield line
     
-    def export_table(self, fname, **kwargs):
+    def _table_values(self, i):
         """
-
+        Returns the values in one row of the result table as a dict.
+        Values of variables not available are ``None`` or empty strings.
+        """
+        
+        feattrs = self.feattrs
+        ms2_id = (
+            feattrs.ms2_identities[i]
+                if hasattr(feattrs, 'ms2_identities') else
+            None
+        )
+        
+        return {
+            'mz': self.mzs[i],
+            'area': feattrs.total_intensities[i],
+            'rt_range': (
+                feattrs.rt_ranges[i]
+                    if hasattr(feattrs, 'rt_ranges') else
+                None
+            ),
+            'quality': feattrs.quality[i],
+            'significance': (
+                feattrs.significance[i]
+                    if hasattr(feattrs, 'significance') else
+                None
+            ),
+            'records': (
+                moldb.records_string(
+                    records = feattrs.records[i],
+                    show_ppm = True,
+                    show_adduct = True,
+                    show_db = True,
+                )
+                    if hasattr(feattrs, 'records') else
+                ''
+            ),
+            'ms2_top': (
+                ms2_id.identities_str_best()
+                    if ms2_id is not None else
+                ''
+            ),
+            'ms2_all': (
+                ms2_id.identities_str_all()
+                    if ms2_id is not None else
+                ''
+            ),
+        }
+    
+    def table_chunks(self, variables = None, chunk_size = None):
+        """
+        Yields the result table in chunks of features as dicts of
+        columns: numeric columns are float arrays, text columns are
+        unicode string arrays. The RT range is split into the columns
+        ``rt_min`` and ``rt_max``. The names of the columns are the
+        second elements in ``table_columns``, followed by the names of
+        ``variables``.
+        
         Parameters
         ----------
-        fname :
+        variables : list
+            Additional variables from the ``FeatureAttributes`` object.
+        chunk_size : int
+            Number of features in one chunk. By default the value of the
+            ``export_chunk_size`` setting.
+        """
+        
+        chunk_size = chunk_size or settings.get('export_chunk_size')
+        variables = variables or ()
+        
+        self.feattrs.sort_all('total_intensities', desc = True)
+        
+        numeric = ('mz', 'area', 'quality', 'significance')
+        text = ('records', 'ms2_top', 'ms2_all')
+        
+        for start in xrange(0, len(self), chunk_size):
             
-        **kwargs :
+            rows = [
+                self._table_values(i)
+                for i in xrange(start, min(start + chunk_size, len(self)))
+            ]
+            
+            chunk = collections.OrderedDict()
+            
+            for col in numeric[:2]:
+                
+                chunk[col] = np.array(
+                    [row[col] for row in rows],
+                    dtype = np.float64,
+                )
+            
+            rt_ranges = np.array(
+                [
+                    row['rt_range']
+                        if row['rt_range'] is not None else
+                    (np.nan, np.nan)
+                    for row in rows
+                ],
+                dtype = np.float64,
+            ).reshape((len(rows), 2))
+            chunk['rt_min'] = rt_ranges[:,0]
+            chunk['rt_max'] = rt_ranges[:,1]
+            
+            for col in numeric[2:]:
+                
+                chunk[col] = np.array(
+                    [
+                        np.nan if row[col] is None else row[col]
+                        for row in rows
+                    ],
+                    dtype = np.float64,
+                )
             
+            for col in text:
+                
+                chunk[col] = np.array(
+                    [row[col] for row in rows],
+                    dtype = np.str_,
+                )
+            
+            for var in variables:
+                
+                values = np.asarray(
+                    getattr(self.feattrs, var)[start:start + len(rows)]
+                )
+                
+                chunk[var] = (
+                    values
+                        if values.dtype.kind in 'biuf' else
+                    values.astype(np.str_)
+                )
+            
+            yield chunk
+    
+    def export_table(
+            self,
+            fname,
+            fmt = None,
+            chunk_size = None,
+            variables = None,
+            headers = None,
+        ):
+        """
+        Writes the result table into a file. The rows are processed in
+        chunks and written immediately.
+        
+        Parameters
+        ----------
+        fname : str
+            Path to the output file.
+        fmt : str
+            Format of the output: ``tsv``, ``parquet``, ``feather`` or
+            ``npz``. By default guessed from the extension of the file
+            name, ``tsv`` if it is not recognized. Parquet and Feather
+            output require ``pyarrow``, if it is not available the table
+            is written in ``npz`` format into a file with ``.npz``
+            extension.
+        chunk_size : int
+            Number of features in one chunk. By default the value of the
+            ``export_chunk_size`` setting.
+        variables : list
+            Additional variables from the ``FeatureAttributes`` object.
+        headers : list
+            Headers for the variables in ``tsv`` format.
 
         Returns
         -------
-
+        The path of the file written.
         """
         
-        table = self.table(**kwargs)
+        fmt = fmt or self._export_format(fname)
+        chunk_size = chunk_size or settings.get('export_chunk_size')
+        
+        if fmt in ('parquet', 'feather'):
+            
+            try:
+                
+                import pyarrow
+            
+            except ImportError:
+                
+                warnings.warn(
+                    'Module `pyarrow` not available, '
+                    'writing the table in `npz` format.'
+                )
+                fmt = 'npz'
+                fname = '%s.npz' % os.path.splitext(fname)[0]
+        
+        if fmt == 'tsv':
+            
+            self._export_tsv(fname, chunk_size, variables, headers)
+        
+        elif fmt == 'npz':
+            
+            self._export_npz(fname, chunk_size, variables)
+        
+        elif fmt in ('parquet', 'feather'):
+            
+            self._export_arrow(fname, fmt, chunk_size, variables)
+        
+        else:
+            
+            raise ValueError('Unknown table format: `%s`.' % fmt)
+        
+        return fname
+    
+    @staticmethod
+    def _export_format(fname):
+        
+        ext = os.path.splitext(fname)[1].lower()
+        
+        return (
+            'parquet'
+                if ext in ('.parquet', '.pq') else
+            'feather'
+                if ext in ('.feather', '.arrow') else
+            'npz'
+                if ext == '.npz' else
+            'tsv'
+        )
+    
+    def _export_tsv(self, fname, chunk_size, variables, headers):
+        
+        table = self.table(variables = variables, headers = headers)
         
         hdr = next(table)
         
@@ -1812,20 +2375,89 @@ class Sample(FeatureBase):
             
             _ = fp.write('\t'.join(hdr))
             
-            for row in table:
+            while True:
+                
+                rows = list(itertools.islice(table, chunk_size))
+                
+                if not rows:
+                    
+                    break
                 
                 _ = fp.write('\n')
-                _ = fp.write('\t'.join(row))
+                _ = fp.write('\n'.join('\t'.join(row) for row in rows))
+    
+    def _export_npz(self, fname, chunk_size, variables):
+        
+        # here we need all chunks before writing
+        chunks = list(
+            self.table_chunks(variables = variables, chunk_size = chunk_size)
+        )
+        
+        columns = (
+            dict(
+                (col, np.concatenate([chunk[col] for chunk in chunks]))
+                for col in chunks[0]
+            )
+                if chunks else
+            {}
+        )
+        
+        np.savez(fname, **columns)
+    
+    def _export_arrow(self, fname, fmt, chunk_size, variables):
+        
+        import pyarrow
+        import pyarrow.parquet
+        import pyarrow.ipc
+        
+        writer = None
+        
+        try:
+            
+            for chunk in self.table_chunks(
+                variables = variables,
+                chunk_size = chunk_size,
+            ):
+                
+                batch = pyarrow.Table.from_pydict(chunk)
+                
+                if writer is None:
+                    
+                    writer = (
+                        pyarrow.parquet.ParquetWriter(fname, batch.schema)
+                            if fmt == 'parquet' else
+                        # Feather version 2 is the Arrow IPC file format
+                        pyarrow.ipc.new_file(fname, batch.schema)
+                    )
+                
+                writer.write_table(batch)
+        
+        finally:
+            
+            if writer is not None:
+                
+                writer.close()
 
 
 class FeatureIdx(FeatureBase):
     
-    def __init__(self, length):
+    # here this is a simple attribute, overriding the property
+    # of ``FeatureBase``
+    lazy = False
+    
+    def __init__(self, length, lazy = None):
         """Helps the sorting of features across multiple samples
             with keeping track of feature IDs.
 
         Parameters
         ----------
+        length : int
+            Number of features.
+        lazy : bool
+            Lazy sorting and filtering: the clients only compose
+            the index arrays and reorder their data arrays at the
+            first access or when ``compact`` is called. By default
+            the ``lazy_sorting`` setting is used.
 
         Returns
         -------
@@ -1840,6 +2472,39 @@ class FeatureIdx(FeatureBase):
         self._current  = np.arange(length)
         
         self.clients = {}
+        self.lazy = settings.get('lazy_sorting') if lazy is None else lazy
+    
+    def __getattr__(self, attr):
+        
+        # in lazy mode the inverse permutation
+        # is calculated only when needed
+        if attr == '_original' and '_current' in self.__dict__:
+            
+            self._original = self._current.argsort()
+            
+            return self._original
+        
+        return FeatureBase.__getattr__(self, attr)
+    
+    def compact(self):
+        """
+        Applies the pending sorting and filtering on the data arrays
+        of all clients.
+        """
+        
+        for client in self.clients.values():
+            
+            client.compact()
+    
+    def _reorder(self, idx):
+        
+        # the index arrays themselves are always reordered;
+        # the inverse permutation must be ready before
+        self._original
+        
+        for var in self.var:
+            
+            setattr(self, var, getattr(self, var)[idx])
     
     def _sort(self, argsort):
         """
@@ -1859,7 +2524,14 @@ class FeatureIdx(FeatureBase):
             )
         
         self._current  = self._current[argsort]
-        self._original = self._current.argsort()
+        
+        if self.lazy:
+            
+            self.__dict__.pop('_original', None)
+        
+        else:
+            
+            self._original = self._current.argsort()
     
     def current(self, o):
         """Tells the current index for the original index ``o``.
@@ -1900,7 +2572,7 @@ class FeatureIdx(FeatureBase):
     
     def __len__(self):
         
-        return len(self._original)
+        return len(self._current)
     
     def acurrent(self, ao):
         """For a vector of original indices ``ao`` returns a vector of
@@ -2093,6 +2765,8 @@ class SampleSet(Sample, sampleattrs.SampleSorter):
             sample_id_proc_method = None,
             sample_id_proc_names = None,
             sample_data = None,
+            memmap = None,
+            memmap_dir = None,
         ):
         """
         This class represents an ordered set of samples.
@@ -2118,6 +2792,11 @@ class SampleSet(Sample, sampleattrs.SampleSorter):
         :param list sample_data:
             Other ``SampleSet`` or ``feature.SampleData`` objects which
             should be co-sorted with this object.
+        :param bool memmap:
+            Store the numeric variables in memory-mapped files.
+            See ``Sample``.
+        :param str memmap_dir:
+            Directory for the memory-mapped files.
         """
         
         mzs = common.ensure_array(mzs)
@@ -2132,7 +2811,8 @@ class SampleSet(Sample, sampleattrs.SampleSorter):
                 ) else
             mzs
                 if len(mzs.shape) == 1 else
-            mzs.mean(axis = tuple(range(1, len(mzs.shape))))
+            # features missing from some samples are `nan`
+            np.nanmean(mzs, axis = tuple(range(1, len(mzs.shape))))
         )
         
         length = self._guess_numof_samples(
@@ -2166,6 +2846,8 @@ class SampleSet(Sample, sampleattrs.SampleSorter):
             sample_id_proc_method = sample_id_proc_method,
             sample_id_proc_names = sample_id_proc_names,
             attr_args = attr_args,
+            memmap = memmap,
+            memmap_dir = memmap_dir,
         )
         
         sampleattrs.SampleSorter.__init__(
@@ -2177,59 +2859,135 @@ class SampleSet(Sample, sampleattrs.SampleSorter):
         self.normalize_intensities()
     
     @classmethod
-    def combine_samples(cls, attrs, samples, **kwargs):
+    def combine_samples(
+            cls,
+            attrs,
+            samples,
+            force_align = False,
+            tolerance = None,
+            rt_tolerance = None,
+            **kwargs
+        ):
         """Initializes the object by combining a series of ``Sample`` objects.
         
-        All samples must be of the same length and have the same ordering.
-        It means the corresponding elements must belong to the same feature.
-        The ``FeatureAttributes`` and the ``sorter`` (``FeatureIdx``) will
-        be used from the first sample.
+        If the samples have the same length they are assumed to have the
+        same ordering, i.e. the corresponding elements belong to the same
+        feature, and the ``FeatureAttributes`` and the ``sorter``
+        (``FeatureIdx``) will be used from the first sample.
+        Otherwise (or if ``force_align`` is ``True``) the features are
+        aligned by ``lipyd.align.align``, and the values of the features
+        missing from a sample are ``nan``.
 
         Parameters
         ----------
-        attrs :
-            
-        samples :
-            
+        attrs : list
+            Sample attributes. If ``None`` the attributes of the samples
+            will be used.
+        samples : list
+            ``Sample`` objects.
+        force_align : bool
+            Align the features even if the samples have the same length.
+        tolerance : float
+            Tolerance at alignment in ppm. By default the
+            ``align_tolerance`` setting is used.
+        rt_tolerance : float
+            Tolerance of retention times at alignment. By default the
+            ``align_rt_tolerance`` setting is used.
         **kwargs :
-            
+            Passed to ``SampleSet``.
 
         Returns
         -------
 
         """
         
-        if len(set(len(s) for s in samples)) > 1:
+        rt_tolerance = (
+            settings.get('align_rt_tolerance')
+                if rt_tolerance is None else
+            rt_tolerance
+        )
+        
+        idx = None
+        
+        if force_align or len(set(len(s) for s in samples)) > 1:
             
-            # TODO: call aligner for different length samples
-            # TODO: check if at least sorters show the same ordering
-            raise RuntimeError(
-                'SampleSet: it\'s possible combine only equal length samples '
-                'into a set. Also samples assumed to have the same ordering.'
+            use_rts = (
+                rt_tolerance is not None and
+                all(s.rts is not None for s in samples)
+            )
+            
+            _centr_mzs, idx = align.align(
+                *(s.mzs for s in samples),
+                tolerance = tolerance or settings.get('align_tolerance'),
+                rts = [s.rts for s in samples] if use_rts else None,
+                rt_tolerance = rt_tolerance if use_rts else None,
             )
-        
-        mzs = np.hstack([s.mzs for s in samples])
         
         var = {}
         
-        for var_name in sample[0].var:
+        for var_name in ('mzs', 'intensities', 'rts'):
             
-            var[var_name] = np.hstack([getattr(s, var_name) for s in samples])
+            if all(getattr(s, var_name) is not None for s in samples):
+                
+                var[var_name] = cls._combine_var(
+                    [getattr(s, var_name) for s in samples],
+                    idx,
+                )
         
-        sample_attrs = [s.attrs for s in samples]
+        attrs = attrs or [s.attrs.attrs for s in samples]
         
-        # TODO: combine FeatureAttributes
-        feature_attrs = samples[0].feattrs
-        sorter = samples[0].sorter
+        if idx is None:
+            
+            # TODO: combine FeatureAttributes
+            kwargs['feature_attrs'] = samples[0].feattrs
+            kwargs['sorter'] = samples[0].sorter
         
-        return cls.__init__(
-            mzs = mzs,
-            attrs = sample_attrs,
-            feature_attrs = feature_attrs,
-            sorter = sorter,
-            **var,
-            **kwargs,
+        if 'ionmode' not in kwargs:
+            
+            kwargs['ionmode'] = samples[0].ionmode
+        
+        if 'sample_ids' not in kwargs:
+            
+            kwargs['sample_ids'] = [s.attrs.sample_id for s in samples]
+        
+        var.update(kwargs)
+        
+        return cls(attrs = attrs, **var)
+    
+    @staticmethod
+    def _combine_var(arrays, idx = None):
+        """Creates a features x samples array from the arrays of the
+        samples. ``idx`` is a features x samples array of indices as
+        returned by ``lipyd.align.align``, if ``None`` the arrays are
+        assumed to have the same ordering.
+        
+        Parameters
+        ----------
+        arrays : list
+        
+        idx : numpy.ndarray
+             (Default value = None)
+        
+        Returns
+        -------
+        
+        """
+        
+        if idx is None:
+            
+            return np.stack(arrays, axis = 1)
+        
+        result = np.full(
+            (idx.shape[0], len(arrays)) + arrays[0].shape[1:],
+            np.nan,
         )
+        
+        for i, array in enumerate(arrays):
+            
+            present = idx[:,i] >= 0
+            result[present, i] = array[idx[present, i]]
+        
+        return result
     
     @property
     def numof_samples(self):
@@ -2274,6 +3032,32 @@ class SampleSet(Sample, sampleattrs.SampleSorter):
     
     _set_attrs = sampleattrs.SampleSorter._set_attrs
     
+    def __getattr__(self, attr):
+        
+        # variables waiting for reordering along the sample axis
+        if attr in self.__dict__.get('_sample_lazy', ()):
+            
+            return self._sample_lazy_var(attr)
+        
+        return Sample.__getattr__(self, attr)
+    
+    def _reorder(self, idx):
+        
+        # reordering of the samples must be applied before
+        # the features are reordered
+        self.compact_samples()
+        
+        Sample._reorder(self, idx)
+    
+    def _var_length(self, var):
+        
+        if var in self.__dict__.get('_sample_lazy', ()):
+            
+            # the first axis is not affected by the sample ordering
+            return self._sample_lazy[var][0].shape[0]
+        
+        return Sample._var_length(self, var)
+    
     def get_sample_attrs(self, i):
         """
         Returns the sample attributes (dict of metadata) of the ``i``th
@@ -2529,7 +3313,28 @@ class SampleSet(Sample, sampleattrs.SampleSorter):
         ``intens_norm``.
         """
         
-        if isinstance(self.intensities, np.ndarray):
+        if isinstance(self.intensities, np.memmap):
+            
+            # processing chunk by chunk to avoid
+            # a full size array in the memory
+            intens_norm = common.open_memmap(
+                self._memmap_path('intens_norm'),
+                self.intensities.shape,
+                np.float64,
+            )
+            chunk_size = settings.get('memmap_chunk_size')
+            
+            for i in xrange(0, intens_norm.shape[0], chunk_size):
+                
+                intensities = self.intensities[i:i + chunk_size]
+                intens_norm[i:i + chunk_size] = (
+                    intensities /
+                    np.nanmax(intensities, axis = 1, keepdims = True)
+                )
+            
+            self._add_var(intens_norm, 'intens_norm')
+        
+        elif isinstance(self.intensities, np.ndarray):
             
             self._add_var(
                 self.intensities /
@@ -418,6 +418,74 @@ class SampleSetAttrs(object):
         )
 
 
+class SampleIdx(object):
+    
+    def __init__(self, numof_samples):
+        """
+        A permutation of samples shared by all objects which keep the
+        same order of samples (e.g. ``sample.SampleSet``, ``SampleData``,
+        ``SECProfile``). The data arrays of the objects are not reordered
+        at sorting, only at their first access, hence sorting does not
+        depend on the size of the data.
+        
+        numof_samples : int
+            Number of samples.
+        """
+        
+        # for each current position the original index of the sample
+        self.order = np.arange(numof_samples)
+        self.clients = {}
+    
+    def __len__(self):
+        
+        return len(self.order)
+    
+    def register(self, client):
+        """
+        Adds a ``SampleSorter`` derived object to the group.
+        """
+        
+        self.clients[id(client)] = client
+        client._sample_idx = self
+    
+    def merge(self, other):
+        """
+        Moves all objects registered in an other ``SampleIdx`` to this one.
+        The other group must be already in the same order as this one.
+        """
+        
+        for client in list(other.clients.values()):
+            
+            # the pending orders refer to the other permutation
+            client.compact_samples()
+            self.register(client)
+        
+        other.clients = {}
+    
+    def sort(self, idx):
+        """
+        Sorts all objects in the group by an index array.
+        """
+        
+        idx = np.array(idx)
+        
+        for client in self.clients.values():
+            
+            client.attrs.sort_by_index(idx)
+            client._sort(idx)
+        
+        self.order = self.order[idx]
+    
+    def compact(self):
+        """
+        Applies the pending reordering on the data arrays of all objects.
+        """
+        
+        for client in self.clients.values():
+            
+            client.compact_samples()
+
+
 class SampleSorter(object):
     """ """
     
@@ -452,7 +520,6 @@ class SampleSorter(object):
             objects this is axis 0.
         """
         
-        self._sample_data = {}
         self._sample_axis = sample_axis
         
         if sample_data is None:
@@ -491,6 +558,8 @@ class SampleSorter(object):
             
             self._set_attrs(**attr_args)
         
+        SampleIdx(len(self.attrs)).register(self)
+        
         for s in sample_data:
             
             self.register(s)
@@ -559,9 +628,37 @@ class SampleSorter(object):
             
             return first.attrs.proc
     
+    def __getattr__(self, attr):
+        
+        # variables waiting for reordering along the sample axis
+        # are reordered at the first access
+        if attr in self.__dict__.get('_sample_lazy', ()):
+            
+            return self._sample_lazy_var(attr)
+        
+        raise AttributeError(
+            '`%s` object has no attribute `%s`.' % (
+                self.__class__.__name__,
+                attr,
+            )
+        )
+    
+    @property
+    def _sample_data(self):
+        """
+        The other objects keeping the same order of samples as this one,
+        by their ``id``.
+        """
+        
+        return dict(
+            (i, client)
+            for i, client in iteritems(self._sample_idx.clients)
+            if i != id(self)
+        )
+    
     def sort_by(self, s):
-        """Sorts the current object according to another ``SampleSorter``
-        derived object.
+        """Sorts the current object and all objects connected to it according
+        to another ``SampleSorter`` derived object.
 
         Parameters
         ----------
@@ -577,9 +674,7 @@ class SampleSorter(object):
 
         """
         
-        idx = self.attrs.sort_by(s.attrs, return_idx = True)
-        
-        self._sort(idx)
+        self.sort(self.attrs.argsort_by_sample_id(s.attrs.sample_index_to_id))
     
     def sort_to(self, s):
         """Makes sure object ``s`` has the same ordering as all in this sorter.
@@ -598,12 +693,13 @@ class SampleSorter(object):
 
         """
         
-        idx = s.attrs.sort_by(self.attrs, return_idx = True)
-        
-        s._sort(idx)
+        s.sort_by(self)
     
     def _sort(self, idx):
-        """Sorts only variables in this object by indices.
+        """Sorts only variables in this object by indices. The arrays are
+        not reordered here but at their first access or when
+        ``compact_samples`` is called. Should be called before the order
+        of the ``SampleIdx`` object is updated.
 
         Parameters
         ----------
@@ -615,30 +711,78 @@ class SampleSorter(object):
 
         """
         
-        if hasattr(self, 'var'):
+        if not hasattr(self, 'var'):
             
-            numof_samples = len(self.attrs)
+            return
+        
+        numof_samples = len(self.attrs)
+        lazy = self.__dict__.setdefault('_sample_lazy', {})
+        
+        for var in self.var:
             
-            for var in self.var:
+            if var in lazy and var not in self.__dict__:
                 
-                arr = getattr(self, var)
+                # the order of the data is kept together with the
+                # array, hence we have nothing to do
+                continue
+            
+            arr = getattr(self, var)
+            
+            if (
+                len(arr.shape) <= self._sample_axis or
+                arr.shape[self._sample_axis] != numof_samples
+            ):
                 
-                if (
-                    len(arr.shape) <= self._sample_axis or
-                    arr.shape[self._sample_axis] != numof_samples
-                ):
-                    
-                    continue
+                continue
+            
+            lazy[var] = (self.__dict__.pop(var), self._sample_idx.order)
+    
+    def _sample_lazy_var(self, var):
+        """
+        Reorders a variable to the current order of samples.
+        """
+        
+        arr, order = self._sample_lazy.pop(var)
+        
+        # position of each sample of the current order in the array
+        idx = np.argsort(order)[self._sample_idx.order]
+        
+        if np.any(idx != np.arange(len(idx))):
+            
+            arr = (
+                # the method of ``sample.FeatureBase`` handles also
+                # memory-mapped arrays
+                self._take(var, arr, idx, axis = self._sample_axis)
+                    if hasattr(self, '_take') else
+                np.take(arr, idx, axis = self._sample_axis)
+            )
+        
+        setattr(self, var, arr)
+        
+        return arr
+    
+    def compact_samples(self):
+        """
+        Applies the pending reordering on all variables of this object.
+        """
+        
+        for var in list(self.__dict__.get('_sample_lazy', ())):
+            
+            if var in self.__dict__:
                 
-                setattr(
-                    self,
-                    var,
-                    np.take(arr, idx, axis = self._sample_axis),
-                )
+                # the variable has been set since, the pending
+                # array is outdated
+                del self._sample_lazy[var]
+            
+            else:
+                
+                self._sample_lazy_var(var)
     
     def register(self, s):
         """Registers a ``sample.SampleSet`` or ``feature.SampleData`` derived
         object ensuring it will keep the same order of samples.
+        The objects connected to this one are sorted according to ``s``
+        and from now all of them share one ``SampleIdx`` object.
 
         Parameters
         ----------
@@ -654,13 +798,13 @@ class SampleSorter(object):
 
         """
         
-        self.sort_by(s)
+        if s._sample_idx is self._sample_idx:
+            
+            return
         
-        self._sample_data[id(s)] = s
+        self.sort_by(s)
         
-        if id(self) not in s._sample_data:
-            
-            s.register(self)
+        s._sample_idx.merge(self._sample_idx)
     
     def sort_by_sample_ids(self, sample_ids):
         """Sorts all connected objects by a list of sample IDs.
@@ -687,35 +831,23 @@ class SampleSorter(object):
         
         self.sort(idx)
     
-    def sort(self, idx, _done = None):
-        """Sorts all connected objects by indices.
+    def sort(self, idx):
+        """Sorts all connected objects by indices. The data arrays are
+        reordered only at their first access.
 
         Parameters
         ----------
         list :
             idx:
             A list of indices.
-        set :
-            _done:
-            As the sorting propagates across objects this ``set`` keeps track
-            which objects have been already sorted. Should be ``None`` when
-            called by user.
         idx :
             
-        _done :
-             (Default value = None)
 
         Returns
         -------
 
         """
         
-        _done = set() if _done is None else _done
-        
-        if id(self) in _done:
-            
-            return
-        
         numof_samples = self.numof_samples
         
         if len(idx) != numof_samples:
@@ -726,16 +858,7 @@ class SampleSorter(object):
                 )
             )
         
-        self.attrs.sort_by_index(idx)
-        self._sort(idx)
-        
-        _done.add(id(self))
-        
-        for sd_id, sd in iteritems(self._sample_data):
-            
-            if sd_id not in _done:
-                
-                sd.sort(idx = idx, _done = _done)
+        self._sample_idx.sort(idx)
     
     def index_previous(self, i):
         """An index or sample ID provided it returns the index of the sample
@@ -852,7 +975,7 @@ class SampleSorter(object):
         return SampleSelection(
             selection = selection,
             sample_ids = self.attrs.sample_index_to_id,
-            sample_data = list(self._sample_data.values()) + [self],
+            sample_data = [self],
             sample_id_proc = self.attrs.proc,
         )
     
@@ -887,12 +1010,12 @@ class SampleSorter(object):
 
         """
         
-        selected = set(self.attrs.sample_index_to_id)
-        consensus = np.array([True] * self.numof_samples)
+        selected = np.ones(self.numof_samples, dtype = np.bool_)
+        consensus = np.ones(self.numof_samples, dtype = np.bool_)
         
         if manual:
             
-            selected = {self.attrs.proc(sample_id) for sample_id in manual}
+            selected = self._sample_mask(manual)
         
         if kwargs:
             
@@ -902,43 +1025,79 @@ class SampleSorter(object):
                 
                 if isinstance(method, (list, np.ndarray)):
                     
-                    bool_arrays.append(method)
+                    bool_arrays.append(np.array(method, dtype = np.bool_))
                     continue
                 
-                values = getattr(self, var)
-                bool_array = []
-                
-                for i in xrange(values.shape[self._sample_axis]):
-                    
-                    val = np.take(arr, i, axis = self._sample_axis)
-                    bool_array.append(method(val))
-                
-                bool_arrays.append(bool_array)
+                bool_arrays.append(
+                    self._apply_by_sample(getattr(self, var), method)
+                )
             
             bool_arrays = np.vstack(bool_arrays)
             
             consensus = (
-                np.any(bool_arrays, 0)
-                    if logic.upper() == 'AND' else
                 np.all(bool_arrays, 0)
+                    if logic.upper() == 'AND' else
+                np.any(bool_arrays, 0)
             )
         
         if include:
             
-            incl = {self.attrs.proc(sample_id) for sample_id in include}
-            selected = selected | incl
+            selected = selected | self._sample_mask(include)
         
         if exclude:
             
-            excl = {self.attrs.proc(sample_id) for sample_id in exclude}
-            selected = selected - excl
+            selected = selected & np.logical_not(self._sample_mask(exclude))
         
-        selected = [
-            self.attrs.sample_index_to_id[i] in selected
-            for i in xrange(self.numof_samples)
+        return selected & consensus
+    
+    def _sample_mask(self, sample_ids):
+        """
+        Returns a boolean array which is ``True`` for the samples in the
+        list of sample IDs.
+        """
+        
+        mask = np.zeros(self.numof_samples, dtype = np.bool_)
+        idx = [
+            self.attrs.sample_id_to_index[sample_id]
+            for sample_id in (self.attrs.proc(s) for s in sample_ids)
+            if sample_id in self.attrs.sample_id_to_index
         ]
+        mask[idx] = True
+        
+        return mask
+    
+    def _apply_by_sample(self, values, method):
+        """
+        Applies ``method`` on the data of each sample in ``values`` and
+        returns a boolean array. If the data is one dimensional the method
+        first called on the whole array, if it returns a boolean array of
+        the right length we are done without calling it on each sample.
+        """
         
-        return np.all(np.vstack((selected, consensus)), 0)
+        values = np.asarray(values)
+        numof_samples = values.shape[self._sample_axis]
+        
+        if values.ndim == 1:
+            
+            try:
+                
+                result = np.asarray(method(values))
+                
+                if result.shape == (numof_samples,):
+                    
+                    return result.astype(np.bool_)
+            
+            except (TypeError, ValueError):
+                
+                pass
+        
+        return np.array(
+            [
+                method(val)
+                for val in np.moveaxis(values, self._sample_axis, 0)
+            ],
+            dtype = np.bool_,
+        )
 
 
 class SampleData(SampleSorter):
@@ -1073,6 +1232,7 @@ class SampleData(SampleSorter):
                 
                 selection = [proc(s) for s in selection]
             
+            selection = set(selection)
             selection = np.array([s in selection for s in sample_ids])
         
         return selection
@@ -1137,8 +1297,8 @@ class SampleSelection(SampleData):
         return SampleSelection(
             selection = np.logical_not(self.selection),
             sample_ids = self.attrs.sample_index_to_id,
-            sample_data = list(self._sample_data.values()) + [self],
-            proc = self.attrs.proc,
+            sample_data = [self],
+            sample_id_proc = self.attrs.proc,
         )
     
     def logical_and(self, other):
@@ -1159,8 +1319,8 @@ class SampleSelection(SampleData):
         return SampleSelection(
             selection = np.logical_and(self.selection, other.selection),
             sample_ids = self.attrs.sample_index_to_id,
-            sample_data = list(self._sample_data.values()) + [self, other],
-            proc = self.attrs.proc,
+            sample_data = [self, other],
+            sample_id_proc = self.attrs.proc,
         )
     
     def logical_or(self, other):
@@ -1181,8 +1341,8 @@ class SampleSelection(SampleData):
         return SampleSelection(
             selection = np.logical_or(self.selection, other.selection),
             sample_ids = self.attrs.sample_index_to_id,
-            sample_data = list(self._sample_data.values()) + [self, other],
-            proc = self.attrs.proc,
+            sample_data = [self, other],
+            sample_id_proc = self.attrs.proc,
         )
     
     def __or__(self, other):
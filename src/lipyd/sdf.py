@@ -21,23 +21,41 @@ import imp
 import sys
 import re
 
-try:
-    import openbabel.pybel as pybel
-    if 'ipykernel' not in sys.modules and pybel.tk is None:
+
+def get_pybel():
+    """
+    Imports ``pybel`` at the first call, as it takes long and is necessary
+    only for processing structures. Returns ``None`` if ``pybel`` is not
+    available.
+    """
+    
+    mod = sys.modules[__name__]
+    
+    if not hasattr(mod, '_pybel'):
+        
         try:
-            import tkinter
-            import PIL
-            import PIL.ImageTk
-            pybel.tk = tkinter
-            pybel.PIL = PIL.Image
-            pybel.piltk = PIL.ImageTk
+            import openbabel.pybel as pybel
+            if 'ipykernel' not in sys.modules and pybel.tk is None:
+                try:
+                    import tkinter
+                    import PIL
+                    import PIL.ImageTk
+                    pybel.tk = tkinter
+                    pybel.PIL = PIL.Image
+                    pybel.piltk = PIL.ImageTk
+                except:
+                    sys.stdout.write(
+                        ':: `PIL` or `tkinter` not available.\n'
+                        '   `pybel` won\'t be able to draw molecules.\n'
+                    )
         except:
-            sys.stdout.write(
-                ':: `PIL` or `tkinter` not available.\n'
-                '   `pybel` won\'t be able to draw molecules.\n'
-            )
-except:
-    sys.stdout.write(':: Module `pybel` not available.\n')
+            pybel = None
+            sys.stdout.write(':: Module `pybel` not available.\n')
+        
+        setattr(mod, '_pybel', pybel)
+    
+    return getattr(mod, '_pybel')
+
 
 resyn = re.compile(
     r'(^[A-Z]{2,})\(([0-9]+:[0-9]+)\(.*\)/([0-9]+:[0-9]+)\(.*\)\)'
@@ -506,7 +524,10 @@ class SdfReader(object):
         
         if 'INCHI' in record['name']:
             
-            return pybel.readstring('inchi', record['name']['INCHI'])
+            return get_pybel().readstring(
+                'inchi',
+                record['name']['INCHI'],
+            )
             
         else:
             
@@ -527,7 +548,7 @@ class SdfReader(object):
 
         """
         
-        return pybel.readstring('mol', self.get_mol(record))
+        return get_pybel().readstring('mol', self.get_mol(record))
     
     @staticmethod
     def get_mol(record):
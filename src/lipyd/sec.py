@@ -25,6 +25,7 @@ import collections
 import mimetypes
 
 import numpy as np
+import pandas as pd
 # for peak detection fits
 import scipy as sp
 import scipy.optimize
@@ -98,49 +99,36 @@ class SECReader(object):
 
         """
         
-        start      = None
-        end        = None
-        frac       = None
-        volume     = []
-        absorbance = []
-        fractions  = []
+        table = pd.read_csv(
+            self.path,
+            sep = '\t',
+            header = None,
+            names = range(4),
+            usecols = range(4),
+            dtype = str,
+            skipinitialspace = True,
+        )
         
-        with open(self.path, 'r') as fp:
-            
-            for l in fp:
-                
-                l = l.strip().split('\t')
-                
-                if len(l) < 2 or '.' not in l[0] or '.' not in l[1]:
-                    
-                    continue
-                
-                vol = common.to_float(l[0])
-                ab_ = common.to_float(l[1])
-                
-                if isinstance(vol, float) and isinstance(ab_, float):
-                    
-                    volume.append(vol)
-                    absorbance.append(ab_)
-                
-                if len(l) > 3:
-                    
-                    start = end
-                    end   = common.to_float(l[2])
-                    
-                    if start and end and frac:
-                        
-                        fractions.append(
-                            Fraction(frac[0], int(frac[1]), start, end)
-                        )
-                    
-                    m = refrac.search(l[3])
-                    
-                    frac = m.groups() if m else None
-        
-        self.volume = np.array(volume)
-        self.absorbance = np.array(absorbance)
-        self.fractions = fractions
+        valid = self._set_volume_absorbance(table)
+        
+        # fraction labels at the volumes of the fraction boundaries,
+        # each fraction lasts until the next boundary
+        frac_table = table[valid & table[3].notna()]
+        ends = pd.to_numeric(frac_table[2], errors = 'coerce').values
+        labels = frac_table[3].str.extract(refrac.pattern)
+        
+        self.fractions = [
+            Fraction(row, int(col), start, end)
+            for row, col, start, end in zip(
+                labels[0].values[:-1],
+                labels[1].values[:-1],
+                ends[:-1],
+                ends[1:],
+            )
+            # missing, `nan` or zero volumes are skipped
+            if start and end and start == start and end == end and
+            isinstance(row, common.basestring)
+        ]
     
     def read_xls(self):
         """Reads SEC UV absorbance profile from MS Excel XLS file output
@@ -154,27 +142,39 @@ class SECReader(object):
 
         """
         
-        volume     = []
-        absorbance = []
+        table = pd.DataFrame(
+            [l[:2] for l in xls.read_xls(self.path) if len(l) >= 2]
+        )
         
-        tab = xls.read_xls(self.path)
+        self._set_volume_absorbance(table)
+    
+    def _set_volume_absorbance(self, table):
+        """
+        Sets the volume and absorbance arrays from the first two columns
+        of a ``pandas.DataFrame`` of strings. Returns a boolean array
+        with the valid records.
+        """
         
-        for l in tab:
-            
-            if len(l) < 2 or '.' not in l[0] or '.' not in l[1]:
-                
-                continue
+        if not len(table):
             
-            vol = common.to_float(l[0])
-            ab_ = common.to_float(l[1])
+            self.volume = np.array([])
+            self.absorbance = np.array([])
             
-            if isinstance(vol, float) and isinstance(ab_, float):
-                
-                volume.append(vol)
-                absorbance.append(ab_)
+            return np.array([], dtype = np.bool_)
+        
+        valid = (
+            pd.to_numeric(table[0], errors = 'coerce').notna() &
+            pd.to_numeric(table[1], errors = 'coerce').notna() &
+            # numbers without decimal point are parts of the header
+            table[0].str.contains('.', regex = False).fillna(False) &
+            table[1].str.contains('.', regex = False).fillna(False)
+        ).values
+        
+        # numpy converts the strings exactly like ``float``
+        self.volume = table[0].values[valid].astype(np.float64)
+        self.absorbance = table[1].values[valid].astype(np.float64)
         
-        self.volume = np.array(volume)
-        self.absorbance = np.array(absorbance)
+        return valid
     
     def auto_fractions(
             self,
@@ -294,11 +294,86 @@ class SECReader(object):
         
         return self._get_fraction(frac).mean()
     
+    def fraction_means(self, fractions):
+        """
+        Returns an array with the mean absorbances of a series of fractions.
+        Fractions without any measurement get `nan`.
+        
+        Parameters
+        ----------
+        fractions : list
+            List of ``Fraction`` objects.
+        """
+        
+        if not len(fractions):
+            
+            return np.array([])
+        
+        volume = self.volume
+        absorbance = self.absorbance
+        
+        if np.any(np.diff(volume) < 0):
+            
+            isort = np.argsort(volume, kind = 'mergesort')
+            volume = volume[isort]
+            absorbance = absorbance[isort]
+        
+        starts = np.searchsorted(
+            volume,
+            [fr.start for fr in fractions],
+            side = 'left',
+        )
+        ends = np.searchsorted(
+            volume,
+            [fr.end for fr in fractions],
+            side = 'left',
+        )
+        ends = np.maximum(starts, ends)
+        counts = ends - starts
+        
+        # the last element is a padding so the end boundaries
+        # are valid indices even at the end of the chromatogram
+        sums = np.add.reduceat(
+            np.append(absorbance, 0.),
+            np.column_stack((starts, ends)).flatten(),
+        )[::2]
+        
+        with np.errstate(invalid = 'ignore', divide = 'ignore'):
+            
+            return np.where(counts > 0, sums / counts, np.nan)
+    
+    def _closest_absorbance(self, other, volume, interpolate = False):
+        """
+        Returns the absorbances of an other chromatogram at the points
+        closest to the volumes in ``volume``, or linearly interpolated
+        between its points if ``interpolate`` is ``True``.
+        """
+        
+        if interpolate:
+            
+            return np.interp(volume, other.volume, other.absorbance)
+        
+        iu = np.searchsorted(other.volume, volume)
+        il = np.maximum(iu - 1, 0)
+        iu = np.minimum(iu, len(other.volume) - 1)
+        
+        # the same as at ``lookup.find``: lower neighbour only
+        # if it is strictly closer
+        i = np.where(
+            np.abs(volume - other.volume[il]) <
+            np.abs(other.volume[iu] - volume),
+            il,
+            iu,
+        )
+        
+        return other.absorbance[i]
+    
     def background_correction_by_other_chromatograms(
             self,
             others,
             start = None,
             end = None,
+            interpolate = False,
         ):
         """
         Subtracts corresponding values of other chromatograms.
@@ -312,6 +387,9 @@ class SECReader(object):
             chromatogram.
         end : float
             Do until this volume. By default the end of the chromatogram.
+        interpolate : bool
+            Interpolate linearly between the points of the other
+            chromatograms instead of using the closest point.
         """
         
         def get_closest(vol):
@@ -319,7 +397,7 @@ class SECReader(object):
             return lookup.find(self.volume, vol, np.inf)
         
         istart = 0 if start is None else get_closest(start)
-        iend = 0 if end is None else get_closest(end)
+        iend = len(self.volume) - 1 if end is None else get_closest(end)
         
         others = (
             (others,)
@@ -327,18 +405,20 @@ class SECReader(object):
             others
         )
         
-        for i in xrange(istart, iend + 1):
-            
-            vol = self.volume[i]
-            i_other = (
-                lookup.find(other.volume, vol, np.inf)
+        volume = self.volume[istart:iend + 1]
+        
+        # other chromatograms by volume points in the reference
+        background = np.median(
+            np.vstack([
+                self._closest_absorbance(other, volume, interpolate)
                 for other in others
-            )
-            background = np.median([
-                others[j].absorbance[io]
-                for j, io in enumerate(i_other)
-            ])
-            self.absorbance[i] = self.absorbance[i] - background
+            ]),
+            axis = 0,
+        )
+        
+        self.absorbance[istart:iend + 1] = (
+            self.absorbance[istart:iend + 1] - background
+        )
     
     
     def normalize(self):
@@ -370,9 +450,11 @@ class SECReader(object):
             self.auto_fractions(**kwargs)
         )
         
-        for frac in fractions:
+        means = self.fraction_means(fractions)
+        
+        for frac, mean in zip(fractions, means):
             
-            yield Fraction(*frac[:-1], self._fraction_mean(frac))
+            yield Fraction(*frac[:-1], mean)
     
     def baseline_correction(self):
         """
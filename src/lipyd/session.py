@@ -21,6 +21,7 @@ import random
 import os
 import sys
 
+import lipyd._version as _version
 import lipyd.log as log
 
 
@@ -32,6 +33,9 @@ class Session(object):
         self.label = label or self.gen_session_id()
         self.log_verbosity = log_verbosity
         self.start_logger()
+        self.log.msg(
+            'This is lipyd module version %s' % _version.__version__
+        )
         self.log.msg('Session `%s` started.' % self.label)
     
     
@@ -66,7 +70,13 @@ class Logger(object):
     def __init__(self, name = None):
         
         self._log_name = name or self.__class__.__name__
-        self._logger = get_log()
+    
+    
+    @property
+    def _logger(self):
+        
+        # the session is started only when the first message is written
+        return get_log()
     
     
     def _log(self, msg = '', level = 0):
@@ -21,6 +21,7 @@ from future.utils import iteritems
 
 import os
 import copy
+import types
 import collections
 
 import lipyd.common as common
@@ -279,6 +280,35 @@ _defaults = {
     # tolarance at matching MS1 peaks against precursors in
     # mgf files with MS2 spectra
     'precursor_match_tolerance': 50,
+    # sorting and filtering of samples only composes index arrays and
+    # the data arrays are reordered at first access or at ``compact()``
+    'lazy_sorting': False,
+    # store the numeric variables of samples in memory-mapped files
+    'memmap_variables': False,
+    # directory for the memory-mapped files; if None a temporary
+    # directory is created for each sample (set)
+    'memmap_dir': None,
+    # number of features processed at once at sorting and filtering
+    # memory-mapped variables
+    'memmap_chunk_size': 10000,
+    # the tolerance at aligning features of samples with different
+    # feature sets, ppm
+    'align_tolerance': 5,
+    # the tolerance of retention times at alignment, minutes;
+    # if None retention times are not considered
+    'align_rt_tolerance': None,
+    # number of features processed at once at exporting the
+    # result tables
+    'export_chunk_size': 10000,
+    # number of worker processes in MS preprocessing for the steps
+    # done separately for each sample; None: one for each CPU,
+    # 1: no parallel processing
+    'preprocess_processes': 1,
+    # in the preprocessing workflow reuse the outputs of previous runs
+    # if the inputs, parameters and versions are the same
+    'preprocess_cache': True,
+    # number of formulas kept in the cache of parsed formulas
+    'formula_cache_size': 100000,
     # the tolerance at identifying features in standards ppm
     'std_tolerance': 20,
     # MS2 precursors must have their charges determined
@@ -337,6 +367,9 @@ _defaults = {
     'deltart_threshold': 0.5,
     # Don't know what it is for
     'uniprots': None,
+    # isotope masses and abundances from CIAAW, shipped with the
+    # module; see ``mass.MassDatabase.update`` for refreshing it
+    'isotopes_file': 'isotopes.tsv',
     # example files
     'mgf_neg_examples': 'neg_examples.mgf',
     'mgf_pos_examples': 'pos_examples.mgf',
@@ -362,6 +395,20 @@ _defaults = {
     # (fragment rank, intensity and type) to the MS2Identity object
     # turning this off makes MS2 spectra analysis faster
     'ms2_scan_chain_details': True,
+    # at MS2 identification, identify only once the scans with the same
+    # peak list (after intensity normalization and rounding by the
+    # resolutions below) and reuse the result for all the others
+    'ms2_deduplicate_scans': False,
+    # resolution of m/z values (Da) at comparing peak lists
+    'ms2_deduplicate_mz_resolution': 0.001,
+    # resolution of the normalized intensities at comparing peak lists
+    'ms2_deduplicate_intensity_resolution': 0.01,
+    # peaks below this normalized intensity are ignored at comparing
+    # peak lists
+    'ms2_deduplicate_min_intensity': 0.0,
+    # save the built MS2 fragment databases into the cache directory
+    # and load them from there next time the same database is required
+    'fragdb_cache': True,
     # Method names to convert between adduct and exact masses
     'ad2ex': {
         1: {
@@ -653,6 +700,7 @@ in_basedir = [
 ]
 
 in_datadir = {
+    'isotopes_file',
     'pfragmentsfile',
     'nfragmentsfile',
     'lipnamesf',
@@ -672,6 +720,34 @@ in_mgfdir = {
 }
 
 
+# incremented at each change of the settings;
+# the frozen values are cached until the next change
+_version = 0
+_frozen = {}
+
+
+def _changed():
+    """
+    Registers a change of the settings.
+    """
+    
+    global _version
+    
+    _version += 1
+    _frozen.clear()
+
+
+def version():
+    """
+    Returns the version of the settings. It increases each time the
+    settings are changed by ``setup``, ``reset`` or ``reset_all``.
+    Values obtained from the settings and derived data can be cached
+    as long as the version is the same.
+    """
+    
+    return _version
+
+
 def reset_all():
     """ """
     
@@ -698,6 +774,8 @@ def reset_all():
         )
     
     globals()['settings'] = settings
+    
+    _changed()
 
 
 def setup(**kwargs):
@@ -716,6 +794,8 @@ def setup(**kwargs):
     for param, value in iteritems(kwargs):
         
         setattr(settings, param, value)
+    
+    _changed()
 
 def get(param):
     """
@@ -741,6 +821,73 @@ def get(param):
         return value
 
 
+def get_frozen(param):
+    """
+    Returns the current value of a parameter as a read-only object
+    without copying it: dicts as read-only mappings, lists as tuples and
+    sets as frozensets, nested containers also converted. The same
+    object is returned until the settings are changed, hence this is
+    suitable for frequently called code.
+    
+    Parameters
+    ----------
+    param : str
+        Name of a parameter in the settings.
+    
+    Returns
+    -------
+    The current value of the parameter.
+    """
+    
+    if param not in _frozen:
+        
+        if isinstance(param, common.basestring) and hasattr(settings, param):
+            
+            _frozen[param] = freeze(getattr(settings, param))
+        
+        else:
+            
+            return None
+    
+    return _frozen[param]
+
+
+def snapshot(*params):
+    """
+    Returns a read-only mapping with the current values of the
+    parameters, as returned by ``get_frozen``. If no parameters provided
+    all the settings are included.
+    """
+    
+    params = params or _defaults.keys()
+    
+    return types.MappingProxyType(
+        dict((param, get_frozen(param)) for param in params)
+    )
+
+
+def freeze(value):
+    """
+    Converts dicts, lists and sets to read-only equivalents recursively.
+    """
+    
+    if isinstance(value, dict):
+        
+        return types.MappingProxyType(
+            dict((k, freeze(v)) for k, v in iteritems(value))
+        )
+    
+    elif isinstance(value, (list, tuple)) and not hasattr(value, '_fields'):
+        
+        return tuple(freeze(v) for v in value)
+    
+    elif isinstance(value, set):
+        
+        return frozenset(value)
+    
+    return value
+
+
 def get_default(param):
     """
 
@@ -778,7 +925,7 @@ def reset(param):
     Resets the value of the parameter to its default.
     """
     
-    setup(param, get_default(param))
+    setup(**{param: get_default(param)})
 
 
 defaults = common._const()
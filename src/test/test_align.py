@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+#  This file is part of the `lipyd` python module
+#
+#  Copyright (c) 2015-2019 - EMBL
+#
+#  File author(s):
+#  Dénes Türei (turei.denes@gmail.com)
+#  Igor Bulanov
+#
+#  Distributed under the GNU GPLv3 License.
+#  See accompanying file LICENSE.txt or copy at
+#      http://www.gnu.org/licenses/gpl-3.0.html
+#
+#  Website: http://www.ebi.ac.uk/~denes
+#
+
+import pytest
+
+import numpy as np
+
+import lipyd.align as align
+
+
+class TestAlign(object):
+    """ """
+    
+    def test_align(self):
+        """ """
+        
+        a = np.array([300.0005, 100., 200.])
+        b = np.array([100.0002, 300., 400.])
+        c = np.array([200.0001, 200.0003, np.nan])
+        
+        centroids, idx = align.align(a, b, c, tolerance = 5)
+        
+        assert np.all(np.diff(centroids) >= 0)
+        assert idx.shape == (5, 3)
+        # 100 Da
+        assert list(idx[0]) == [1, 0, -1]
+        # no feature has more than one element from the same sample
+        assert list(idx[1]) == [2, -1, 0]
+        assert list(idx[2]) == [-1, -1, 1]
+        assert list(idx[3]) == [0, 1, -1]
+        assert list(idx[4]) == [-1, 2, -1]
+        assert np.allclose(centroids[0], 100.0001)
+    
+    def test_align_rt(self):
+        """ """
+        
+        a = np.array([100., 200.])
+        b = np.array([100.0002, 200.0002])
+        rts_a = np.array([1., 2.])
+        rts_b = np.array([5., 2.1])
+        
+        centroids, idx = align.align(
+            a,
+            b,
+            tolerance = 5,
+            rts = [rts_a, rts_b],
+            rt_tolerance = 1.,
+        )
+        
+        assert idx.shape == (3, 2)
+        assert {tuple(i) for i in idx} == {(0, -1), (-1, 0), (1, 1)}
+    
+    def test_align_many(self):
+        """ """
+        
+        mzs = np.linspace(200., 1200., 101)
+        samples = []
+        
+        for i in range(20):
+            
+            isort = np.random.permutation(mzs.shape[0])
+            noise = np.random.normal(0, 1e-6, mzs.shape[0])
+            samples.append((isort, mzs[isort] * (1 + noise)))
+        
+        centroids, idx = align.align(*(s[1] for s in samples))
+        
+        assert idx.shape == (101, 20)
+        assert np.allclose(centroids, mzs, rtol = 3e-6)
+        
+        for i, (isort, _mzs) in enumerate(samples):
+            
+            assert np.all(isort[idx[:,i]] == np.arange(101))
@@ -18,6 +18,7 @@
 #
 
 import pytest
+import operator
 
 import numpy as np
 
@@ -110,3 +111,74 @@ class TestFeature(object):
                 True,  True, False, False, False
             ])
         )
+    
+    def test_peak_size_vectorized(self):
+        """ """
+        
+        intensities = np.random.random((200, 4))
+        intensities[:,1:3] *= 3
+        intensities[np.random.random((200, 4)) < .15] = np.nan
+        intensities[0,[0, 3]] = np.nan
+        
+        samples = sample.SampleSet(
+            mzs = np.random.random(200),
+            intensities = intensities,
+            ionmode = 'pos',
+            sample_ids = ['A10', 'A11', 'A12', 'B1'],
+            sample_id_proc = sampleattrs.plate_sample_id_processor(),
+        )
+        selection = samples.get_selection(['A11', 'A12']).selection
+        
+        fea = feature.PeakSize(
+            samples = samples,
+            sample_selection = selection,
+            names = ('ps_vec', 'ps_vec_value'),
+        )
+        fea = feature.PeakSize(
+            samples = samples,
+            sample_selection = selection,
+            names = ('ps', 'ps_value'),
+            vectorized = False,
+        )
+        
+        assert np.all(samples.feattrs.ps_vec == samples.feattrs.ps)
+        assert np.allclose(
+            samples.feattrs.ps_vec_value,
+            samples.feattrs.ps_value,
+        )
+    
+    def test_profile_vectorized(self):
+        """ """
+        
+        sample_ids = ['A%u' % i for i in range(1, 9)]
+        intens_norm = np.random.random((300, 8))
+        intens_norm[np.random.random((300, 8)) < .1] = np.nan
+        
+        samples = sample.SampleSet(
+            mzs = np.random.random(300),
+            intensities = intens_norm,
+            ionmode = 'pos',
+            sample_ids = sample_ids,
+            sample_id_proc = sampleattrs.plate_sample_id_processor(),
+        )
+        samples._add_var(intens_norm, 'intens_norm')
+        profile_filter_args = {
+            'peak': (['A4', 'A5'], .3, operator.gt),
+            'small': (['A3', 'A6'], .05, operator.gt),
+            'tiny': (['A2'], .01, operator.gt),
+            'none': (['A1', 'A7', 'A8'], .7, operator.le),
+        }
+        
+        fea = feature.ProfileAnalyzer(
+            samples = samples,
+            profile_filter_args = profile_filter_args,
+        )
+        profile_vectorized = samples.feattrs.profile
+        fea = feature.ProfileAnalyzer(
+            samples = samples,
+            profile_filter_args = profile_filter_args,
+            vectorized = False,
+        )
+        
+        assert profile_vectorized.any()
+        assert np.all(profile_vectorized == samples.feattrs.profile)
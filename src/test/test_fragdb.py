@@ -67,3 +67,28 @@ class TestFragdb(object):
         assert '[FA(14:0)+NH+C2H2-OH]+' in fragnames
         assert '[Sph(18:1)-2xH2O+H]+' in fragnames
         assert len(list(annot)) == len(annot.mzs)
+    
+    def test_cache(self, tmpdir):
+        """ """
+        
+        cachedir = settings.get('cachedir')
+        settings.setup(cachedir = str(tmpdir))
+        
+        db = fragdb.FragmentDatabaseAggregator('neg', cache = True)
+        
+        assert os.path.exists(db.get_cache_file())
+        
+        db_cached = fragdb.FragmentDatabaseAggregator('neg', cache = True)
+        
+        settings.setup(cachedir = cachedir)
+        
+        assert not hasattr(db_cached, 'series')
+        assert len(db_cached) == len(db)
+        assert np.all(db_cached.mz == db.mz)
+        assert np.all(db_cached.names == db.names)
+        assert db_cached.n_charged == db.n_charged
+        assert (
+            db_cached.by_name('[FA(18:1)-H]-')[0] ==
+            db.by_name('[FA(18:1)-H]-')[0]
+        )
+        assert db_cached.constraints == db.constraints
@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+#  This file is part of the `lipyd` python module
+#
+#  Copyright (c) 2015-2019 - EMBL
+#
+#  File author(s):
+#  Dénes Türei (turei.denes@gmail.com)
+#  Igor Bulanov
+#
+#  Distributed under the GNU GPLv3 License.
+#  See accompanying file LICENSE.txt or copy at
+#      http://www.gnu.org/licenses/gpl-3.0.html
+#
+#  Website: http://denes.omnipathdb.org/
+#
+
+import os
+import sys
+
+import lipyd
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(__file__), os.pardir, 'benchmark'),
+)
+
+import import_benchmark
+
+
+class TestImport(object):
+    
+    def test_import_ms2(self):
+        
+        env = os.environ.copy()
+        env['PYTHONPATH'] = os.pathsep.join(
+            p for p in (
+                os.path.dirname(os.path.dirname(lipyd.__file__)),
+                env.get('PYTHONPATH'),
+            )
+            if p
+        )
+        
+        # the import time is checked by the benchmark, not here
+        result = import_benchmark.measure(
+            module = 'lipyd.ms2',
+            repeat = 1,
+            env = env,
+        )
+        
+        assert not {'pyopenms', 'matplotlib', 'pandas'} & set(result['heavy'])
+        assert not result['session']
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+#  This file is part of the `lipyd` python module
+#
+#  Copyright (c) 2015-2019 - EMBL
+#
+#  File author(s):
+#  Dénes Türei (turei.denes@gmail.com)
+#  Igor Bulanov
+#
+#  Distributed under the GNU GPLv3 License.
+#  See accompanying file LICENSE.txt or copy at
+#      http://www.gnu.org/licenses/gpl-3.0.html
+#
+#  Website: http://denes.omnipathdb.org/
+#
+
+import os
+
+import lipyd.mass as mass
+import lipyd.settings as settings
+
+
+class TestMass(object):
+    
+    def test_offline_database(self):
+        
+        db = mass.MassDatabase()
+        
+        assert db.mass_first_iso['C'] == 12.0
+        assert abs(db.mass_first_iso['H'] - 1.00782503223) < 1e-9
+        assert db.mass_monoiso['proton'] == mass.proton
+        assert abs(sum(db.freq_iso['O'].values()) - 1.0) < 1e-3
+    
+    def test_export_table(self, tmpdir):
+        
+        db = mass.MassDatabase()
+        fname = os.path.join(str(tmpdir), 'isotopes.tsv')
+        db.export_table(fname)
+        
+        db2 = mass.MassDatabase(fname = fname)
+        
+        assert db2.mass_monoiso == db.mass_monoiso
+        assert db2.freq_iso == db.freq_iso
+        assert db2.isotopes == db.isotopes
+    
+    def test_formula_vector(self):
+        
+        vector = mass.formula_to_vector('CH3COOH')
+        
+        assert vector is mass.formula_to_vector('CH3COOH')
+        assert mass.vector_to_formula(vector) == 'C2H4O2'
+        assert mass.vector_to_atoms(vector) == {'C': 2, 'H': 4, 'O': 2}
+        assert abs(
+            mass.vector_mass(vector) - mass.MassBase('C2H4O2').mass
+        ) < 1e-9
+        assert (mass.atoms_to_vector({'c': 2, 'h': 4, 'o': 2}) == vector).all()
+    
+    def test_formula_cache_size(self):
+        
+        cache_size = settings.get('formula_cache_size')
+        settings.setup(formula_cache_size = 10)
+        mass.setup_elements()
+        
+        assert mass.formula_to_vector.cache_info().maxsize == 10
+        
+        settings.setup(formula_cache_size = cache_size)
+        mass.setup_elements()
+        
+        assert mass.formula_to_vector.cache_info().maxsize == cache_size
+    
+    def test_formula_arithmetic(self):
+        
+        import lipyd.formula as formula
+        
+        aceticacid = formula.Formula('CH3COOH')
+        water = formula.Formula('H2O')
+        
+        anhydride = aceticacid * 2 - water
+        
+        # the string is created only when accessed
+        assert anhydride._formula is None
+        assert anhydride.formula == 'C4H6O3'
+        assert abs(
+            anhydride.mass - (aceticacid.mass * 2 - water.mass)
+        ) < 1e-9
@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+#  This file is part of the `lipyd` python module
+#
+#  Copyright (c) 2015-2019 - EMBL
+#
+#  File author(s):
+#  Dénes Türei (turei.denes@gmail.com)
+#  Igor Bulanov
+#
+#  Distributed under the GNU GPLv3 License.
+#  See accompanying file LICENSE.txt or copy at
+#      http://www.gnu.org/licenses/gpl-3.0.html
+#
+#  Website: http://denes.omnipathdb.org/
+#
+
+
+import os
+
+import pytest
+import numpy as np
+
+import lipyd.mgf as mgf
+
+
+_mgf = (
+    'BEGIN IONS\n'
+    'TITLE=controllerType=0 controllerNumber=1 scan=7\n'
+    'RTINSECONDS=600.000000000\n'
+    'PEPMASS=760.585100000000000000 12000.000000000\n'
+    'CHARGE=1\n'
+    '184.0733 1000.0\n'
+    '760.5851 200.5\n'
+    'END IONS\n'
+    'BEGIN IONS\n'
+    'TITLE=controllerType=0 controllerNumber=1 scan=8\n'
+    'RTINSECONDS=630.000000000\n'
+    'PEPMASS=782.567000000000000000 5000.000000000\n'
+    'CHARGE=1\n'
+    'END IONS\n'
+    'BEGIN IONS\n'
+    'TITLE=controllerType=0 controllerNumber=1 scan=9\n'
+    'RTINSECONDS=660.000000000\n'
+    'PEPMASS=744.554300000000000000 8000.000000000\n'
+    'CHARGE=2\n'
+    '153.0 80.0\n'
+    'END IONS\n'
+)
+
+
+
+class _Precursor(object):
+    """
+    Mimics ``pyopenms.Precursor``.
+    """
+    
+    def __init__(self, mz, intensity, charge):
+        
+        self.mz = mz
+        self.intensity = intensity
+        self.charge = charge
+    
+    def getMZ(self):
+        
+        return self.mz
+    
+    def getIntensity(self):
+        
+        return self.intensity
+    
+    def getCharge(self):
+        
+        return self.charge
+
+
+class _Spectrum(object):
+    """
+    Mimics ``pyopenms.MSSpectrum``.
+    """
+    
+    def __init__(self, scan, rt, peaks, precursor = None, level = 2):
+        
+        self.scan = scan
+        self.rt = rt
+        self.peaks = np.array(peaks, dtype = np.float64).reshape(-1, 2)
+        self.precursors = [_Precursor(*precursor)] if precursor else []
+        self.level = level
+    
+    def getMSLevel(self):
+        
+        return self.level
+    
+    def getNativeID(self):
+        
+        return (
+            'controllerType=0 controllerNumber=1 scan=%u' % self.scan
+        ).encode('ascii')
+    
+    def getRT(self):
+        
+        return self.rt
+    
+    def getPrecursors(self):
+        
+        return self.precursors
+    
+    def get_peaks(self):
+        
+        return self.peaks[:,0], self.peaks[:,1].astype(np.float32)
+
+
+class TestMgf(object):
+    
+    def test_index_file(self, tmpdir):
+        
+        fname = str(tmpdir.join('sample.mgf'))
+        
+        with open(fname, 'w') as fp:
+            
+            fp.write(_mgf)
+        
+        parsed = dict(
+            (charge, mgf.MgfReader(fname, charge = charge))
+            for charge in (None, 1, 2)
+        )
+        
+        assert mgf.read_index(fname) is None
+        
+        # rows in the order of the file, extended by the charges
+        index = [
+            row[:5] + [charge]
+            for row, charge in zip(
+                sorted(parsed[None].mgfindex.tolist(), key = lambda r: r[4]),
+                (1, 1, 2),
+            )
+        ]
+        mgf.write_index(fname, index)
+        
+        assert os.path.exists(mgf.index_path(fname))
+        assert mgf.read_index(fname).tolist() == index
+        
+        for charge, expected in parsed.items():
+            
+            reader = mgf.MgfReader(fname, charge = charge)
+            
+            assert reader.mgfindex.tolist() == expected.mgfindex.tolist()
+            
+            for i in range(len(reader)):
+                
+                assert np.array_equal(
+                    reader.get_scan(i),
+                    expected.get_scan(i),
+                )
+        
+        # the index is not used once the MGF file has been modified
+        stat = os.stat(fname)
+        os.utime(fname, ns = (stat.st_atime_ns, stat.st_mtime_ns + 1000))
+        
+        assert mgf.read_index(fname) is None
+    
+    def test_export_index(self, tmpdir):
+        
+        msproc = pytest.importorskip('lipyd.msproc')
+        
+        spectra = [
+            _Spectrum(6, 590.0, [(300.1, 10.0)], level = 1),
+            _Spectrum(
+                7,
+                600.0,
+                [(184.0733, 1000.0), (760.5851, 200.5)],
+                (760.5851, 12000.0, 1),
+            ),
+            # no peaks: indexed at the `END IONS` line, as the reader does
+            _Spectrum(8, 630.0, [], (782.567, 5000.0, 1)),
+            _Spectrum(9, 660.0, [(153.0, 80.0)], (744.5543, 8000.0, 2)),
+        ]
+        
+        fname = str(tmpdir.join('sample.mgf'))
+        
+        export = msproc.MgfExport(input_obj = spectra, output_path = fname)
+        export.write()
+        
+        index = mgf.read_index(fname)
+        
+        assert index is not None
+        assert index[:,3].tolist() == [7.0, 8.0, 9.0]
+        assert index[:,5].tolist() == [1.0, 1.0, 2.0]
+        
+        # the offsets from the exporter are where the reader finds the peaks
+        parsed = mgf.MgfReader(fname)
+        os.remove(mgf.index_path(fname))
+        reparsed = mgf.MgfReader(fname)
+        
+        assert (
+            sorted(map(tuple, parsed.mgfindex.tolist())) ==
+            sorted(map(tuple, reparsed.mgfindex.tolist()))
+        )
+        
+        for i in range(len(reparsed)):
+            
+            assert np.array_equal(parsed.get_scan(i), reparsed.get_scan(i))
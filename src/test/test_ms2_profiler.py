@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+#  This file is part of the `lipyd` python module
+#
+#  Copyright (c) 2015-2019 - EMBL
+#
+#  File author(s):
+#  Dénes Türei (turei.denes@gmail.com)
+#  Igor Bulanov
+#
+#  Distributed under the GNU GPLv3 License.
+#  See accompanying file LICENSE.txt or copy at
+#      http://www.gnu.org/licenses/gpl-3.0.html
+#
+#  Website: http://www.ebi.ac.uk/~denes
+#
+
+
+import pytest
+
+import lipyd.ms2_profiler as ms2_profiler
+
+
+class Identifier(object):
+    
+    def identify(self):
+        
+        self.confirm_class()
+        
+        for i in range(3):
+            
+            yield i
+    
+    def confirm_class(self):
+        
+        return True
+
+
+class Identifier_Positive(Identifier):
+    
+    pass
+
+
+class TestMethodProfiler(object):
+    
+    def test_profiler(self):
+        
+        original = Identifier.__dict__['identify']
+        profiler = ms2_profiler.MethodProfiler(lambda: {Identifier: None})
+        
+        with profiler:
+            
+            assert Identifier.__dict__['identify'] is not original
+            
+            assert list(Identifier_Positive().identify()) == [0, 1, 2]
+            assert list(Identifier().identify()) == [0, 1, 2]
+        
+        assert Identifier.__dict__['identify'] is original
+        
+        report = dict(
+            ((rec.cls, rec.method), rec)
+            for rec in profiler.report()
+        )
+        
+        assert report[('Identifier_Positive', 'identify')].calls == 1
+        assert report[('Identifier_Positive', 'confirm_class')].calls == 1
+        assert report[('Identifier', 'confirm_class')].calls == 1
+        assert report[('Identifier', 'identify')].time > 0
+        
+        # calls after disabling the profiler are not recorded
+        list(Identifier().identify())
+        
+        report = dict(
+            ((rec.cls, rec.method), rec)
+            for rec in profiler.report()
+        )
+        
+        assert report[('Identifier', 'identify')].calls == 1
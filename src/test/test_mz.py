@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+#  This file is part of the `lipyd` python module
+#
+#  Copyright (c) 2015-2019 - EMBL
+#
+#  File author(s):
+#  Dénes Türei (turei.denes@gmail.com)
+#  Igor Bulanov
+#
+#  Distributed under the GNU GPLv3 License.
+#  See accompanying file LICENSE.txt or copy at
+#      http://www.gnu.org/licenses/gpl-3.0.html
+#
+#  Website: http://denes.omnipathdb.org/
+#
+
+import numpy as np
+
+import lipyd.mz as mz
+import lipyd.settings as settings
+
+
+class TestMz(object):
+    
+    def test_adduct_table(self):
+        
+        mzs = np.linspace(200., 1200., 11)
+        ad2ex = settings.get('ad2ex')[1]['neg']
+        ex2ad = settings.get('ex2ad')[1]['neg']
+        
+        adtable = mz.adduct_table(ionmode = 'neg', charges = 1)
+        exmasses = adtable.exact_masses(mzs)
+        admzs = adtable.adduct_mzs(mzs)
+        
+        assert exmasses.shape == (len(ad2ex), len(mzs))
+        assert adtable is mz.adduct_table(ionmode = 'neg', charges = 1)
+        
+        for i, ad in enumerate(adtable.adducts):
+            
+            assert np.allclose(
+                exmasses[i],
+                [getattr(mz.Mz(m), ad2ex[ad])() for m in mzs],
+                rtol = 1e-12,
+            )
+            assert np.allclose(
+                admzs[i],
+                [getattr(mz.Mz(m), ex2ad[ad])() for m in mzs],
+                rtol = 1e-12,
+            )
+    
+    def test_adduct_table_charge(self):
+        
+        adtable = mz.adduct_table(adducts = ('[M-2H]2-', '[M+H]+'))
+        
+        admzs = adtable.adduct_mzs(1000.)
+        
+        assert list(adtable.charge) == [-2, 1]
+        assert abs(admzs[0, 0] - (1000. - 2 * mz.mass.proton) / 2) < 1e-9
+        assert np.allclose(
+            np.diag(adtable.exact_masses(admzs[:,0])),
+            1000.,
+        )
@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+#  This file is part of the `lipyd` python module
+#
+#  Copyright (c) 2015-2019 - EMBL
+#
+#  File author(s):
+#  Dénes Türei (turei.denes@gmail.com)
+#  Igor Bulanov
+#
+#  Distributed under the GNU GPLv3 License.
+#  See accompanying file LICENSE.txt or copy at
+#      http://www.gnu.org/licenses/gpl-3.0.html
+#
+#  Website: http://denes.omnipathdb.org/
+#
+
+
+import zlib
+import base64
+
+import numpy as np
+
+import lipyd.mgf as mgf
+import lipyd.mzml as mzml
+import lipyd.ms2 as ms2
+
+
+_spectra = [
+    # MS level, RT (s), precursor m/z, intensity, charge, m/z's, intensities
+    (1, 10.0, None, None, None, [300., 400.5], [1e5, 2e5]),
+    (2, 12.0, 760.5851, 12000.0, 1, [184.0733, 760.5851], [1000.0, 200.5]),
+    (2, 30.0, 744.5543, 8000.0, 2, [153.0, 153.5, 190.25], [80., 0., 4.]),
+    (2, 48.0, 760.5853, 9000.0, 1, [], []),
+]
+
+_cvparam = '<cvParam cvRef="MS" accession="%s" name="x" value="%s"%s/>'
+
+
+def _binary_array(values, accession, dtype, compress):
+    
+    data = np.array(values, dtype = dtype).tobytes()
+    data = zlib.compress(data) if compress else data
+    
+    return (
+        '<binaryDataArray encodedLength="0">%s%s%s'
+        '<binary>%s</binary></binaryDataArray>' % (
+            _cvparam % (
+                'MS:1000523' if dtype == '<f8' else 'MS:1000521', '', ''
+            ),
+            _cvparam % ('MS:1000574' if compress else 'MS:1000576', '', ''),
+            _cvparam % (accession, '', ''),
+            base64.b64encode(data).decode('ascii'),
+        )
+    )
+
+
+def _write_mzml(path):
+    
+    spectra = []
+    
+    for i, (level, rt, mz, intensity, charge, mzs, ints) in (
+        enumerate(_spectra)
+    ):
+        
+        precursor = (
+            ''
+                if mz is None else
+            '<precursorList count="1"><precursor><selectedIonList count="1">'
+            '<selectedIon>%s%s%s</selectedIon></selectedIonList>'
+            '</precursor></precursorList>' % (
+                _cvparam % ('MS:1000744', mz, ''),
+                _cvparam % ('MS:1000041', charge, ''),
+                _cvparam % ('MS:1000042', intensity, ''),
+            )
+        )
+        spectra.append(
+            '<spectrum index="%u" id="controllerType=0 controllerNumber=1 '
+            'scan=%u" defaultArrayLength="%u">\n%s\n'
+            '<scanList count="1"><scan>%s</scan></scanList>\n%s\n'
+            '<binaryDataArrayList count="2">%s%s</binaryDataArrayList>\n'
+            '</spectrum>\n' % (
+                i,
+                i + 1,
+                len(mzs),
+                _cvparam % ('MS:1000511', level, ''),
+                _cvparam % (
+                    'MS:1000016',
+                    rt,
+                    ' unitAccession="UO:0000010"',
+                ),
+                precursor,
+                _binary_array(mzs, 'MS:1000514', '<f8', True),
+                _binary_array(ints, 'MS:1000515', '<f4', False),
+            )
+        )
+    
+    with open(path, 'w') as fp:
+        
+        fp.write(
+            '<?xml version="1.0" encoding="utf-8"?>\n'
+            '<mzML xmlns="http://psi.hupo.org/ms/mzml" version="1.1.0">\n'
+            '<run id="run"><spectrumList count="%u">\n%s'
+            '</spectrumList></run>\n</mzML>\n' % (
+                len(spectra),
+                ''.join(spectra),
+            )
+        )
+
+
+def _write_mgf(path):
+    
+    with open(path, 'w') as fp:
+        
+        for i, (level, rt, mz, intensity, charge, mzs, ints) in (
+            enumerate(_spectra)
+        ):
+            
+            if level == 1:
+                
+                continue
+            
+            fp.write(
+                'BEGIN IONS\n'
+                'TITLE=controllerType=0 controllerNumber=1 scan=%u\n'
+                'RTINSECONDS=%.09f\nPEPMASS=%.018f %.09f\nCHARGE=%u\n'
+                '%sEND IONS\n' % (
+                    i + 1,
+                    rt,
+                    mz,
+                    intensity,
+                    charge,
+                    ''.join('%s %s\n' % peak for peak in zip(mzs, ints)),
+                )
+            )
+
+
+class TestMzml(object):
+    
+    def test_reader(self, tmpdir, monkeypatch):
+        
+        mzml_path = str(tmpdir.join('sample.mzML'))
+        mgf_path = str(tmpdir.join('sample.mgf'))
+        _write_mzml(mzml_path)
+        _write_mgf(mgf_path)
+        
+        # small chunks to test tags split between chunks
+        monkeypatch.setattr(mzml.MzmlReader, 'index_chunk_size', 97)
+        
+        for charge in (None, 1, 2):
+            
+            mzmlreader = mzml.MzmlReader(mzml_path, charge = charge)
+            mgfreader = mgf.MgfReader(mgf_path, charge = charge)
+            
+            assert len(mzmlreader) == len(mgfreader)
+            assert np.allclose(
+                mzmlreader.mgfindex[:,:4].astype(float),
+                mgfreader.mgfindex[:,:4].astype(float),
+            )
+            
+            for i in range(len(mzmlreader)):
+                
+                assert np.allclose(
+                    mzmlreader.get_scan(i).reshape(-1, 2),
+                    mgfreader.get_scan(i).reshape(-1, 2),
+                )
+    
+    def test_ms2feature_resource(self, tmpdir):
+        
+        mzml_path = str(tmpdir.join('sample.mzML'))
+        _write_mzml(mzml_path)
+        
+        reader = mzml.MzmlReader(mzml_path, charge = None)
+        
+        assert ms2.MS2Feature.guess_resouce_type(mzml_path) == 'mzml'
+        assert ms2.MS2Feature.guess_resouce_type(reader) == 'mzml'
+        
+        feature = ms2.MS2Feature(
+            mz = 760.5852,
+            ionmode = 'pos',
+            resources = {'A': mzml_path},
+            ms1_records = {'dummy': None},
+            rt = 0.3,
+        )
+        
+        idx, rtdiff = feature.mzml_get_scans_summary(mzml_path)
+        scan_ids = sorted(reader.mgfindex[i, 3] for i in idx)
+        
+        assert scan_ids == [2., 4.]
+        assert np.allclose(sorted(np.abs(rtdiff)), [.1, .5])
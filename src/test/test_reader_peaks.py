@@ -19,6 +19,8 @@
 
 import pytest
 
+import numpy as np
+
 import lipyd.reader.peaks
 import lipyd.settings
 
@@ -43,3 +45,47 @@ class TestReaderPeaks(object):
             )
             for i in range(len(samples) - 1)
         )
+    
+    def test_reader_peaks_arrays(self):
+        """ """
+        
+        path = lipyd.settings.get('peaks_example')
+        
+        reader = lipyd.reader.peaks.PeaksReader(path)
+        
+        assert reader.rt_ranges.shape == (443, 2)
+        assert not np.isnan(reader.rt_ranges).any()
+        assert np.all(reader.rt_ranges[:,0] <= reader.rt_ranges[:,1])
+        assert reader.z.dtype.kind == 'i'
+        assert reader.intensities.shape == reader.rt_means.shape
+        # missing values marked by dash
+        assert np.isnan(reader.mzs).any()
+    
+    def test_reader_peaks_chunks(self):
+        """ """
+        
+        path = lipyd.settings.get('peaks_example')
+        
+        reader = lipyd.reader.peaks.PeaksReader(path)
+        reader_chunks = lipyd.reader.peaks.PeaksReader(
+            path,
+            chunk_size = 100,
+            basic_filters = {'intensity_min': 100000.},
+        )
+        
+        selection = (
+            (reader.quality > .2) &
+            (np.abs(reader.z) == 1) &
+            (reader.total_intensities > 100000.) &
+            (reader.total_rt_means > 1.)
+        )
+        
+        assert reader_chunks.mzs.shape == (selection.sum(), 7)
+        assert np.allclose(
+            reader_chunks.intensities,
+            reader.intensities[selection],
+            equal_nan = True,
+        )
+        assert np.all(
+            reader_chunks.rt_ranges == reader.rt_ranges[selection]
+        )
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+#  This file is part of the `lipyd` python module
+#
+#  Copyright (c) 2015-2019 - EMBL
+#
+#  File author(s):
+#  Dénes Türei (turei.denes@gmail.com)
+#  Igor Bulanov
+#
+#  Distributed under the GNU GPLv3 License.
+#  See accompanying file LICENSE.txt or copy at
+#      http://www.gnu.org/licenses/gpl-3.0.html
+#
+#  Website: http://denes.omnipathdb.org/
+#
+
+import pytest
+
+import numpy as np
+
+import lipyd.sample as sample
+import lipyd.sampleattrs as sampleattrs
+
+
+class TestRecalibration(object):
+    
+    @pytest.fixture(autouse = True)
+    def auto_inject_fixture(self):
+        
+        self.mzs = np.repeat(np.linspace(400., 900., 10)[:,None], 3, 1)
+        
+        self.samples = sample.SampleSet(
+            mzs = self.mzs.copy(),
+            ionmode = 'pos',
+            sample_ids = ['A1', 'A2', 'A3'],
+            sample_id_proc = sampleattrs.plate_sample_id_processor(),
+        )
+    
+    def test_first_last(self):
+        
+        self.samples.recalibrate(first = 2., last = 6.)
+        
+        expected = self.mzs - self.mzs / 1e6 * np.array([2., 4., 6.])
+        
+        assert np.allclose(self.samples.mzs_by_sample, expected, rtol = 1e-10)
+        assert np.allclose(self.samples.mzs_by_sample_original, self.mzs)
+    
+    def test_mz_dependent(self):
+        
+        first = np.array([[0., 1.], [600., 3.]])
+        last = np.array([[0., 3.], [600., 5.]])
+        
+        self.samples.recalibrate(first = first, last = last)
+        
+        # the first and last ppm curves are aligned to the m/z values of
+        # the first and last sample and interpolated in between
+        ppm_first = np.where(self.mzs[:,0] >= 600., 3., 1.)
+        ppm_last = np.where(self.mzs[:,2] >= 600., 5., 3.)
+        ppms = np.column_stack((
+            ppm_first,
+            (ppm_first + ppm_last) / 2.,
+            ppm_last,
+        ))
+        expected = self.mzs - self.mzs / 1e6 * ppms
+        
+        assert np.allclose(self.samples.mzs_by_sample, expected, rtol = 1e-10)
+    
+    def test_by_sample(self):
+        
+        self.samples.recalibrate(by_sample = {'A1': 1., 'A3': -2.})
+        
+        expected = self.mzs - self.mzs / 1e6 * np.array([1., 0., -2.])
+        
+        assert np.allclose(self.samples.mzs_by_sample, expected, rtol = 1e-10)
+    
+    def test_standards(self):
+        
+        standards = self.mzs[[2, 7],1].copy()
+        self.samples.mzs_by_sample[:,0] *= 1 + 3e-6
+        self.samples.mzs_by_sample[:,2] *= 1 - 2e-6
+        
+        self.samples.recalibrate(standards = standards)
+        
+        assert np.allclose(self.samples.mzs_by_sample, self.mzs, rtol = 1e-10)
@@ -19,6 +19,7 @@
 
 import pytest
 
+import os
 import warnings
 import numpy as np
 
@@ -259,3 +260,190 @@ class TestSample(object):
         samples.sort_by_sample_ids(['A11', 'B2', 'A12', 'B1'])
         
         assert np.all(dt.data0 == np.array([7, 7777, 77, 777]))
+    
+    def test_combine_samples(self):
+        """ """
+        
+        samples = [
+            sample.Sample(
+                mzs = np.array([100., 300., 200.]),
+                intensities = np.array([1., 3., 2.]),
+                ionmode = 'pos',
+                sample_id = 'A1',
+            ),
+            sample.Sample(
+                mzs = np.array([200.0002, 100.0003]),
+                intensities = np.array([20., 10.]),
+                ionmode = 'pos',
+                sample_id = 'A2',
+            ),
+        ]
+        
+        sampleset = sample.SampleSet.combine_samples(None, samples)
+        
+        assert sampleset.mzs_by_sample.shape == (3, 2)
+        assert np.allclose(sampleset.intensities[:,0], [1., 2., 3.])
+        assert np.allclose(sampleset.intensities[:2,1], [10., 20.])
+        assert np.isnan(sampleset.intensities[2,1])
+        assert np.allclose(sampleset.mzs, [100.00015, 200.0001, 300.])
+    
+    def test_lazy_sorting(self):
+        """ """
+        
+        a0 = np.random.random(10)
+        a1 = np.random.random(10)
+        b0 = np.random.random(10)
+        
+        idx = sample.FeatureIdx(10, lazy = True)
+        fb_a = sample.FeatureBase(a0 = a0, a1 = a1, sorter = idx)
+        fb_b = sample.FeatureBase(b0 = b0, sorter = idx)
+        
+        fb_a.sort_all(by = 'a0')
+        
+        # nothing reordered in ``fb_b`` yet
+        assert 'b0' not in fb_b.__dict__
+        assert len(fb_b) == 10
+        
+        fb_a.filter(np.arange(5))
+        
+        assert len(fb_b) == 5
+        assert np.all(fb_b.b0 == b0[a0.argsort()][:5])
+        
+        isort = fb_b.b0.argsort()
+        fb_b.sort_all(by = 'b0')
+        idx.compact()
+        
+        assert 'a1' in fb_a.__dict__
+        assert np.all(fb_a.a1 == a1[a0.argsort()][:5][isort])
+        assert np.all(fb_b.b0 == np.sort(b0[a0.argsort()][:5]))
+    
+    def test_memmap(self, tmpdir):
+        """ """
+        
+        mzs = np.random.random((10, 4))
+        intensities = np.random.random((10, 4))
+        sample_ids = ['A12', 'A11', 'B2', 'B1']
+        
+        samples = [
+            sample.SampleSet(
+                mzs = mzs,
+                intensities = intensities,
+                ionmode = 'pos',
+                sample_ids = sample_ids,
+                sample_id_proc = sampleattrs.plate_sample_id_processor(),
+                memmap = memmap,
+                memmap_dir = str(tmpdir),
+            )
+            for memmap in (False, True)
+        ]
+        
+        assert isinstance(samples[1].intensities, np.memmap)
+        assert not isinstance(samples[0].intensities, np.memmap)
+        
+        for s in samples:
+            
+            s.sort_all(by = 'mzs')
+            s.filter(np.arange(6))
+            s.sort_by_sample_ids(['A11', 'A12', 'B1', 'B2'])
+        
+        assert isinstance(samples[1].intensities, np.memmap)
+        assert samples[1].intensities.shape == (6, 4)
+        
+        for var in ('mzs', 'intensities', 'intens_norm', 'mzs_by_sample'):
+            
+            assert np.all(
+                getattr(samples[0], var) == getattr(samples[1], var)
+            )
+        
+        # the replaced files have been removed
+        assert len(tmpdir.listdir()) == len(samples[1]._memmap_files)
+        
+        samples[1].remove_memmaps()
+        
+        assert not tmpdir.listdir()
+        # the directory given by the user is kept
+        assert tmpdir.check(dir = True)
+    
+    def test_memmap_tempdir(self):
+        """ """
+        
+        samples = sample.SampleSet(
+            mzs = np.random.random((10, 4)),
+            intensities = np.random.random((10, 4)),
+            ionmode = 'pos',
+            sample_ids = ['A12', 'A11', 'B2', 'B1'],
+            sample_id_proc = sampleattrs.plate_sample_id_processor(),
+            memmap = True,
+        )
+        
+        tempdir = samples.memmap_dir
+        
+        assert os.path.isdir(tempdir)
+        
+        samples.remove_memmaps()
+        
+        assert not os.path.exists(tempdir)
+    
+    def test_sample_idx(self):
+        """ """
+        
+        samples = self.samples
+        dt = samples.get_sample_data(data0 = np.array([7, 77, 777, 7777]))
+        
+        assert dt._sample_idx is samples._sample_idx
+        
+        samples.sort_by_sample_ids(['B1', 'A11', 'B2', 'A12'])
+        
+        # nothing reordered until accessed
+        assert 'rts' not in samples.__dict__
+        assert 'data0' not in dt.__dict__
+        assert np.all(dt.data0 == np.array([7777, 77, 777, 7]))
+        assert np.all(samples.rts[0] == np.array([36, 38, 37, 39]))
+        
+        samples.sort_by_sample_ids(['A12', 'A11', 'B2', 'B1'])
+        samples.sort_all('mzs', desc = True)
+        
+        assert np.all(samples.rts[0] == np.array([3, 2, 1, 0]))
+        assert np.all(samples.mzs_by_sample[:,0] == np.arange(36, -1, -4))
+        
+        sel = dt.get_selection(
+            manual = ['A11', 'B2', 'B1'],
+            exclude = ['B1'],
+            data0 = lambda d: d > 70,
+        )
+        
+        assert np.all(sel.selection == np.array([False, True, True, False]))
+    
+    def test_export_table(self, tmpdir):
+        """ """
+        
+        reader = sample.SampleReader(
+            input_type = 'peaks',
+            fname = settings.get('peaks_example'),
+        )
+        samples = reader.get_sampleset()
+        
+        path_tsv = samples.export_table(
+            os.path.join(tmpdir, 'table.tsv'),
+            chunk_size = 100,
+        )
+        path_npz = samples.export_table(
+            os.path.join(tmpdir, 'table.npz'),
+            chunk_size = 100,
+        )
+        
+        with open(path_tsv, 'r') as fp:
+            
+            rows = [l.split('\t') for l in fp.read().split('\n')]
+        
+        columns = np.load(path_npz)
+        
+        assert len(rows) == len(samples) + 1
+        assert rows[0][0] == 'm/z'
+        assert len(columns['mz']) == len(samples)
+        assert np.allclose(
+            columns['mz'],
+            [float(row[0]) for row in rows[1:]],
+        )
+        assert columns['records'].dtype.kind == 'U'
+        assert np.all(columns['area'][:-1] >= columns['area'][1:])
@@ -2704,3 +2704,24 @@ class TestScan(object):
                     highest_for_name < highest_score
                 )
             )
+    
+    def test_scan_cache(self):
+        
+        mgfpath = os.path.join(
+            common.ROOT, 'data', 'ms2_examples', 'neg_examples.mgf'
+        )
+        scan1 = ms2.Scan.from_mgf(mgfpath, 691, 'neg', sample_id = ('A', 1))
+        scan2 = ms2.Scan.from_mgf(mgfpath, 691, 'neg', sample_id = ('A', 2))
+        
+        cache = ms2.ScanCache()
+        iscan1 = cache.identify(scan1)
+        iscan2 = cache.identify(scan2)
+        
+        assert cache.hits == 1
+        assert cache.misses == 1
+        assert iscan1 == iscan2
+        assert all(
+            i.scan_details.sample_id == ('A', 2)
+            for ids in iscan2.values()
+            for i in ids
+        )
@@ -19,6 +19,8 @@
 
 import pytest
 
+import numpy as np
+
 import lipyd.settings as settings
 import lipyd.sec as sec
 
@@ -60,3 +62,28 @@ class TestSec(object):
         
         assert highest015.row == 'A' and highest015.col == 12
         assert highest045.row == 'A' and highest045.col == 11
+    
+    def test_sec_fraction_means(self):
+        """ """
+        
+        path = settings.get('sec_unicorn_example')
+        reader = sec.SECReader(path)
+        
+        means = reader.fraction_means(reader.fractions)
+        
+        assert len(reader.fractions) == 18
+        assert np.allclose(
+            means,
+            [reader._fraction_mean(fr) for fr in reader.fractions],
+        )
+    
+    def test_sec_background_correction(self):
+        """ """
+        
+        path = settings.get('sec_unicorn_example')
+        reader = sec.SECReader(path)
+        others = [sec.SECReader(path), sec.SECReader(path)]
+        
+        reader.background_correction_by_other_chromatograms(others)
+        
+        assert np.allclose(reader.absorbance, 0.)
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#
+#  This file is part of the `lipyd` python module
+#
+#  Copyright (c) 2015-2019 - EMBL
+#
+#  File author(s):
+#  Dénes Türei (turei.denes@gmail.com)
+#  Igor Bulanov
+#
+#  Distributed under the GNU GPLv3 License.
+#  See accompanying file LICENSE.txt or copy at
+#      http://www.gnu.org/licenses/gpl-3.0.html
+#
+#  Website: http://denes.omnipathdb.org/
+#
+
+import pytest
+
+import lipyd.settings as settings
+
+
+class TestSettings(object):
+    
+    def test_get_frozen(self):
+        
+        ad2ex = settings.get_frozen('ad2ex')
+        
+        assert ad2ex is settings.get_frozen('ad2ex')
+        assert ad2ex[1]['pos'] == settings.get('ad2ex')[1]['pos']
+        
+        with pytest.raises(TypeError):
+            
+            ad2ex[1]['pos']['[M+H]+'] = 'remove_h'
+    
+    def test_version(self):
+        
+        version = settings.version()
+        tolerance = settings.get_frozen('ms1_tolerance')
+        
+        settings.setup(ms1_tolerance = tolerance * 2)
+        
+        assert settings.version() > version
+        assert settings.get_frozen('ms1_tolerance') == tolerance * 2
+        assert settings.snapshot('ms1_tolerance')['ms1_tolerance'] == (
+            tolerance * 2
+        )
+        
+        settings.reset('ms1_tolerance')
+        
+        assert settings.get_frozen('ms1_tolerance') == tolerance